@@ -0,0 +1,326 @@
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs
+
+from db import SessionLocal, engine, POOL_SIZE
+from migrations import ensure_schema
+import queries
+import reconcile
+import recurring
+import search
+import services
+
+# ===================================================
+# API HTTP local (ASGI puro, sem framework)
+# ===================================================
+# Rodar: python api.py  (ou: uvicorn api:app --port 8000)
+# Mesmo banco e mesma camada de serviço do app Streamlit. Cada requisição
+# roda em um pool de threads do tamanho do pool de conexões; as escritas são
+# serializadas pelo SQLite (BEGIN IMMEDIATE + busy_timeout em services.py).
+# POST /users/{id}/batch grava milhares de operações numa transação só.
+
+API_HOST = os.getenv("DAVI_API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("DAVI_API_PORT", "8000"))
+API_WORKERS = int(os.getenv("DAVI_API_WORKERS", str(POOL_SIZE)))
+MAX_BODY_BYTES = int(os.getenv("DAVI_API_MAX_BODY_BYTES", str(20 * 1024 * 1024)))
+
+_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="davi-api")
+ROUTES: List[Tuple[str, "re.Pattern", Callable]] = []
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def route(method: str, pattern: str):
+    # "/users/{user_id}/buckets/{bucket_id}" -> regex com grupos inteiros
+    rx = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>\\d+)", pattern) + "$")
+    def deco(fn):
+        ROUTES.append((method, rx, fn))
+        return fn
+    return deco
+
+# -------------
+# Conversões
+# -------------
+DATE_KEYS = ("day", "due_date", "date_from", "date_to", "first_due", "end_date", "settled_through")
+
+def _dates(d: Dict) -> Dict:
+    # Datas chegam como 'AAAA-MM-DD'
+    out = dict(d)
+    for k in DATE_KEYS:
+        if isinstance(out.get(k), str):
+            try:
+                out[k] = date.fromisoformat(out[k])
+            except ValueError:
+                raise HttpError(400, f"Data inválida em '{k}': {out[k]!r}")
+    return out
+
+def _query_args(qs: Dict[str, List[str]], *names) -> Dict:
+    out = {}
+    for n in names:
+        if n in qs:
+            v = qs[n][-1]
+            out[n] = int(v) if v.isdigit() and n not in DATE_KEYS else v
+    return _dates(out)
+
+def _only(body: Dict, *names) -> Dict:
+    return {k: v for k, v in body.items() if k in names}
+
+# ---------
+# Rotas
+# ---------
+@route("GET", "/health")
+def health(db, p, body, qs):
+    return {"ok": True}
+
+@route("POST", "/users")
+def create_user(db, p, body, qs):
+    return services.get_or_create_user(db, body.get("name", ""))
+
+@route("PUT", "/users/{user_id}/profile")
+def put_profile(db, p, body, qs):
+    return services.update_profile(db, p["user_id"], body.get("monthly_income", 0.0), body.get("monthly_expense", 0.0))
+
+@route("GET", "/users/{user_id}/summary")
+def get_summary(db, p, body, qs):
+    return queries.dashboard_summary(db, p["user_id"])
+
+@route("GET", "/users/{user_id}/buckets")
+def list_buckets(db, p, body, qs):
+    return [services.as_dict(b, *services.BUCKET_FIELDS) for b in queries.load_buckets(db, p["user_id"])]
+
+@route("POST", "/users/{user_id}/buckets")
+def post_bucket(db, p, body, qs):
+    return services.create_bucket(db, p["user_id"], **_only(body, "name", "percent", "description", "type"))
+
+@route("POST", "/users/{user_id}/buckets/normalize")
+def post_normalize(db, p, body, qs):
+    return services.normalize_bucket_percents(db, p["user_id"])
+
+@route("PATCH", "/users/{user_id}/buckets/{bucket_id}")
+def patch_bucket(db, p, body, qs):
+    return services.update_bucket(db, p["user_id"], p["bucket_id"], **_only(body, "name", "description", "percent", "type"))
+
+@route("DELETE", "/users/{user_id}/buckets/{bucket_id}")
+def del_bucket(db, p, body, qs):
+    services.delete_bucket(db, p["user_id"], p["bucket_id"], force=qs.get("force", ["0"])[-1] in ("1", "true"))
+    return {"deleted": p["bucket_id"]}
+
+@route("GET", "/users/{user_id}/reconcile")
+def get_reconcile(db, p, body, qs):
+    # Divergências da última conferência (sem conferir de novo)
+    return reconcile.issues(db.connection(), p["user_id"])
+
+@route("POST", "/users/{user_id}/reconcile")
+def post_reconcile(db, p, body, qs):
+    return services.reconcile_balances(db, p["user_id"], **_only(body, "repair", "accept"))
+
+@route("GET", "/users/{user_id}/movements")
+def list_movements(db, p, body, qs):
+    a = _query_args(qs, "limit", "after_date", "after_id", "bucket_id", "kind", "date_from", "date_to")
+    after = (date.fromisoformat(a["after_date"]), int(a["after_id"])) if "after_date" in a and "after_id" in a else None
+    rows, nxt = queries.ledger_page(db, p["user_id"], after, min(int(a.get("limit", 50)), 1000),
+                                    a.get("bucket_id"), a.get("kind"), a.get("date_from"), a.get("date_to"))
+    return {"items": [services.as_dict(m, *services.MOVEMENT_FIELDS) for m in rows],
+            "next": {"after_date": nxt[0], "after_id": nxt[1]} if nxt else None}
+
+@route("GET", "/users/{user_id}/movements/search")
+def search_movements(db, p, body, qs):
+    a = _query_args(qs, "q", "limit", "bucket_id", "kind", "date_from", "date_to")
+    rows = search.search_movements(db, p["user_id"], str(a.get("q", "")), a.get("bucket_id"), a.get("kind"),
+                                   a.get("date_from"), a.get("date_to"), min(int(a.get("limit", 50)), 1000))
+    return [services.as_dict(m, *services.MOVEMENT_FIELDS) for m in rows]
+
+@route("POST", "/users/{user_id}/movements")
+def post_movement(db, p, body, qs):
+    return services.add_movement(db, p["user_id"], **_only(_dates(body), "bucket_id", "kind", "amount", "description",
+                                                            "day", "allow_negative"))
+
+@route("POST", "/users/{user_id}/transfers")
+def post_transfer(db, p, body, qs):
+    return services.transfer(db, p["user_id"], **_only(_dates(body), "from_bucket", "to_bucket", "amount",
+                                                       "description", "day", "allow_negative"))
+
+@route("POST", "/users/{user_id}/income")
+def post_income(db, p, body, qs):
+    return services.daily_income(db, p["user_id"], **_only(_dates(body), "amount", "day", "description"))
+
+@route("GET", "/users/{user_id}/giants")
+def list_giants(db, p, body, qs):
+    paid = queries.giant_totals(db, p["user_id"])
+    return [{**services.as_dict(g, *services.GIANT_FIELDS), "total_paid": paid.get(g.id, 0.0)}
+            for g in queries.load_giants(db, p["user_id"])]
+
+@route("POST", "/users/{user_id}/giants")
+def post_giant(db, p, body, qs):
+    return services.create_giant(db, p["user_id"], **_only(body, "name", "total_to_pay", "parcels", "months_left", "priority"))
+
+@route("POST", "/users/{user_id}/giants/{giant_id}/payments")
+def post_giant_payment(db, p, body, qs):
+    return services.add_giant_payment(db, p["user_id"], p["giant_id"], **_only(_dates(body), "amount", "day", "note"))
+
+@route("GET", "/users/{user_id}/bills")
+def list_bills(db, p, body, qs):
+    return [services.as_dict(b, *services.BILL_FIELDS) for b in queries.load_bills(db, p["user_id"])]
+
+@route("GET", "/users/{user_id}/bills/search")
+def search_bills(db, p, body, qs):
+    a = _query_args(qs, "q", "limit", "date_from", "date_to")
+    paid = qs.get("paid", [None])[-1]
+    rows = search.search_bills(db, p["user_id"], str(a.get("q", "")), None if paid is None else paid in ("1", "true"),
+                               a.get("date_from"), a.get("date_to"), min(int(a.get("limit", 50)), 1000))
+    return [services.as_dict(b, *services.BILL_FIELDS) for b in rows]
+
+@route("POST", "/users/{user_id}/bills")
+def post_bill(db, p, body, qs):
+    return services.create_bill(db, p["user_id"], **_only(_dates(body), "title", "amount", "due_date", "is_critical"))
+
+@route("PATCH", "/users/{user_id}/bills/{bill_id}")
+def patch_bill(db, p, body, qs):
+    return services.update_bill(db, p["user_id"], p["bill_id"],
+                                **_only(_dates(body), "title", "amount", "due_date", "is_critical", "paid"))
+
+@route("GET", "/users/{user_id}/recurring-bills")
+def list_recurring(db, p, body, qs):
+    return [services.as_dict(r, *services.RECURRING_FIELDS) for r in recurring.load_recurring(db, p["user_id"])]
+
+@route("POST", "/users/{user_id}/recurring-bills")
+def post_recurring(db, p, body, qs):
+    return services.create_recurring_bill(db, p["user_id"], **_only(_dates(body), "title", "amount", "first_due", "freq",
+                                                                     "interval", "end_date", "is_critical",
+                                                                     "settled_through"))
+
+@route("PATCH", "/users/{user_id}/recurring-bills/{recurring_id}")
+def patch_recurring(db, p, body, qs):
+    return services.update_recurring_bill(db, p["user_id"], p["recurring_id"],
+                                          **_only(_dates(body), "title", "amount", "is_critical", "end_date"))
+
+@route("DELETE", "/users/{user_id}/recurring-bills/{recurring_id}")
+def del_recurring(db, p, body, qs):
+    services.delete_recurring_bill(db, p["user_id"], p["recurring_id"])
+    return {"deleted": p["recurring_id"]}
+
+@route("GET", "/users/{user_id}/occurrences")
+def list_occurrences(db, p, body, qs):
+    # Janela obrigatória: ocorrências só existem para o intervalo pedido
+    a = _query_args(qs, "date_from", "date_to")
+    if "date_from" not in a or "date_to" not in a:
+        raise HttpError(400, "Informe date_from e date_to.")
+    return [services.as_dict(o, *services.OCCURRENCE_FIELDS)
+            for o in recurring.occurrences(db, p["user_id"], a["date_from"], a["date_to"])]
+
+@route("PATCH", "/users/{user_id}/recurring-bills/{recurring_id}/occurrences")
+def patch_occurrence(db, p, body, qs):
+    # A ocorrência é identificada pela data gerada pela regra (mesmo se remarcada)
+    day = body.get("occurrence_date")
+    if not isinstance(day, str):
+        raise HttpError(400, "Informe occurrence_date (AAAA-MM-DD).")
+    return services.update_occurrence(db, p["user_id"], f"r{p['recurring_id']}:{day}",
+                                      **_only(_dates(body), "title", "amount", "due_date", "is_critical", "paid"))
+
+@route("POST", "/users/{user_id}/batch")
+def post_batch(db, p, body, qs):
+    ops = body.get("ops")
+    if not isinstance(ops, list):
+        raise HttpError(400, "Envie {\"ops\": [...]}.")
+    results = services.run_batch(db, p["user_id"], [_dates(op) for op in ops])
+    return {"applied": len(results), "results": results}
+
+# ---------------
+# Núcleo ASGI
+# ---------------
+def _match(method: str, path: str):
+    allowed = False
+    for m, rx, fn in ROUTES:
+        hit = rx.match(path)
+        if hit:
+            if m == method:
+                return fn, {k: int(v) for k, v in hit.groupdict().items()}
+            allowed = True
+    raise HttpError(405 if allowed else 404, "Método não permitido." if allowed else "Rota não encontrada.")
+
+def _call(fn: Callable, params: Dict, body: Dict, qs: Dict) -> Tuple[int, object]:
+    with SessionLocal() as db:
+        try:
+            return 200, fn(db, params, body, qs)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except services.NotFound as e:
+            return 404, {"error": str(e)}
+        except services.InsufficientFunds as e:
+            return 409, {"error": str(e)}
+        except services.ServiceError as e:
+            return 400, {"error": str(e)}
+        except (ValueError, TypeError) as e:  # campos faltando, data/número malformado no corpo ou na URL
+            return 400, {"error": f"Parâmetros inválidos: {e}"}
+
+async def _read_body(receive) -> bytes:
+    chunks, size = [], 0
+    while True:
+        msg = await receive()
+        chunks.append(msg.get("body", b""))
+        size += len(chunks[-1])
+        if size > MAX_BODY_BYTES:
+            raise HttpError(413, "Corpo da requisição grande demais.")
+        if not msg.get("more_body"):
+            return b"".join(chunks)
+
+async def _send_json(send, status: int, payload):
+    data = json.dumps(payload, ensure_ascii=False, default=str).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                            (b"content-length", str(len(data)).encode())]})
+    await send({"type": "http.response.body", "body": data})
+
+async def _lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            await asyncio.get_running_loop().run_in_executor(_executor, ensure_schema, engine)
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=True)
+            engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    try:
+        fn, params = _match(scope["method"], scope["path"].rstrip("/") or "/")
+        raw = await _read_body(receive)
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            raise HttpError(400, "JSON inválido.")
+        if not isinstance(body, dict):
+            raise HttpError(400, "O corpo deve ser um objeto JSON.")
+        qs = parse_qs(scope.get("query_string", b"").decode())
+        status, payload = await asyncio.get_running_loop().run_in_executor(_executor, _call, fn, params, body, qs)
+    except HttpError as e:
+        status, payload = e.status, {"error": str(e)}
+    await _send_json(send, status, payload)
+
+def main(host: str = API_HOST, port: int = API_PORT):
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("A API precisa do uvicorn: pip install uvicorn")
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="API HTTP local do APP DAVI")
+    ap.add_argument("--host", default=API_HOST)
+    ap.add_argument("--port", type=int, default=API_PORT)
+    args = ap.parse_args()
+    main(args.host, args.port)
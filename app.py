@@ -1,43 +1,23 @@
 import streamlit as st
-import pandas as pd
-from datetime import date, timedelta
-import time, math
-from hashlib import md5
+from datetime import date, datetime, timedelta
+import os
+from pathlib import Path
+from typing import Optional
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-
-from db import engine, SessionLocal, Base
-from models import (
-    User, Bucket, Giant, Movement, Bill,
-    UserProfile, GiantPayment
-)
-from logic import compute_bucket_splits, payoff_efficiency
-
-from babel.numbers import format_currency
-from babel.dates   import format_date
-
-# =========================
-#  Helpers de formatação BR
-# =========================
-def money_br(v: float) -> str:
-    try:
-        return format_currency(v, 'BRL', locale='pt_BR')
-    except Exception:
-        s = f"{v:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        return f"R$ {s}"
-
-def date_br(d) -> str:
-    try:
-        return format_date(d, format='short', locale='pt_BR')  # dd/mm/aa
-    except Exception:
-        return d.strftime('%d/%m/%y')
-
-def parse_money_br(s: str) -> float:
-    if s is None: return 0.0
-    s = s.strip().replace('.', '').replace(',', '.')
-    try: return float(s)
-    except Exception: return 0.0
+
+from db import engine, SessionLocal
+from migrations import ensure_schema
+from queries import recent_giant_payments, alerts_hash
+import backup
+import cache
+import reconcile
+import services
+import instrument
+import jobs
+from formatting import money_br, date_br, parse_money_br, money_br_many, date_br_many, format_columns
+# pandas, NumPy (logic/projeção), exportação e importação são importados só nas
+# páginas que os usam: a tela de entrada e a troca de página não pagam por eles.
 
 # ==============
 # App & CSS anim.
@@ -68,73 +48,58 @@ def inject_animations():
         .stProgress > div > div {
           height: 14px; border-radius: 999px;
         }
+        /* Barra de progresso anima no navegador (sem loop/sleep no servidor) */
+        [data-testid="stProgress"] [role="progressbar"] > div > div {
+          transform-origin: left center; animation: growBar .8s cubic-bezier(.2,.7,.2,1) both;
+        }
+        @keyframes growBar { from { transform: scaleX(0); } to { transform: scaleX(1); } }
         </style>
         """,
         unsafe_allow_html=True,
     )
 inject_animations()
 
-# Bootstrap DB
-Base.metadata.create_all(bind=engine)
+# Bootstrap DB — uma vez por processo (não a cada rerun do script)
+@st.cache_resource(show_spinner=False)
+def bootstrap_db():
+    ensure_schema(engine)
+    return True
+
+bootstrap_db()
+
+# Instrumentação (desligada por padrão: DAVI_INSTRUMENT=1 ou toggle na sidebar)
+st.session_state.setdefault("debug_instrument", instrument.ENABLED)
+instrument.start(engine, enabled=st.session_state["debug_instrument"],
+                 user_id=st.session_state.get("user_id"), state=st.session_state)
+# Gravações feitas por outro processo (api.py, scripts) invalidam o cache
+cache.sync_external_writes(engine)
+
+# Snapshot automático a cada DAVI_BACKUP_EVERY_HOURS (tarefa em segundo plano; backup.py)
+def schedule_backup():
+    if not backup.due(engine):
+        return
+    last = jobs.latest(None, "backup")
+    # Falhou há pouco (ex.: disco cheio): não tenta de novo a cada rerun
+    if last and last["status"] == "failed" and datetime.now() - last["created_at"] < timedelta(hours=1):
+        return
+    jobs.submit("backup", label="auto")
+
+# Conferência de saldos de todos os usuários a cada DAVI_RECONCILE_EVERY_MINUTES (reconcile.py)
+def schedule_reconcile():
+    if reconcile.EVERY_MINUTES <= 0:
+        return
+    last = jobs.latest(None, "reconcile")
+    if last is None or datetime.now() - last["created_at"] >= timedelta(minutes=reconcile.EVERY_MINUTES):
+        jobs.submit("reconcile")
+
+schedule_backup()
+schedule_reconcile()
 
 def get_db() -> Session:
     return SessionLocal()
 
-def get_or_create_user(db: Session, name: str) -> User:
-    u = db.execute(select(User).where(User.name == name)).scalar_one_or_none()
-    if u: return u
-    u = User(name=name)
-    db.add(u); db.commit(); db.refresh(u); return u
-
-# ============
-# Data loaders
-# ============
-def load_buckets(db: Session, user_id: int):
-    return db.execute(select(Bucket).where(Bucket.user_id == user_id)).scalars().all()
-
-def load_giants(db: Session, user_id: int):
-    return db.execute(select(Giant).where(Giant.user_id == user_id)).scalars().all()
-
-def load_movements(db: Session, user_id: int):
-    return db.execute(
-        select(Movement).where(Movement.user_id == user_id).order_by(Movement.date.desc())
-    ).scalars().all()
-
-def load_bills(db: Session, user_id: int):
-    return db.execute(
-        select(Bill).where(Bill.user_id == user_id).order_by(Bill.due_date.asc())
-    ).scalars().all()
-
-def get_profile(db: Session, user_id: int) -> UserProfile:
-    prof = db.execute(select(UserProfile).where(UserProfile.user_id == user_id)).scalar_one_or_none()
-    if not prof:
-        prof = UserProfile(user_id=user_id, monthly_income=0.0, monthly_expense=0.0)
-        db.add(prof); db.commit(); db.refresh(prof)
-    return prof
-
-# Aportes
-def get_giant_payments(db: Session, user_id: int, giant_id: int):
-    return db.execute(
-        select(GiantPayment).where(
-            GiantPayment.user_id == user_id,
-            GiantPayment.giant_id == giant_id
-        ).order_by(GiantPayment.date.desc(), GiantPayment.id.desc())
-    ).scalars().all()
-
-def get_giant_totals(db: Session, user_id: int, giant_id: int):
-    pays = get_giant_payments(db, user_id, giant_id)
-    total_paid = sum(p.amount for p in pays)
-    return total_paid, pays
-
 # Alertas
-def check_due_alerts(db: Session, user_id: int, days: int = 3):
-    today = date.today()
-    bills = load_bills(db, user_id)
-    overdue = [b for b in bills if (not b.paid and b.due_date < today)]
-    due_soon = [b for b in bills if (not b.paid and today <= b.due_date <= today + timedelta(days=days))]
-    return overdue, due_soon
-
-def render_alerts(overdue, due_soon, money_fmt, date_fmt):
+def render_alerts(overdue, due_soon, money_fmt, date_fmt, alert_hash=None, state_key="last_alerts_hash"):
     has_any = False
     if overdue:
         has_any = True
@@ -145,14 +110,64 @@ def render_alerts(overdue, due_soon, money_fmt, date_fmt):
         lines = [f"🟡 **{b.title}** — {money_fmt(b.amount)} — vence em {date_fmt(b.due_date)}" for b in due_soon]
         st.warning("**Vencendo em breve:**\n\n" + "\n\n".join(lines))
     if has_any:
-        key_str = "|".join([f"o:{b.id}:{b.due_date}" for b in overdue] + [f"s:{b.id}:{b.due_date}" for b in due_soon])
-        h = md5(key_str.encode()).hexdigest()
-        if st.session_state.get("last_alerts_hash") != h:
+        h = alert_hash or alerts_hash(overdue, due_soon)
+        if st.session_state.get(state_key) != h:
             for b in overdue:
                 st.toast(f"🔴 VENCIDA: {b.title} ({money_fmt(b.amount)}) — {date_fmt(b.due_date)}")
             for b in due_soon:
                 st.toast(f"🟡 A VENCER: {b.title} ({money_fmt(b.amount)}) — {date_fmt(b.due_date)}")
-            st.session_state["last_alerts_hash"] = h
+            st.session_state[state_key] = h
+
+def render_debug_panel(report):
+    with st.sidebar.expander("🔧 Debug — este rerun", expanded=True):
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Consultas", report["queries"])
+        c2.metric("Banco (ms)", f"{report['db_ms']:.1f}")
+        c3.metric("Linhas", report["rows"])
+        st.caption(f"Rerun total: {report['total_ms']:.1f} ms")
+        st.table([{"Fase": p["name"], "ms": round(p["ms"], 1), "Consultas": p["queries"],
+                   "Banco (ms)": round(p["db_ms"], 1)} for p in report["phases"]])
+        if report["repeated"]:
+            st.warning(f"{len(report['repeated'])} consulta(s) idêntica(s) repetida(s) neste rerun:")
+            for r in report["repeated"][:5]:
+                st.code(f"{r['count']}x  {r['sql']}\n{r['params']}", language="sql")
+        if report["hot_sql"]:
+            st.warning("Mesmo SQL executado muitas vezes (possível N+1):")
+            for r in report["hot_sql"][:5]:
+                st.code(f"{r['count']}x  {r['sql']}", language="sql")
+
+# Tarefas em segundo plano (jobs.py): só o fragmento se atualiza enquanto a tarefa roda
+JOB_POLL_SECONDS = float(os.getenv("DAVI_JOB_POLL_SECONDS", "1.0"))
+JOB_STATUS_BR = {"queued": "na fila", "running": "rodando", "done": "concluída",
+                 "failed": "falhou", "cancelled": "cancelada"}
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(job_id: int):
+    job = jobs.get(job_id)
+    if job is None or job["status"] not in jobs.ACTIVE:
+        st.rerun()  # terminou: a página inteira redesenha com o resultado
+    st.progress(job["progress"], text=job["message"] or "Em andamento…")
+    if st.button("Cancelar", key=f"job_cancel_{job_id}"):
+        jobs.cancel(job_id)
+
+def render_job(state_key: str, kind: str, user_id) -> Optional[dict]:
+    # Devolve a tarefa concluída (status "done"); rodando mostra o progresso,
+    # falha/cancelamento viram aviso. Sem id na sessão (ex.: F5), retoma a que ainda roda.
+    job_id = st.session_state.get(state_key)
+    job = jobs.get(job_id) if job_id else None
+    if job is None:
+        job = jobs.latest(user_id, kind)
+        if job is None or job["status"] not in jobs.ACTIVE:
+            return None
+        st.session_state[state_key] = job["id"]
+    if job["status"] in jobs.ACTIVE:
+        _job_progress(job["id"])
+        return None
+    if job["status"] == "failed":
+        st.error(job["message"])
+    elif job["status"] == "cancelled":
+        st.info("Tarefa cancelada.")
+    return job if job["status"] == "done" else None
 
 # =========
 # Sidebar
@@ -162,22 +177,19 @@ with st.sidebar:
     name = st.text_input("Seu nome", value=st.session_state.get("user_name", "Gustavo"))
     if st.button("Entrar / Criar"):
         with get_db() as db:
-            user = get_or_create_user(db, name.strip() or "Usuário")
-            st.session_state["user_id"] = user.id
-            st.session_state["user_name"] = user.name
+            user = services.get_or_create_user(db, name)
+            st.session_state["user_id"] = user["id"]
+            st.session_state["user_name"] = user["name"]
 
     # Perfil financeiro
     if "user_id" in st.session_state:
         with get_db() as db:
-            prof = get_profile(db, st.session_state["user_id"])
+            prof = cache.profile(st.session_state["user_id"])
             inc_str = st.text_input("Receita mensal (R$)", value=str(prof.monthly_income).replace('.', ','))
             exp_str = st.text_input("Despesa mensal (R$)", value=str(prof.monthly_expense).replace('.', ','))
             if st.button("Salvar receita/despesa"):
-                inc = parse_money_br(inc_str)
-                exp = parse_money_br(exp_str)
-                prof.monthly_income = inc
-                prof.monthly_expense = exp
-                db.commit()
+                services.update_profile(db, st.session_state["user_id"], parse_money_br(inc_str), parse_money_br(exp_str))
+                cache.bump_version(st.session_state["user_id"])
                 st.success("Valores salvos!")
 
     # Preferências de alerta
@@ -193,38 +205,51 @@ with st.sidebar:
         "Dashboard", "Plano de Ataque", "Baldes", "Entrada Diária",
         "Livro Caixa", "Calendário", "Atrasos & Riscos", "Configurações"
     ])
+    st.toggle("Instrumentação (debug)", key="debug_instrument",
+              help=f"Conta consultas/tempo por rerun e grava em {instrument.LOG_PATH}")
+    if "user_id" in st.session_state:
+        recent_jobs = jobs.recent(st.session_state["user_id"], limit=5)
+        if recent_jobs:
+            with st.expander("Tarefas em segundo plano"):
+                for j in recent_jobs:
+                    st.caption(f"#{j['id']} {j['kind']} — {JOB_STATUS_BR.get(j['status'], j['status'])}"
+                               f" ({j['progress']*100:.0f}%) {j['message']}")
 
 user_id = st.session_state.get("user_id", None)
 if not user_id:
     st.info("👈 Informe o seu **nome** e clique em **Entrar / Criar** para começar.")
+    report = instrument.finish(state=st.session_state)
+    if report:
+        render_debug_panel(report)
     st.stop()
 
 # Alertas globais ao entrar
-with get_db() as _db_alert:
-    ov, ds = check_due_alerts(_db_alert, user_id, days=st.session_state.get("alert_window", 3))
-    render_alerts(ov, ds, money_fmt=money_br, date_fmt=date_br)
+alert_window = st.session_state.get("alert_window", 3)
+ov, ds, alert_h = cache.due_alerts(user_id, alert_window, date.today())
+render_alerts(ov, ds, money_fmt=money_br, date_fmt=date_br, alert_hash=alert_h,
+              state_key=f"last_alerts_hash:{user_id}:{alert_window}")
 
 # ======
 # Páginas
 # ======
+instrument.phase(page)
 if page == "Dashboard":
+    import pandas as pd
     st.title("📊 Dashboard")
     with get_db() as db:
-        buckets = load_buckets(db, user_id)
-        giants  = load_giants(db, user_id)
-        movs    = load_movements(db, user_id)
-        total_balance = sum(b.balance for b in buckets)
-
-        # Métricas mensais e totais (Livro Caixa)
-        today = date.today()
-        month_movs = [m for m in movs if m.date.month == today.month and m.date.year == today.year]
-        total_income_val  = sum(m.amount for m in movs if m.kind == 'income')
-        total_expense_val = sum(m.amount for m in movs if m.kind in ('expense', 'transfer'))
-        month_income  = sum(m.amount for m in month_movs if m.kind == 'income')
-        month_expense = sum(m.amount for m in month_movs if m.kind in ('expense', 'transfer'))
+        buckets = cache.buckets(user_id)
+        giants  = cache.giants(user_id)
+
+        # Métricas mensais e totais (Livro Caixa) agregadas no SQLite
+        summary = cache.dashboard_summary(user_id, date.today())
+        total_balance     = summary["total_balance"]
+        total_income_val  = summary["total_income"]
+        total_expense_val = summary["total_expense"]
+        month_income      = summary["month_income"]
+        month_expense     = summary["month_expense"]
 
         # Perfil declarado
-        prof = get_profile(db, user_id)
+        prof = cache.profile(user_id)
         renda_decl = prof.monthly_income
         desp_decl  = prof.monthly_expense
         margem     = max(renda_decl - desp_decl, 0.0)
@@ -243,31 +268,60 @@ if page == "Dashboard":
         with col5:
             st.metric("Despesas/Transf. (total)", money_br(total_expense_val))
         with col6:
-            active = [g for g in giants if g.status == "active"]
-            st.metric("Gigantes ativos", len(active))
+            st.metric("Gigantes ativos", summary["giants_active"])
         with col7:
             st.metric("Receita mensal", money_br(renda_decl))
         with col8:
             st.metric("Despesa mensal", money_br(desp_decl))
 
         if buckets:
-            df_b = pd.DataFrame([{"Balde": b.name, "%": b.percent, "Saldo": money_br(b.balance)} for b in buckets])
+            df_b = format_columns(pd.DataFrame([{"Balde": b.name, "%": b.percent, "Saldo": b.balance} for b in buckets]),
+                                  money=["Saldo"])
             st.subheader("Distribuição por Balde")
             st.dataframe(df_b, use_container_width=True)
 
         if giants:
             giants_sorted = sorted(giants, key=lambda g: (g.priority, -g.total_to_pay))
-            df_g = pd.DataFrame([{
-                "Gigante": g.name, "Total a Quitar": money_br(g.total_to_pay),
+            df_g = format_columns(pd.DataFrame([{
+                "Gigante": g.name, "Total a Quitar": g.total_to_pay,
                 "Prioridade": g.priority, "Status": g.status
-            } for g in giants_sorted])
+            } for g in giants_sorted]), money=["Total a Quitar"])
             st.subheader("Gigantes")
             st.dataframe(df_g, use_container_width=True)
 
-        defeated = [g for g in giants if g.status == "defeated"]
-        st.caption(f"Vitórias: {len(defeated)} — Margem p/ atacar: {money_br(margem)}")
+        st.caption(f"Vitórias: {summary['giants_defeated']} — Margem p/ atacar: {money_br(margem)}")
+
+        # Evolução: PNG pronto do cache (mesmo custo p/ 1 mês ou 5 anos); matplotlib só ao ligar
+        if st.toggle("Gráficos de evolução", key="dash_charts"):
+            from charts import MAX_POINTS
+            bal_png = cache.balance_chart(user_id, MAX_POINTS)
+            pay_png = cache.paydown_chart(user_id, MAX_POINTS)
+            if bal_png:
+                st.image(bal_png, use_container_width=True)
+            if pay_png:
+                st.image(pay_png, use_container_width=True)
+            if not (bal_png or pay_png):
+                st.info("Sem movimentações ou aportes para desenhar.")
+
+        # Histórico mensal/anual: dezenas de linhas do rollup, não o livro caixa inteiro
+        with st.expander("Histórico mensal e anual"):
+            today = date.today()
+            since = date(today.year - 1, today.month, 1)
+            monthly, yearly = cache.flow_history(user_id, since)
+            if monthly:
+                cols = ["Mês", "Receitas", "Despesas/Transf."]
+                df_m = pd.DataFrame(monthly, columns=cols)
+                df_m["Saldo do período"] = df_m["Receitas"] - df_m["Despesas/Transf."]
+                st.dataframe(format_columns(df_m, money=cols[1:] + ["Saldo do período"]), use_container_width=True)
+                df_y = pd.DataFrame(yearly, columns=["Ano"] + cols[1:])
+                df_y["Saldo do período"] = df_y["Receitas"] - df_y["Despesas/Transf."]
+                st.dataframe(format_columns(df_y, money=cols[1:] + ["Saldo do período"]), use_container_width=True)
+            else:
+                st.info("Sem movimentações ainda.")
 
 elif page == "Plano de Ataque":
+    import pandas as pd
+    from logic import payoff_efficiency, simulate_payoff, PAYOFF_STRATEGIES
     st.title("🛡️ Plano de Ataque — Gigantes")
     with get_db() as db:
         with st.form("novo_gigante"):
@@ -280,14 +334,16 @@ elif page == "Plano de Ataque":
             priority    = st.number_input("Prioridade (1=maior)", min_value=1, step=1, value=1)
             submitted   = st.form_submit_button("Adicionar")
             if submitted and name_g.strip():
-                g = Giant(user_id=user_id, name=name_g.strip(), total_to_pay=total,
-                          parcels=parcels, months_left=months_left, priority=priority, status="active")
-                db.add(g); db.commit()
+                services.create_giant(db, user_id, name_g, total, parcels, months_left, priority)
+                cache.bump_version(user_id)
                 st.success("Gigante criado!")
 
-        giants = load_giants(db, user_id)
+        giants = cache.giants(user_id)
         if giants:
             giants_sorted = sorted(giants, key=lambda g: (g.priority, -g.total_to_pay))
+            # Totais e históricos de todos os gigantes em lote (sem N+1)
+            paid_by_giant = cache.giant_totals(user_id)
+            hist_by_giant = cache.recent_giant_payments(user_id, 5)
             st.subheader("Seus Gigantes")
             for g in giants_sorted:
                 with st.expander(f"{g.name} — {money_br(g.total_to_pay)} | prioridade {g.priority} | status {g.status}"):
@@ -299,7 +355,8 @@ elif page == "Plano de Ataque":
                         st.write(f"Meses até a vitória: {eff['months_to_victory']}")
 
                     # Totais/lançamentos deste gigante
-                    total_paid, pays = get_giant_totals(db, user_id, g.id)
+                    total_paid = paid_by_giant.get(g.id, 0.0)
+                    pays = hist_by_giant.get(g.id, [])
                     remaining = max(g.total_to_pay - total_paid, 0.0)
                     st.markdown(
                         f"**Total a quitar:** {money_br(g.total_to_pay)}  \n"
@@ -307,14 +364,10 @@ elif page == "Plano de Ataque":
                         f"**Saldo restante:** {money_br(remaining)}"
                     )
 
-                    # Progresso animado
+                    # Progresso (estado final uma vez; a animação fica no CSS `growBar`)
                     progress = min(total_paid / g.total_to_pay, 1.0) if g.total_to_pay > 0 else 0.0
                     st.markdown(f"**Progresso:** {int(progress*100)}%")
-                    prog = st.progress(0)
-                    target = int(progress * 100)
-                    for i in range(0, target+1, max(1, math.ceil(max(target,1)/20))):
-                        prog.progress(i/100); time.sleep(0.01)
-                    prog.progress(progress)
+                    st.progress(progress)
                     st.markdown(
                         f'<div class="pulse" style="padding:10px;border-radius:14px;border:1px solid rgba(255,99,132,.25);margin-top:6px;">'
                         f'🎯 <b>Saldo restante:</b> {money_br(remaining)}'
@@ -326,7 +379,7 @@ elif page == "Plano de Ataque":
                     with st.form(f"pay_{g.id}"):
                         pay_str  = st.text_input("Aporte para este Gigante (R$)", value="", key=f"pay_str_{g.id}")
                         pay_val  = parse_money_br(pay_str) if pay_str else 0.0
-                        pay_date = st.date_input("Data do aporte", value=date.today(), format="DD/MM/YY", key=f"pay_date_{g.id}")
+                        pay_date = st.date_input("Data do aporte", value=date.today(), format="DD/MM/YYYY", key=f"pay_date_{g.id}")
                         pay_note = st.text_input("Observação (opcional)", value="", key=f"pay_note_{g.id}")
                         submit_pay = st.form_submit_button("Salvar Aporte")
 
@@ -334,30 +387,92 @@ elif page == "Plano de Ataque":
                         if pay_val <= 0:
                             st.warning("Informe um valor de aporte maior que zero.")
                         else:
-                            p = GiantPayment(user_id=user_id, giant_id=g.id, amount=pay_val, date=pay_date, note=pay_note)
-                            db.add(p)
-                            total_paid_after = total_paid + pay_val
-                            if total_paid_after >= g.total_to_pay and g.status != "defeated":
-                                g.status = "defeated"
-                                db.commit()
+                            res = services.add_giant_payment(db, user_id, g.id, pay_val, pay_date, pay_note)
+                            cache.bump_version(user_id)
+                            if res["defeated"]:
                                 st.success("🎉 Vitória! Gigante vencido.")
                                 st.balloons()
                             else:
-                                db.commit()
                                 st.success("Aporte registrado com sucesso.")
-                            total_paid, pays = get_giant_totals(db, user_id, g.id)
+                            total_paid = res["total_paid"]
+                            pays = recent_giant_payments(db, user_id, limit=5, giant_ids=[g.id]).get(g.id, [])
                             remaining = max(g.total_to_pay - total_paid, 0.0)
                             st.info(f"Atualizado • Total aportado: {money_br(total_paid)} • Saldo: {money_br(remaining)}")
 
                     # Histórico
                     if pays:
-                        df_hist = pd.DataFrame(
-                            [{"Data": date_br(p.date), "Valor": money_br(p.amount), "Obs": p.note} for p in pays[:5]]
-                        )
+                        df_hist = format_columns(pd.DataFrame(
+                            [{"Data": p.date, "Valor": p.amount, "Obs": p.note} for p in pays]
+                        ), money=["Valor"], dates=["Data"])
                         st.write("Últimos aportes:")
                         st.table(df_hist)
 
+            # Simulação de quitação de todos os gigantes ativos
+            active_giants = [g for g in giants_sorted if g.status == "active"]
+            if active_giants:
+                st.subheader("Simulação de quitação")
+                prof = cache.profile(user_id)
+                margin_default = max(prof.monthly_income - prof.monthly_expense, 0.0)
+                sc1, sc2 = st.columns(2)
+                with sc1:
+                    strategy_labels = {
+                        "priority": "Prioridade", "avalanche": "Avalanche (maior juros)",
+                        "snowball": "Bola de neve (menor saldo)", "custom": "Personalizada",
+                    }
+                    strategy = st.selectbox("Estratégia", PAYOFF_STRATEGIES, format_func=strategy_labels.get, key="sim_strategy")
+                with sc2:
+                    budget_str = st.text_input("Valor mensal para atacar (R$)", value=str(round(margin_default, 2)).replace('.', ','), key="sim_budget")
+                    budget = parse_money_br(budget_str) if budget_str else 0.0
+
+                rates_df = st.data_editor(
+                    pd.DataFrame([{"ID": g.id, "Gigante": g.name, "Juros a.m. (%)": 0.0} for g in active_giants]),
+                    disabled=["ID", "Gigante"], hide_index=True, key="sim_rates",
+                )
+                rates = {int(r["ID"]): float(r["Juros a.m. (%)"] or 0.0) / 100.0 for _, r in rates_df.iterrows()}
+                custom_order = None
+                if strategy == "custom":
+                    names = {f"{g.name} (#{g.id})": g.id for g in active_giants}
+                    chosen = st.multiselect("Ordem de ataque", list(names), default=list(names), key="sim_custom")
+                    custom_order = [names[n] for n in chosen]
+
+                sim = simulate_payoff(giants_sorted, budget, strategy, paid=dict(paid_by_giant),
+                                      rates=rates, custom_order=custom_order)
+                if budget <= 0:
+                    st.warning("Informe um valor mensal maior que zero para simular (ou ajuste receita/despesa).")
+                else:
+                    start = date.today().replace(day=1)
+                    def _month_date(n):
+                        y, m = divmod(start.month - 1 + n, 12)
+                        return start.replace(year=start.year + y, month=m + 1)
+                    df_sim = pd.DataFrame([{
+                        "Gigante": d["name"],
+                        "Mês da vitória": d["month"] if d["month"] is not None else "—",
+                        "Previsão": date_br(_month_date(d["month"])) if d["month"] is not None else "fora do horizonte",
+                    } for d in sim["defeat"]])
+                    st.table(df_sim)
+                    if sim["months"] is None:
+                        st.warning("Com esse valor mensal, algum gigante não é vencido em 50 anos (juros maiores que o aporte).")
+                    else:
+                        st.caption(f"Todos vencidos em {sim['months']} meses — total aportado {money_br(sim['total_paid'])}.")
+                    if len(sim["balances"]):
+                        # Nome + id: gigantes com o mesmo nome não podem virar colunas repetidas
+                        by_id = {g.id: f"{g.name} (#{g.id})" for g in active_giants}
+                        st.line_chart(pd.DataFrame(sim["balances"], columns=[by_id[i] for i in sim["order"]]))
+
+                    # Todas as estratégias de uma vez, em segundo plano (jobs.py / logic.compare_strategies)
+                    if st.button("Comparar estratégias", key="sim_compare"):
+                        st.session_state["payoff_job"] = jobs.submit(
+                            "payoff", user_id, budget=budget, rates={str(k): v for k, v in rates.items()})
+                    cmp_job = render_job("payoff_job", "payoff", user_id)
+                    if cmp_job:
+                        cmp = cmp_job["result"]["months"].get(str(user_id), {})
+                        st.table(pd.DataFrame([{
+                            "Estratégia": strategy_labels[s],
+                            "Meses até vencer todos": cmp[s] if cmp[s] is not None else "fora do horizonte",
+                        } for s in PAYOFF_STRATEGIES if s in cmp]))
+
 elif page == "Baldes":
+    import pandas as pd
     st.title("🪣 Baldes")
     with get_db() as db:
         with st.form("novo_balde"):
@@ -368,31 +483,26 @@ elif page == "Baldes":
             type_b   = st.text_input("Tipo", value="generic")
             submitted= st.form_submit_button("Salvar")
             if submitted and name_b.strip():
-                b = Bucket(user_id=user_id, name=name_b.strip(), description=desc_b.strip(),
-                           percent=percent_b, type=type_b, balance=0.0)
-                db.add(b); db.commit()
+                services.create_bucket(db, user_id, name_b, percent_b, desc_b, type_b)
+                cache.bump_version(user_id)
                 st.success("Balde salvo!")
 
-        buckets = load_buckets(db, user_id)
+        buckets = cache.buckets(user_id)
         if buckets:
             total_percent = sum(b.percent for b in buckets)
             if total_percent < 0 or any(b.percent < 0 for b in buckets):
                 st.error("Há percentuais negativos. Ajuste para continuar usando a divisão.")
             st.info(f"Percentuais atuais somam **{total_percent:.2f}%**. Se não for 100%, a divisão é normalizada na Entrada Diária.")
             if st.button("Normalizar percentuais para 100%"):
-                if total_percent <= 0:
-                    st.warning("Não é possível normalizar: soma é 0%.")
-                else:
-                    factor = 100.0 / total_percent
-                    for b in buckets:
-                        b.percent = round(b.percent * factor, 2)
-                    db.commit()
-                    st.success("Percentuais normalizados para 100%. Recarregue a página.")
+                st.session_state["normalize_job"] = jobs.submit("normalize", user_id)
+            if render_job("normalize_job", "normalize", user_id):
+                st.session_state.pop("normalize_job", None)
+                st.success("Percentuais normalizados para 100%.")
 
-            df_b = pd.DataFrame([{
+            df_b = format_columns(pd.DataFrame([{
                 "ID": b.id, "Nome": b.name, "Descrição": b.description,
-                "%": b.percent, "Tipo": b.type, "Saldo": money_br(b.balance)
-            } for b in buckets])
+                "%": b.percent, "Tipo": b.type, "Saldo": b.balance
+            } for b in buckets]), money=["Saldo"])
             st.dataframe(df_b, use_container_width=True)
 
             st.subheader("Editar balde existente")
@@ -408,8 +518,9 @@ elif page == "Baldes":
                     confirm    = st.checkbox("Confirmar alterações")
                     saveb      = st.form_submit_button("Salvar alterações")
                     if saveb and confirm:
-                        b.name, b.description, b.percent, b.type = name_b2, desc_b2, percent_b2, type_b2
-                        db.commit(); st.success("Balde atualizado!")
+                        services.update_bucket(db, user_id, b.id, name=name_b2, description=desc_b2,
+                                               percent=percent_b2, type=type_b2)
+                        cache.bump_version(user_id); st.success("Balde atualizado!")
                     elif saveb and not confirm:
                         st.warning("Confirme as alterações para salvar.")
 
@@ -431,43 +542,40 @@ elif page == "Baldes":
                     elif not force and b_del.balance != 0:
                         st.error("Este balde possui saldo. Marque a confirmação para prosseguir.")
                     else:
-                        db.delete(b_del); db.commit()
+                        services.delete_bucket(db, user_id, b_del.id, force=True); cache.bump_version(user_id)
                         st.success("Balde apagado com sucesso.")
                         st.rerun()
 
 elif page == "Entrada Diária":
+    import pandas as pd
     st.title("📥 Entrada Diária")
     with get_db() as db:
-        buckets = load_buckets(db, user_id)
+        buckets = cache.buckets(user_id)
         if not buckets:
             st.warning("Crie baldes primeiro.")
         else:
-            d = st.date_input("Data", value=date.today(), format="DD/MM/YY")
+            d = st.date_input("Data", value=date.today(), format="DD/MM/YYYY")
             val_str = st.text_input("Valor total recebido (ex.: 10.249,00)", value="")
             val = parse_money_br(val_str) if val_str else 0.0
             if st.button("Dividir e Lançar"):
                 if val <= 0:
                     st.warning("Informe um valor maior que zero.")
                 else:
-                    splits = compute_bucket_splits(buckets, val)
-                    for s in splits:
-                        m = Movement(user_id=user_id, bucket_id=s["bucket_id"], kind="income",
-                                     amount=s["value"], description="Entrada diária", date=d)
-                        db.add(m)
-                        b = db.get(Bucket, s["bucket_id"])
-                        if b and b.user_id == user_id:
-                            b.balance += s["value"]
-                    db.commit()
+                    splits = services.daily_income(db, user_id, val, d)
+                    cache.bump_version(user_id)
                     st.success("Entrada lançada e dividida entre os baldes.")
-                    df = pd.DataFrame([{"Balde": s["name"], "% efetivo": s["percent_effective"], "Valor": money_br(s["value"])} for s in splits])
+                    df = format_columns(pd.DataFrame([{"Balde": s["name"], "% efetivo": s["percent_effective"], "Valor": s["value"]} for s in splits]),
+                                        money=["Valor"])
                     st.table(df)
 
 elif page == "Livro Caixa":
+    import pandas as pd
+    from export import parquet_available
     st.title("📗 Livro Caixa")
     with get_db() as db:
         st.subheader("Nova movimentação")
         kind = st.selectbox("Tipo", ["income", "expense", "transfer"], index=0)
-        buckets_all = load_buckets(db, user_id)
+        buckets_all = cache.buckets(user_id)
         ids = [b.id for b in buckets_all]
         if not ids:
             st.warning("Crie ao menos um balde para lançar no Livro Caixa.")
@@ -479,80 +587,172 @@ elif page == "Livro Caixa":
             dest = st.selectbox("Balde de destino", ids, index=0 if len(ids) < 2 else 1)
             val_str = st.text_input("Valor (R$)", value="")
             val = parse_money_br(val_str) if val_str else 0.0
-            d = st.date_input("Data", value=date.today(), format="DD/MM/YY")
+            d = st.date_input("Data", value=date.today(), format="DD/MM/YYYY")
             desc = st.text_input("Descrição", value="Transferência entre baldes")
             if st.button("Transferir"):
                 if val > 0 and orig != dest:
-                    b_orig = db.get(Bucket, orig)
-                    b_dest = db.get(Bucket, dest)
-                    if b_orig and b_dest:
-                        if not allow_negative and b_orig.balance - val < 0:
-                            st.error("Saldo insuficiente no balde de origem (desmarque o bloqueio para permitir negativo).")
-                        else:
-                            m_out = Movement(user_id=user_id, bucket_id=orig, kind="transfer", amount=val, description=desc+" (saída)", date=d)
-                            m_in  = Movement(user_id=user_id, bucket_id=dest, kind="income",   amount=val, description=desc+" (entrada)", date=d)
-                            db.add(m_out); db.add(m_in)
-                            b_orig.balance -= val; b_dest.balance += val
-                            db.commit(); st.success("Transferência realizada.")
+                    try:
+                        services.transfer(db, user_id, orig, dest, val, desc, d, allow_negative)
+                    except services.InsufficientFunds:
+                        st.error("Saldo insuficiente no balde de origem (desmarque o bloqueio para permitir negativo).")
+                    except services.ServiceError as e:
+                        st.error(str(e))
+                    else:
+                        cache.bump_version(user_id); st.success("Transferência realizada.")
                 else:
                     st.warning("Informe um valor > 0 e selecione baldes diferentes.")
         else:
             bucket_id = st.selectbox("Balde", ids)
             val_str = st.text_input("Valor (R$)", value="")
             val = parse_money_br(val_str) if val_str else 0.0
-            d = st.date_input("Data", value=date.today(), format="DD/MM/YY")
+            d = st.date_input("Data", value=date.today(), format="DD/MM/YYYY")
             desc = st.text_input("Descrição", value="")
             if st.button("Lançar"):
                 if val > 0 and bucket_id:
-                    m = Movement(user_id=user_id, bucket_id=bucket_id, kind=kind, amount=val, description=desc, date=d)
-                    db.add(m)
-                    b = db.get(Bucket, bucket_id)
-                    if b and b.user_id == user_id:
-                        if kind == "income":
-                            b.balance += val
-                        elif kind in ("expense", "transfer"):
-                            if not allow_negative and b.balance - val < 0:
-                                st.error("Saldo insuficiente no balde selecionado (desmarque o bloqueio para permitir negativo).")
-                                db.rollback(); st.stop()
-                            else:
-                                b.balance -= val
-                    db.commit(); st.success("Movimentação lançada")
+                    try:
+                        services.add_movement(db, user_id, bucket_id, kind, val, desc, d, allow_negative)
+                    except services.InsufficientFunds:
+                        st.error("Saldo insuficiente no balde selecionado (desmarque o bloqueio para permitir negativo).")
+                    except services.ServiceError as e:
+                        st.error(str(e))
+                    else:
+                        cache.bump_version(user_id); st.success("Movimentação lançada")
                 else:
                     st.warning("Informe um valor > 0 e selecione um balde.")
 
-        movs = load_movements(db, user_id)
+        # Importação de extratos (OFX/CSV) em lote, com deduplicação
+        with st.expander("Importar extrato bancário (OFX/CSV)"):
+            up = st.file_uploader("Arquivo do extrato", type=["ofx", "qfx", "csv"], key="import_file")
+            imp_bucket = st.selectbox("Balde padrão", ids, key="import_bucket")
+            imp_rules = st.text_area(
+                "Regras (uma por linha: trecho da descrição = ID do balde)",
+                value="", placeholder="ifood = 2\nsalário = 1", key="import_rules"
+            )
+            if st.button("Importar extrato") and up is not None:
+                st.session_state["import_job"] = jobs.submit(
+                    "import", user_id, data=up.getvalue(), filename=up.name, rules=imp_rules,
+                    default_bucket_id=imp_bucket,
+                )
+            imp_job = render_job("import_job", "import", user_id)
+            if imp_job:
+                st.session_state.pop("import_job", None)
+                res = imp_job["result"]
+                st.success(
+                    f"Extrato importado: {res['inserted']} novas movimentações, "
+                    f"{res['duplicates']} já existentes ignoradas."
+                )
+
+        # Histórico paginado (keyset em date/id; filtros aplicados no SQL)
+        st.subheader("Histórico")
+        fc1, fc2, fc3, fc4 = st.columns(4)
+        with fc1:
+            f_bucket = st.selectbox("Filtrar balde", ["Todos"] + ids, key="ledger_f_bucket")
+        with fc2:
+            f_kind = st.selectbox("Filtrar tipo", ["Todos", "income", "expense", "transfer"], key="ledger_f_kind")
+        with fc3:
+            f_range = st.date_input("Período", value=(), format="DD/MM/YYYY", key="ledger_f_range")
+        with fc4:
+            page_size = st.selectbox("Linhas por página", [25, 50, 100], index=1, key="ledger_page_size")
+        f_bucket = None if f_bucket == "Todos" else f_bucket
+        f_kind = None if f_kind == "Todos" else f_kind
+        f_from = f_range[0] if len(f_range) > 0 else None
+        f_to = f_range[1] if len(f_range) > 1 else f_from
+
+        # Busca textual (FTS5) com os mesmos filtros; a listagem paginada segue abaixo
+        f_query = st.text_input("Buscar na descrição", key="ledger_search",
+                                placeholder="Ex.: ifood, farmácia (sem acento também)").strip()
+        if f_query:
+            found = cache.search_movements(user_id, f_query, f_bucket, f_kind, f_from, f_to)
+            if found:
+                st.caption(f"{len(found)} resultado(s) por relevância" + (" — mostrando os 200 primeiros" if len(found) == 200 else ""))
+                st.dataframe(format_columns(pd.DataFrame([{
+                    "Data": m.date, "Tipo": m.kind, "BaldeID": m.bucket_id,
+                    "Valor": m.amount, "Descrição": m.description
+                } for m in found]), money=["Valor"], dates=["Data"]), use_container_width=True)
+            else:
+                st.info("Nada encontrado para a busca.")
+
+        # Pilha de cursores; reinicia quando os filtros mudam
+        filt_key = (f_bucket, f_kind, f_from, f_to, page_size)
+        if st.session_state.get("ledger_filters") != filt_key:
+            st.session_state["ledger_filters"] = filt_key
+            st.session_state["ledger_cursors"] = [None]
+        cursors = st.session_state["ledger_cursors"]
+
+        total_rows = cache.ledger_count(user_id, f_bucket, f_kind, f_from, f_to)
+        movs, next_cursor = cache.ledger_page(user_id, cursors[-1], page_size, f_bucket, f_kind, f_from, f_to)
         if movs:
-            df = pd.DataFrame([{
-                "Data": date_br(m.date), "Tipo": m.kind, "BaldeID": m.bucket_id,
-                "Valor": money_br(m.amount), "Descrição": m.description
-            } for m in movs])
+            df = format_columns(pd.DataFrame([{
+                "Data": m.date, "Tipo": m.kind, "BaldeID": m.bucket_id,
+                "Valor": m.amount, "Descrição": m.description
+            } for m in movs]), money=["Valor"], dates=["Data"])
             st.dataframe(df, use_container_width=True)
-            csv = df.to_csv(index=False).encode("utf-8")
-            st.download_button("Exportar CSV", data=csv, file_name="livro_caixa.csv")
-        else:
+
+            n_page = len(cursors)
+            n_pages = max(1, -(-total_rows // page_size))
+            nav1, nav2, nav3 = st.columns([1, 2, 1])
+            with nav1:
+                if st.button("◀ Anterior", disabled=n_page <= 1):
+                    cursors.pop(); st.rerun()
+            with nav2:
+                st.caption(f"Página {n_page} de {n_pages} — {total_rows} movimentações")
+            with nav3:
+                if st.button("Próxima ▶", disabled=next_cursor is None):
+                    cursors.append(next_cursor); st.rerun()
+
+            # Exportação em streaming para arquivo temporário (com os filtros atuais)
+            st.subheader("Exportar")
+            ex1, ex2 = st.columns(2)
+            with ex1:
+                fmts = ["csv", "parquet"] if parquet_available() else ["csv"]
+                ex_fmt = st.radio("Formato", fmts, horizontal=True, key="export_fmt")
+            with ex2:
+                ex_display = st.checkbox("Valores formatados (R$ e dd/mm/aaaa)", value=False, key="export_display")
+            if st.button("Gerar arquivo"):
+                st.session_state["export_job"] = jobs.submit(
+                    "export", user_id, fmt=ex_fmt, formatted=ex_display,
+                    bucket_id=f_bucket, kind=f_kind, date_from=f_from, date_to=f_to,
+                )
+            ex_job = render_job("export_job", "export", user_id)
+            export_path = ex_job["result"]["path"] if ex_job else None
+            if export_path and os.path.exists(export_path):
+                ext = os.path.splitext(export_path)[1]
+                # O Streamlit serve o download da memória: com um callable o arquivo só é
+                # lido no clique, não a cada rerun da página (jobs._prune apaga o anterior)
+                st.download_button(f"Exportar {ext[1:].upper()}", data=Path(export_path).read_bytes,
+                                   file_name=f"livro_caixa{ext}")
+            elif ex_job:
+                st.info("O arquivo exportado expirou; gere de novo.")
+        elif total_rows == 0 and f_bucket is None and f_kind is None and f_from is None:
             st.info("Sem movimentações ainda.")
+        else:
+            st.info("Nenhuma movimentação para os filtros escolhidos.")
 
 elif page == "Calendário":
+    import pandas as pd
     st.title("🗓️ Calendário de Despesas")
     with get_db() as db:
         with st.form("nova_conta"):
             title = st.text_input("Título", placeholder="Ex.: Cartão C6 - Fatura")
             amount_str = st.text_input("Valor (R$)", value="")
             amount = parse_money_br(amount_str) if amount_str else 0.0
-            due = st.date_input("Vencimento", value=date.today(), format="DD/MM/YY")
+            due = st.date_input("Vencimento", value=date.today(), format="DD/MM/YYYY")
             critical = st.checkbox("Crítica (cartão/ empréstimo/ consórcio)")
             submitted = st.form_submit_button("Adicionar")
             if submitted and title.strip():
-                b = Bill(user_id=user_id, title=title.strip(), amount=amount, due_date=due, is_critical=critical, paid=False)
-                db.add(b); db.commit()
+                services.create_bill(db, user_id, title, amount, due, critical)
+                cache.bump_version(user_id)
                 st.success("Conta adicionada.")
 
-        bills = load_bills(db, user_id)
+        bill_query = st.text_input("Buscar conta", key="bills_search", placeholder="Ex.: cartão, saúde").strip()
+        bills = cache.search_bills(user_id, bill_query) if bill_query else cache.bills(user_id)
+        if bill_query and not bills:
+            st.info("Nenhuma conta encontrada para a busca.")
         if bills:
-            df = pd.DataFrame([{
-                "ID": b.id, "Título": b.title, "Valor": money_br(b.amount),
-                "Vencimento": date_br(b.due_date), "Crítica": b.is_critical, "Paga": b.paid
-            } for b in bills])
+            df = format_columns(pd.DataFrame([{
+                "ID": b.id, "Título": b.title, "Valor": b.amount,
+                "Vencimento": b.due_date, "Crítica": b.is_critical, "Paga": b.paid
+            } for b in bills]), money=["Valor"], dates=["Vencimento"])
             st.dataframe(df, use_container_width=True)
 
             st.subheader("Editar conta")
@@ -564,34 +764,106 @@ elif page == "Calendário":
                     title2 = st.text_input("Título", value=b.title)
                     amount2_str = st.text_input("Valor (R$)", value=str(b.amount).replace('.', ','))
                     amount2 = parse_money_br(amount2_str) if amount2_str else b.amount
-                    due2 = st.date_input("Vencimento", value=b.due_date, format="DD/MM/YY")
+                    due2 = st.date_input("Vencimento", value=b.due_date, format="DD/MM/YYYY")
                     critical2 = st.checkbox("Crítica", value=b.is_critical)
                     paid2 = st.checkbox("Paga", value=b.paid)
                     confirm = st.checkbox("Confirmar alterações")
                     sb = st.form_submit_button("Salvar alterações")
                     if sb and confirm:
-                        b.title, b.amount, b.due_date, b.is_critical, b.paid = title2, amount2, due2, critical2, paid2
-                        db.commit(); st.success("Conta atualizada!")
+                        services.update_bill(db, user_id, b.id, title=title2, amount=amount2, due_date=due2,
+                                             is_critical=critical2, paid=paid2)
+                        cache.bump_version(user_id); st.success("Conta atualizada!")
                     elif sb and not confirm:
                         st.warning("Confirme as alterações marcando a caixa.")
 
+        # Contas recorrentes: só a regra fica salva; ocorrências são geradas para a janela escolhida
+        import recurring
+        st.subheader("Contas recorrentes")
+        with st.form("nova_recorrente"):
+            r_title = st.text_input("Título", placeholder="Ex.: Aluguel, Fatura do cartão", key="rec_title")
+            r_amount_str = st.text_input("Valor (R$)", value="", key="rec_amount")
+            r_amount = parse_money_br(r_amount_str) if r_amount_str else 0.0
+            r_first = st.date_input("Primeiro vencimento", value=date.today(), format="DD/MM/YYYY", key="rec_first")
+            c1, c2 = st.columns(2)
+            r_freq = c1.selectbox("Frequência", list(recurring.FREQS), format_func=recurring.FREQS.get, key="rec_freq")
+            r_every = c2.number_input("A cada (períodos)", min_value=1, max_value=24, value=1, step=1, key="rec_every")
+            r_has_end = st.checkbox("Tem último vencimento", key="rec_has_end")
+            r_end = st.date_input("Último vencimento", value=date.today() + timedelta(days=365), format="DD/MM/YYYY",
+                                  key="rec_end")
+            r_critical = st.checkbox("Crítica (cartão/ empréstimo/ consórcio)", key="rec_critical")
+            r_past_paid = st.checkbox("Vencimentos anteriores a hoje já foram pagos", value=True, key="rec_past_paid")
+            if st.form_submit_button("Adicionar recorrente") and r_title.strip():
+                try:
+                    services.create_recurring_bill(
+                        db, user_id, r_title, r_amount, r_first, r_freq, int(r_every),
+                        end_date=r_end if r_has_end else None, is_critical=r_critical,
+                        settled_through=date.today() - timedelta(days=1) if r_past_paid else None,
+                    )
+                    cache.bump_version(user_id)
+                    st.success("Conta recorrente adicionada.")
+                except services.ServiceError as e:
+                    st.warning(str(e))
+
+        recs = cache.recurring_bills(user_id)
+        if recs:
+            st.dataframe(format_columns(pd.DataFrame([{
+                "ID": r.id, "Título": r.title, "Valor": r.amount, "Regra": recurring.describe(r.rule, r.start_date),
+                "Início": r.start_date, "Fim": date_br(r.end_date) if r.end_date else "—", "Crítica": r.is_critical,
+            } for r in recs]), money=["Valor"], dates=["Início"]), use_container_width=True, hide_index=True)
+
+            today = date.today()
+            window = st.date_input("Ocorrências entre", value=(today - timedelta(days=30), today + timedelta(days=60)),
+                                   format="DD/MM/YYYY", key="rec_window")
+            if isinstance(window, (tuple, list)) and len(window) == 2:
+                occs = cache.occurrences(user_id, window[0], window[1])
+                if occs:
+                    st.dataframe(format_columns(pd.DataFrame([{
+                        "ID": o.id, "Título": o.title, "Valor": o.amount,
+                        "Vencimento": o.due_date, "Crítica": o.is_critical, "Paga": o.paid
+                    } for o in occs]), money=["Valor"], dates=["Vencimento"]), use_container_width=True, hide_index=True)
+                    sel_o = st.selectbox("Ocorrência", [o.id for o in occs], key="rec_occ_sel")
+                    o = next(x for x in occs if x.id == sel_o)
+                    with st.form(f"edit_occ_{sel_o}"):
+                        amount_o_str = st.text_input("Valor (R$)", value=str(o.amount).replace('.', ','))
+                        amount_o = parse_money_br(amount_o_str) if amount_o_str else o.amount
+                        due_o = st.date_input("Vencimento", value=o.due_date, format="DD/MM/YYYY")
+                        paid_o = st.checkbox("Paga", value=o.paid)
+                        if st.form_submit_button("Salvar ocorrência"):
+                            services.update_occurrence(db, user_id, o.id, amount=amount_o, due_date=due_o, paid=paid_o)
+                            cache.bump_version(user_id); st.success("Ocorrência atualizada!")
+                else:
+                    st.write("Nenhuma ocorrência nesta janela.")
+
+            with st.expander("Encerrar ou apagar recorrente"):
+                sel_r = st.selectbox("ID da recorrente", [r.id for r in recs], key="rec_sel")
+                end_r = st.date_input("Último vencimento", value=today, format="DD/MM/YYYY", key="rec_stop")
+                c1, c2 = st.columns(2)
+                if c1.button("Encerrar série", key="rec_stop_btn"):
+                    services.update_recurring_bill(db, user_id, sel_r, end_date=end_r)
+                    cache.bump_version(user_id); st.success("Série encerrada.")
+                confirm_r = c2.checkbox("Confirmo apagar a série e o histórico", key="rec_del_confirm")
+                if c2.button("Apagar", key="rec_del_btn", disabled=not confirm_r):
+                    services.delete_recurring_bill(db, user_id, sel_r)
+                    cache.bump_version(user_id); st.success("Série apagada.")
+
 elif page == "Atrasos & Riscos":
+    import pandas as pd
     st.title("⏰ Atrasos & Riscos")
     today = date.today()
     with get_db() as db:
-        bills = load_bills(db, user_id)
-        overdue = [b for b in bills if (not b.paid and b.due_date < today)]
-        due_soon = [b for b in bills if (not b.paid and today <= b.due_date <= today + timedelta(days=3))]
+        overdue, due_soon, risk_h = cache.due_alerts(user_id, 3, today)
+        bills = overdue + due_soon
 
         # Reforço de alertas aqui também
-        render_alerts(overdue, due_soon, money_fmt=money_br, date_fmt=date_br)
+        render_alerts(overdue, due_soon, money_fmt=money_br, date_fmt=date_br, alert_hash=risk_h,
+                      state_key=f"last_alerts_hash:{user_id}:3")
 
         st.subheader("Vencidas")
         if overdue:
-            df1 = pd.DataFrame([{
-                "ID": b.id, "Título": b.title, "Valor": money_br(b.amount),
-                "Venceu em": date_br(b.due_date), "Crítica": b.is_critical, "Paga": b.paid
-            } for b in overdue])
+            df1 = format_columns(pd.DataFrame([{
+                "ID": b.id, "Título": b.title, "Valor": b.amount,
+                "Venceu em": b.due_date, "Crítica": b.is_critical, "Paga": b.paid
+            } for b in overdue]), money=["Valor"], dates=["Venceu em"])
             st.dataframe(df1, use_container_width=True)
             ids1 = [b.id for b in overdue]
             sel1 = st.selectbox("ID vencida", ids1) if ids1 else None
@@ -601,14 +873,15 @@ elif page == "Atrasos & Riscos":
                     title2 = st.text_input("Título", value=b.title)
                     amount2_str = st.text_input("Valor (R$)", value=str(b.amount).replace('.', ','))
                     amount2 = parse_money_br(amount2_str) if amount2_str else b.amount
-                    due2 = st.date_input("Vencimento", value=b.due_date, format="DD/MM/YY")
+                    due2 = st.date_input("Vencimento", value=b.due_date, format="DD/MM/YYYY")
                     critical2 = st.checkbox("Crítica", value=b.is_critical)
                     paid2 = st.checkbox("Paga", value=b.paid)
                     confirm = st.checkbox("Confirmar alterações")
                     sb = st.form_submit_button("Salvar")
                     if sb and confirm:
-                        b.title, b.amount, b.due_date, b.is_critical, b.paid = title2, amount2, due2, critical2, paid2
-                        db.commit(); st.success("Atualizada!")
+                        services.update_bill(db, user_id, b.id, title=title2, amount=amount2, due_date=due2,
+                                             is_critical=critical2, paid=paid2)
+                        cache.bump_version(user_id); st.success("Atualizada!")
                     elif sb and not confirm:
                         st.warning("Confirme as alterações marcando a caixa.")
         else:
@@ -616,10 +889,10 @@ elif page == "Atrasos & Riscos":
 
         st.subheader("Vencendo em até 3 dias")
         if due_soon:
-            df2 = pd.DataFrame([{
-                "ID": b.id, "Título": b.title, "Valor": money_br(b.amount),
-                "Vencimento": date_br(b.due_date), "Crítica": b.is_critical, "Paga": b.paid
-            } for b in due_soon])
+            df2 = format_columns(pd.DataFrame([{
+                "ID": b.id, "Título": b.title, "Valor": b.amount,
+                "Vencimento": b.due_date, "Crítica": b.is_critical, "Paga": b.paid
+            } for b in due_soon]), money=["Valor"], dates=["Vencimento"])
             st.dataframe(df2, use_container_width=True)
             ids2 = [b.id for b in due_soon]
             sel2 = st.selectbox("ID a vencer", ids2) if ids2 else None
@@ -629,32 +902,146 @@ elif page == "Atrasos & Riscos":
                     title2 = st.text_input("Título", value=b.title)
                     amount2_str = st.text_input("Valor (R$)", value=str(b.amount).replace('.', ','))
                     amount2 = parse_money_br(amount2_str) if amount2_str else b.amount
-                    due2 = st.date_input("Vencimento", value=b.due_date, format="DD/MM/YY")
+                    due2 = st.date_input("Vencimento", value=b.due_date, format="DD/MM/YYYY")
                     critical2 = st.checkbox("Crítica", value=b.is_critical)
                     paid2 = st.checkbox("Paga", value=b.paid)
                     confirm = st.checkbox("Confirmar alterações")
                     sb = st.form_submit_button("Salvar")
                     if sb and confirm:
-                        b.title, b.amount, b.due_date, b.is_critical, b.paid = title2, amount2, due2, critical2, paid2
-                        db.commit(); st.success("Atualizada!")
+                        services.update_bill(db, user_id, b.id, title=title2, amount=amount2, due_date=due2,
+                                             is_critical=critical2, paid=paid2)
+                        cache.bump_version(user_id); st.success("Atualizada!")
                     elif sb and not confirm:
                         st.warning("Confirme as alterações marcando a caixa.")
         else:
             st.write("Sem contas críticas nos próximos 3 dias.")
 
+        # Projeção de caixa (Monte Carlo) — em cache até a próxima escrita do usuário
+        st.subheader("Projeção de caixa")
+        horizon = st.select_slider("Horizonte (meses)", options=[3, 6, 9, 12], value=6, key="proj_months")
+        # Calculada em segundo plano (jobs.py) e lida do cache; a página redesenha quando termina
+        proj = cache.projection.peek(user_id, int(horizon), 10_000, 0, today)
+        if proj is None:
+            last_id = st.session_state.get("projection_job")
+            last = jobs.get(last_id) if last_id else None
+            retry = False
+            if last is not None and last["status"] in ("failed", "cancelled"):
+                retry = st.button("Calcular projeção de novo", key="proj_retry")
+            if last is None or last["status"] == "done" or retry:
+                st.session_state["projection_job"] = jobs.submit(
+                    "projection", user_id, months=int(horizon), n_paths=10_000, seed=0, today=today)
+            render_job("projection_job", "projection", user_id)
+        else:
+            flows = proj["flows"]
+            base = "histórico" if flows["history_months"] >= 3 else "receita/despesa declaradas"
+            st.caption(
+                f"{proj['paths']} cenários • base: {base} • entradas ~ {money_br(flows['mu_in'])}/mês, "
+                f"saídas variáveis ~ {money_br(flows['mu_out'])}/mês"
+            )
+            st.metric("Chance de o saldo total ficar negativo no período", f"{proj['p_negative_any']*100:.1f}%")
+            df_proj = pd.DataFrame({
+                "Fim do mês": date_br_many(proj["checkpoint_dates"]),
+                "Pessimista (P10)": money_br_many(proj["total_pct"][10]),
+                "Provável (P50)": money_br_many(proj["total_pct"][50]),
+                "Otimista (P90)": money_br_many(proj["total_pct"][90]),
+                "Chance negativo": [f"{p*100:.1f}%" for p in proj["p_negative"]],
+            })
+            st.dataframe(df_proj, use_container_width=True, hide_index=True)
+            if proj["buckets"]:
+                st.write("Saldo provável (P50) por balde:")
+                st.dataframe(pd.DataFrame(
+                    [money_br_many(row) for row in proj["bucket_pct"][50]],
+                    index=date_br_many(proj["checkpoint_dates"]),
+                    columns=[name for _, name in proj["buckets"]],
+                ), use_container_width=True)
+            if proj["bill_risks"]:
+                st.write("Risco de não cobrir contas críticas:")
+                st.dataframe(format_columns(pd.DataFrame([{
+                    "Conta": r["title"], "Valor": r["amount"],
+                    "Vencimento": r["due_date"], "Chance de faltar": f"{r['p_miss']*100:.1f}%",
+                } for r in proj["bill_risks"]]), money=["Valor"], dates=["Vencimento"]),
+                    use_container_width=True, hide_index=True)
+
 elif page == "Configurações":
     st.title("⚙️ Configurações")
     st.write("Altere o usuário ativo pela barra lateral.")
     with get_db() as db:
         if st.button("Reset (apagar tudo)"):
-            db.query(Bill).delete()
-            db.query(Movement).delete()
-            db.query(GiantPayment).delete()
-            db.query(Giant).delete()
-            db.query(Bucket).delete()
-            db.query(UserProfile).delete()
-            db.query(User).delete()
-            db.commit()
+            st.session_state["reset_job"] = jobs.submit("reset")
+        if render_job("reset_job", "reset", None):
+            st.session_state.pop("reset_job", None)
             st.session_state.pop("user_id", None)
             st.session_state.pop("user_name", None)
-            st.success("Banco limpo. Recarregue e crie um novo usuário.")
\ No newline at end of file
+            st.success("Banco limpo. Recarregue e crie um novo usuário.")
+
+    st.subheader("Conferência de saldos")
+    st.caption("Compara o saldo de cada balde com o livro caixa, somando só as movimentações novas "
+               "desde a última conferência. Roda sozinha após lotes, importações e periodicamente.")
+    if st.button("Conferir agora"):
+        with get_db() as db:
+            res = services.reconcile_balances(db, user_id)
+        st.info(f"{res['checked']} baldes conferidos, {res['folded']} movimentações novas.")
+        for i in res["issues"]:
+            if i["history_diff"]:
+                st.warning(f"{i['name']}: movimentações antigas foram alteradas "
+                           f"({money_br(i['history_diff'])} no livro caixa).")
+    with get_db() as db:
+        drifts = reconcile.issues(db.connection(), user_id)
+    if not drifts:
+        st.success("Saldos conferem com o livro caixa.")
+    else:
+        import pandas as pd
+        st.warning("Há baldes com saldo diferente do livro caixa.")
+        st.dataframe(format_columns(pd.DataFrame([{
+            "Balde": d["name"], "Saldo": d["balance"], "Esperado": d["balance"] - d["drift"],
+            "Diferença": d["drift"],
+        } for d in drifts]), money=["Saldo", "Esperado", "Diferença"]), use_container_width=True, hide_index=True)
+        c1, c2 = st.columns(2)
+        if c1.button("Corrigir saldos pelo livro caixa"):
+            with get_db() as db:
+                services.reconcile_balances(db, user_id, repair=True)
+            cache.bump_version(user_id)
+            st.rerun()
+        if c2.button("Aceitar saldos atuais"):
+            with get_db() as db:
+                services.reconcile_balances(db, user_id, accept=True)
+            st.rerun()
+
+    st.subheader("Snapshots do banco")
+    st.caption("Cópias compactadas do banco inteiro, feitas com o app rodando. "
+               "Um snapshot também é feito antes de cada reset e de cada restauração.")
+    if st.button("Criar snapshot agora"):
+        st.session_state["backup_job"] = jobs.submit("backup", label="manual")
+    done = render_job("backup_job", "backup", None)
+    if done:
+        st.success(f"Snapshot {done['result']['name']} criado.")
+    snaps = backup.list_snapshots()
+    if not snaps:
+        st.info("Nenhum snapshot ainda.")
+    else:
+        import pandas as pd
+        st.dataframe(pd.DataFrame([{
+            "Snapshot": s["name"], "Criado em": s["created_at"].strftime("%d/%m/%Y %H:%M:%S"),
+            "Tipo": s["label"] or "-", "Tamanho (MB)": round(s["bytes"] / 1e6, 2),
+        } for s in snaps]), use_container_width=True, hide_index=True)
+        with st.expander("Restaurar meus dados de um snapshot"):
+            st.write("Baldes, gigantes, movimentações e contas **deste usuário** voltam ao estado do snapshot; "
+                     "os demais usuários não mudam.")
+            with st.form("restore_form"):
+                r_name = st.selectbox("Snapshot", [s["name"] for s in snaps])
+                r_ok = st.checkbox("Entendo que meus dados atuais serão substituídos")
+                if st.form_submit_button("Restaurar"):
+                    if not r_ok:
+                        st.warning("Confirme a substituição dos dados.")
+                    else:
+                        st.session_state["restore_job"] = jobs.submit("restore", user_id, name=r_name)
+        done = render_job("restore_job", "restore", user_id)
+        if done:
+            rows = done["result"]["rows"]
+            st.success(f"Dados restaurados de {done['result']['snapshot']}: {rows['buckets']} baldes, "
+                       f"{rows['giants']} gigantes, {rows['movements']} movimentações, "
+                       f"{rows['bills'] + rows['recurring_bills']} contas.")
+
+report = instrument.finish(state=st.session_state)
+if report:
+    render_debug_panel(report)
@@ -0,0 +1,312 @@
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine
+
+import reconcile
+from services import NotFound, ServiceError
+
+# ===============================================
+# Snapshots do banco (API de backup online do SQLite)
+# ===============================================
+# Copiar davi.db com o app rodando pode pegar uma transação pela metade. Aqui a
+# cópia usa sqlite3.Connection.backup em passos de PAGES_PER_STEP páginas: a
+# trava de leitura é solta entre um passo e outro, então quem grava nunca espera
+# mais que um passo. Se outra conexão gravar no meio, o SQLite recomeça a cópia;
+# depois de MAX_RESTARTS recomeços ela sai num passo só (no WAL, leitura não
+# bloqueia escrita). A cópia passa por quick_check e vira um .db.gz em
+# BACKUP_DIR (gravado em .part e renomeado: nunca fica arquivo pela metade).
+# Retenção: os KEEP_LAST mais recentes + o último de cada um dos KEEP_MONTHLY
+# meses. O app agenda um snapshot a cada EVERY_HOURS (tarefa em segundo plano);
+# `python backup.py snapshot` serve para cron.
+# Restauração é por usuário: o snapshot é anexado (ATTACH) e só as linhas do
+# usuário são trocadas, com ids novos (os antigos podem já ser de outro usuário).
+
+BACKUP_DIR = os.getenv("DAVI_BACKUP_DIR", "./backups")
+PAGES_PER_STEP = int(os.getenv("DAVI_BACKUP_PAGES", "1024"))  # 4 MB com páginas de 4 KiB
+STEP_PAUSE = float(os.getenv("DAVI_BACKUP_STEP_PAUSE", "0.002"))  # folga p/ escritores entre passos
+MAX_RESTARTS = 5
+COMPRESS_LEVEL = int(os.getenv("DAVI_BACKUP_COMPRESS_LEVEL", "6"))
+EVERY_HOURS = float(os.getenv("DAVI_BACKUP_EVERY_HOURS", "24"))  # 0 = sem agendamento
+KEEP_LAST = int(os.getenv("DAVI_BACKUP_KEEP", "7"))
+KEEP_MONTHLY = int(os.getenv("DAVI_BACKUP_KEEP_MONTHLY", "6"))
+
+_NAME = re.compile(r"davi-(\d{8}-\d{6})(?:-([a-z0-9-]+))?\.db\.gz")
+
+# Tabelas de um usuário, na ordem de inserção (pais antes dos filhos).
+# Valor: colunas que apontam para ids de outra tabela do usuário (remapeados)
+USER_TABLES = {
+    "user_profiles": {},
+    "buckets": {},
+    "giants": {},
+    "recurring_bills": {},
+    "movements": {"bucket_id": "buckets"},
+    "bills": {},
+    "giant_payments": {"giant_id": "giants"},
+    "bill_occurrences": {"recurring_id": "recurring_bills"},
+}
+_REFERENCED = {t for refs in USER_TABLES.values() for t in refs.values()}
+
+class _Restarted(Exception):
+    pass
+
+def db_path(engine: Engine) -> str:
+    path = engine.url.database
+    if engine.dialect.name != "sqlite" or path in (None, "", ":memory:") or "mode=memory" in str(engine.url):
+        raise ServiceError("Snapshots só funcionam com o banco SQLite em arquivo.")
+    return os.path.abspath(path)
+
+@contextmanager
+def _scratch(suffix: str = ".db"):
+    # Arquivo temporário no próprio BACKUP_DIR (mesmo disco do destino); some no fim
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=BACKUP_DIR, prefix=".tmp-", suffix=suffix)
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        for p in (path, path + "-journal", path + "-wal", path + "-shm"):
+            if os.path.exists(p):
+                os.remove(p)
+
+# =========
+# Snapshot
+# =========
+def copy_online(src_path: str, dst_path: str, on_progress: Optional[Callable[[float], None]] = None) -> int:
+    # Cópia consistente do banco vivo em passos; devolve o número de páginas
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(dst_path)
+    state = {"left": None, "restarts": 0}
+
+    def step(status, remaining, total):
+        # Passo bem-sucedido sempre diminui o que falta; se não diminuiu, a cópia recomeçou
+        if status == sqlite3.SQLITE_OK and state["left"] is not None and remaining >= state["left"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _Restarted()
+        state["left"] = remaining
+        if on_progress:
+            on_progress(1 - remaining / total if total else 1.0)
+        if remaining and STEP_PAUSE:
+            time.sleep(STEP_PAUSE)
+
+    try:
+        try:
+            src.backup(dst, pages=PAGES_PER_STEP, progress=step)
+        except _Restarted:
+            src.backup(dst)  # escrita contínua: um passo só (um único snapshot de leitura)
+        # Arquivo autossuficiente (sem -wal ao lado) e conferido antes de arquivar
+        dst.execute("PRAGMA journal_mode=DELETE")
+        ok = dst.execute("PRAGMA quick_check").fetchone()[0]
+        if ok != "ok":
+            raise ServiceError(f"Cópia do banco falhou na verificação: {ok}")
+        return dst.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+def _archive_name(now: datetime, label: str) -> str:
+    label = re.sub(r"[^a-z0-9-]+", "-", (label or "").lower()).strip("-")
+    while True:
+        name = f"davi-{now:%Y%m%d-%H%M%S}" + (f"-{label}" if label else "") + ".db.gz"
+        if not os.path.exists(os.path.join(BACKUP_DIR, name)):
+            return name
+        now += timedelta(seconds=1)
+
+def snapshot(engine: Optional[Engine] = None, label: str = "",
+             on_progress: Optional[Callable[[float], None]] = None) -> Dict:
+    if engine is None:
+        from db import engine
+    src_path = db_path(engine)
+    t0 = time.perf_counter()
+    with _scratch() as tmp:
+        # 90% do progresso é a cópia; o resto, a compressão
+        pages = copy_online(src_path, tmp, (lambda f: on_progress(0.9 * f)) if on_progress else None)
+        raw_bytes = os.path.getsize(tmp)
+        name = _archive_name(datetime.now(), label)
+        path = os.path.join(BACKUP_DIR, name)
+        part = path + ".part"
+        try:
+            with open(tmp, "rb") as fin, gzip.open(part, "wb", compresslevel=COMPRESS_LEVEL) as fout:
+                shutil.copyfileobj(fin, fout, 1 << 20)
+            os.replace(part, path)
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+    removed = prune()
+    return {"name": name, "path": path, "pages": pages, "raw_bytes": raw_bytes,
+            "bytes": os.path.getsize(path), "seconds": round(time.perf_counter() - t0, 3), "pruned": removed}
+
+# ======================
+# Lista, retenção, agenda
+# ======================
+def list_snapshots() -> List[Dict]:
+    # Mais recente primeiro
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    out = []
+    for entry in os.scandir(BACKUP_DIR):
+        m = _NAME.fullmatch(entry.name)
+        if m and entry.is_file():
+            out.append({"name": entry.name, "path": entry.path, "label": m.group(2) or "",
+                        "created_at": datetime.strptime(m.group(1), "%Y%m%d-%H%M%S"),
+                        "bytes": entry.stat().st_size})
+    return sorted(out, key=lambda s: s["created_at"], reverse=True)
+
+def prune(keep_last: int = KEEP_LAST, keep_monthly: int = KEEP_MONTHLY) -> List[str]:
+    snaps = list_snapshots()
+    keep = {s["name"] for s in snaps[:max(keep_last, 1)]}
+    months: List[str] = []
+    for s in snaps:
+        ym = s["created_at"].strftime("%Y-%m")
+        if ym not in months and len(months) < keep_monthly:
+            months.append(ym)
+            keep.add(s["name"])
+    removed = [s["name"] for s in snaps if s["name"] not in keep]
+    for name in removed:
+        os.remove(os.path.join(BACKUP_DIR, name))
+    return removed
+
+def due(engine: Engine, now: Optional[datetime] = None) -> bool:
+    # Agenda: passou EVERY_HOURS desde o último snapshot (qualquer um, manual ou automático)
+    if EVERY_HOURS <= 0:
+        return False
+    try:
+        db_path(engine)
+    except ServiceError:
+        return False
+    snaps = list_snapshots()
+    now = now or datetime.now()
+    return not snaps or now - snaps[0]["created_at"] >= timedelta(hours=EVERY_HOURS)
+
+def snapshot_path(name: str) -> str:
+    # Só nomes gerados aqui (nada de caminho arbitrário vindo da tela/API)
+    path = os.path.join(BACKUP_DIR, name or "")
+    if not _NAME.fullmatch(name or "") or not os.path.isfile(path):
+        raise NotFound(f"Snapshot {name} não encontrado.")
+    return path
+
+# ===========================
+# Restauração de um usuário
+# ===========================
+def _columns(con: Connection, schema: str, table: str) -> List[str]:
+    return [r[1] for r in con.exec_driver_sql(f"PRAGMA {schema}.table_info({table})").all()]
+
+def _copy_table(con: Connection, table: str, refs: Dict[str, str], src_uid: int, dst_uid: int) -> int:
+    have = set(_columns(con, "snap", table))
+    cols = [c for c in _columns(con, "main", table) if c in have and c not in ("id", "user_id")]
+    exprs, joins = [], []
+    for c in cols:
+        if c in refs:
+            joins.append(f"LEFT JOIN temp._restore_map m_{c} ON m_{c}.tbl = '{refs[c]}' AND m_{c}.old = s.{c}")
+            exprs.append(f"m_{c}.new")
+        else:
+            exprs.append(f"s.{c}")
+    col_list = "".join(f", {c}" for c in cols)
+    if table not in _REFERENCED:
+        return con.exec_driver_sql(
+            f"INSERT INTO main.{table} (user_id{col_list}) SELECT ?{''.join(', ' + e for e in exprs)} "
+            f"FROM snap.{table} s {' '.join(joins)} WHERE s.user_id = ? ORDER BY s.id", (dst_uid, src_uid)
+        ).rowcount
+    # Tabelas referenciadas (poucas linhas): uma a uma, guardando id antigo -> novo
+    rows = con.exec_driver_sql(
+        f"SELECT s.id{''.join(', s.' + c for c in cols)} FROM snap.{table} s WHERE s.user_id = ? ORDER BY s.id",
+        (src_uid,)
+    ).all()
+    marks = ", ".join("?" for _ in range(len(cols) + 1))
+    for old, *values in rows:
+        new = con.exec_driver_sql(
+            f"INSERT INTO main.{table} (user_id{col_list}) VALUES ({marks})", (dst_uid, *values)
+        ).lastrowid
+        con.exec_driver_sql("INSERT INTO temp._restore_map (tbl, old, new) VALUES (?, ?, ?)", (table, old, new))
+    return len(rows)
+
+def _source_user(con: Connection, user_id: int, source_user_id: Optional[int]) -> int:
+    # Por padrão, o usuário do snapshot com o mesmo nome do usuário atual
+    if source_user_id is not None:
+        row = con.exec_driver_sql("SELECT id FROM snap.users WHERE id = ?", (source_user_id,)).first()
+    else:
+        row = con.exec_driver_sql(
+            "SELECT s.id FROM snap.users s JOIN main.users m ON m.name = s.name WHERE m.id = ?", (user_id,)
+        ).first()
+    if row is None:
+        raise NotFound("Usuário não encontrado no snapshot.")
+    return row[0]
+
+def restore_user(name: str, user_id: int, source_user_id: Optional[int] = None,
+                 engine: Optional[Engine] = None) -> Dict:
+    # Troca baldes, gigantes, movimentações, contas etc. do usuário pelos do snapshot,
+    # numa transação só; o usuário (id, nome) e os demais usuários não mudam
+    if engine is None:
+        from db import engine
+    from migrations import ensure_schema
+    path = snapshot_path(name)
+    with _scratch() as tmp:
+        with gzip.open(path, "rb") as fin, open(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, 1 << 20)
+        # Snapshot de uma versão anterior do app: sobe o esquema da cópia antes de ler
+        snap_engine = create_engine(f"sqlite:///{tmp}")
+        try:
+            ensure_schema(snap_engine)
+        finally:
+            snap_engine.dispose()
+        with engine.connect() as con:
+            con.exec_driver_sql("ATTACH DATABASE ? AS snap", (tmp,))
+            con.commit()
+            try:
+                con.exec_driver_sql("BEGIN IMMEDIATE")
+                if con.exec_driver_sql("SELECT 1 FROM main.users WHERE id = ?", (user_id,)).first() is None:
+                    raise NotFound(f"Usuário {user_id} não encontrado.")
+                src_uid = _source_user(con, user_id, source_user_id)
+                # Marcas da conferência (reconcile.py) valem para os baldes que vão sumir
+                con.exec_driver_sql("DELETE FROM main.bucket_checkpoints WHERE user_id = ?", (user_id,))
+                for table in reversed(USER_TABLES):  # filhos antes dos pais
+                    con.exec_driver_sql(f"DELETE FROM main.{table} WHERE user_id = ?", (user_id,))
+                con.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS _restore_map "
+                                    "(tbl TEXT, old INTEGER, new INTEGER, PRIMARY KEY (tbl, old))")
+                con.exec_driver_sql("DELETE FROM temp._restore_map")
+                counts = {t: _copy_table(con, t, refs, src_uid, user_id) for t, refs in USER_TABLES.items()}
+                con.exec_driver_sql("DROP TABLE temp._restore_map")
+                reconcile.run(con, user_id)  # saldos restaurados viram a base das novas marcas
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            finally:
+                con.exec_driver_sql("DETACH DATABASE snap")
+                con.commit()
+    return {"snapshot": name, "rows": counts}
+
+if __name__ == "__main__":
+    import argparse
+    from db import engine
+    from migrations import ensure_schema
+    ap = argparse.ArgumentParser(description="Snapshots do banco (backup online)")
+    ap.add_argument("cmd", choices=["snapshot", "list", "prune", "restore"])
+    ap.add_argument("--label", default="")
+    ap.add_argument("--name", help="snapshot a restaurar (ver `list`)")
+    ap.add_argument("--user", type=int, help="usuário a restaurar")
+    ap.add_argument("--from-user", type=int, default=None, help="id do usuário no snapshot (padrão: mesmo nome)")
+    args = ap.parse_args()
+    ensure_schema(engine)
+    if args.cmd == "snapshot":
+        res = snapshot(engine, label=args.label)
+        print(f"{res['name']}: {res['raw_bytes'] / 1e6:.1f} MB -> {res['bytes'] / 1e6:.1f} MB em {res['seconds']}s")
+    elif args.cmd == "list":
+        for s in list_snapshots():
+            print(f"{s['name']:<45} {s['bytes'] / 1e6:8.1f} MB")
+    elif args.cmd == "prune":
+        print(f"Removidos: {', '.join(prune()) or 'nenhum'}")
+    else:
+        if not args.name or args.user is None:
+            ap.error("restore precisa de --name e --user")
+        print(restore_user(args.name, args.user, args.from_user, engine))
@@ -0,0 +1,575 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+# ==================================
+# Benchmarks (linha de comando)
+# ==================================
+# python bench.py startup                 -> tempo de import (-X importtime) e do 1º render
+# python bench.py run --out novo.json     -> popula um SQLite (seed.py) e mede cada caminho de dados
+# python bench.py compare base.json novo.json -> acusa regressões (código de saída 1)
+# python bench.py loadtest -n 5000 -c 32    -> sobe api.py e dispara escritas/leituras concorrentes
+# python bench.py format -n 100000          -> money_br/date_br valor a valor x em lote (sem banco)
+# Ex.: exportação de 1M linhas -> bench.py run --users 1 --movements 1000000 --only export_csv_raw
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(ROOT, "app.py")
+
+# Imports de topo do app.py (o que todo rerun/cold start paga)
+APP_IMPORTS = "import streamlit, db, models, migrations, queries, cache, formatting"
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "babel.dates")
+
+# ---------------------
+# Startup / cold start
+# ---------------------
+def import_times(stmt: str = APP_IMPORTS, top: int = 15) -> Dict:
+    # Roda em processo novo; soma os módulos pedidos em `stmt` (cumulativo em µs)
+    wanted = {m.strip() for m in stmt.replace("import", "").split(",")}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", stmt],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split("|", 2)
+        if not cum.strip().isdigit():
+            continue  # cabeçalho
+        if name.strip() in wanted and not name.startswith("  "):  # nível 0
+            rows.append((name.strip(), int(cum)))
+    rows.sort(key=lambda r: -r[1])
+    return {
+        "total_ms": round(sum(us for _, us in rows) / 1000, 1),
+        "top": [{"module": m, "ms": round(us / 1000, 1)} for m, us in rows[:top]],
+    }
+
+_RENDER_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+sys.path.insert(0, {root!r})
+at = AppTest.from_file({app!r}, default_timeout=120)
+t1 = time.perf_counter(); at.run(); t2 = time.perf_counter()
+login = {{m: m in sys.modules for m in {heavy!r}}}
+at.sidebar.button[0].click().run(); t3 = time.perf_counter()
+at.run(); t4 = time.perf_counter()
+print(json.dumps({{
+    "first_render_ms": round((t2 - t1) * 1000, 1),
+    "first_render_with_import_ms": round((t2 - t0) * 1000, 1),
+    "login_dashboard_ms": round((t3 - t2) * 1000, 1),
+    "rerun_dashboard_ms": round((t4 - t3) * 1000, 1),
+    "heavy_loaded_on_login_page": login,
+    "exception": bool(at.exception),
+}}))
+"""
+
+def first_render(db_path: str) -> Dict:
+    # Processo novo (cold): tela de entrada, login -> Dashboard, e um rerun sem escrita
+    env = dict(os.environ, DAVI_DB_URL=f"sqlite:///{db_path}")
+    script = _RENDER_SCRIPT.format(root=ROOT, app=APP, heavy=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(db_path),
+                          env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def bench_startup(repeat: int = 3) -> Dict:
+    imports = [import_times() for _ in range(repeat)]
+    renders = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(repeat):
+            renders.append(first_render(os.path.join(tmp, f"startup_{i}.db")))
+    best = min(imports, key=lambda r: r["total_ms"])
+    return {
+        "import_ms": best["total_ms"],
+        "import_top": best["top"],
+        "first_render_ms": min(r["first_render_with_import_ms"] for r in renders),
+        "login_dashboard_ms": min(r["login_dashboard_ms"] for r in renders),
+        "rerun_dashboard_ms": min(r["rerun_dashboard_ms"] for r in renders),
+        "heavy_loaded_on_login_page": renders[-1]["heavy_loaded_on_login_page"],
+        "exception": any(r["exception"] for r in renders),
+    }
+
+def _print_startup(res: Dict):
+    print(f"imports de topo do app: {res['import_ms']:.1f} ms")
+    for r in res["import_top"]:
+        print(f"  {r['ms']:8.1f} ms  {r['module']}")
+    print(f"1º render (com imports): {res['first_render_ms']:.1f} ms")
+    print(f"login -> Dashboard:      {res['login_dashboard_ms']:.1f} ms")
+    print(f"rerun do Dashboard:      {res['rerun_dashboard_ms']:.1f} ms")
+    loaded = [m for m, v in res["heavy_loaded_on_login_page"].items() if v]
+    print(f"módulos pesados na tela de entrada: {', '.join(loaded) or 'nenhum'}")
+
+# ---------------------------------------
+# Caminhos de dados do app.py (headless)
+# ---------------------------------------
+# Cada caso recebe (db, user_id, ctx) e devolve o nº de linhas/itens tocados.
+# Limite de regressão padrão: melhor tempo novo > base * REGRESSION_RATIO e
+# pelo menos MIN_DELTA_MS a mais (ruído de casos muito rápidos). Compara o
+# mínimo das repetições, que varia bem menos que a mediana em máquina ocupada.
+REGRESSION_RATIO = float(os.getenv("DAVI_BENCH_RATIO", "1.25"))
+MIN_DELTA_MS = float(os.getenv("DAVI_BENCH_MIN_DELTA_MS", "3"))
+THRESHOLDS: Dict[str, float] = {  # razões por caso (sobrepõem o padrão)
+    "export_csv_formatted": 1.35,
+    "export_csv_raw": 1.35,
+}
+FORMAT_N = 100_000
+
+def _case_load_movements(db, uid, ctx):
+    import queries
+    return len(queries.load_movements(db, uid))
+
+def _case_load_buckets(db, uid, ctx):
+    import queries
+    return len(queries.load_buckets(db, uid))
+
+def _case_giant_totals(db, uid, ctx):
+    import queries
+    return len(queries.giant_totals(db, uid))
+
+def _case_recent_giant_payments(db, uid, ctx):
+    import queries
+    return sum(len(v) for v in queries.recent_giant_payments(db, uid, limit=5).values())
+
+def _case_check_due_alerts(db, uid, ctx):
+    import queries
+    overdue, due_soon = queries.check_due_alerts(db, uid, days=3, today=ctx["today"])
+    return len(overdue) + len(due_soon)
+
+def _case_dashboard_summary(db, uid, ctx):
+    import queries
+    return len(queries.dashboard_summary(db, uid, ctx["today"]))
+
+def _case_monthly_flow_history(db, uid, ctx):
+    import queries
+    return len(queries.monthly_flow_history(db, uid, date(ctx["today"].year - 1, ctx["today"].month, 1)))
+
+def _case_yearly_flow_history(db, uid, ctx):
+    import queries
+    return len(queries.yearly_flow_history(db, uid))
+
+def _case_balance_history_lttb(db, uid, ctx):
+    import charts
+    return sum(len(d) for d, _ in charts.downsample(charts.bucket_balance_history(db, uid)).values())
+
+def _case_search_movements(db, uid, ctx):
+    import search
+    return len(search.search_movements(db, uid, "ifood", limit=100))
+
+def _case_ledger_first_page(db, uid, ctx):
+    import queries
+    return len(queries.ledger_page(db, uid, None, 50)[0])
+
+def _case_compute_bucket_splits(db, uid, ctx):
+    from logic import compute_bucket_splits
+    return len(compute_bucket_splits(ctx["buckets"], 1234.56))
+
+def _case_split_cents_batch(db, uid, ctx):
+    from logic import split_cents
+    return split_cents(ctx["incomes"], [b.percent for b in ctx["buckets"]]).size
+
+def _case_export_csv_raw(db, uid, ctx):
+    from export import export_csv
+    path = export_csv(db, uid)
+    os.remove(path)
+    return ctx["n_movements"]
+
+def _case_export_csv_formatted(db, uid, ctx):
+    from export import export_csv
+    path = export_csv(db, uid, formatted=True)
+    os.remove(path)
+    return ctx["n_movements"]
+
+def _case_money_br_many(db, uid, ctx):
+    from formatting import money_br_many
+    return len(money_br_many(ctx["values"]))
+
+def _case_money_br_loop(db, uid, ctx):
+    from formatting import money_br
+    return len([money_br(v) for v in ctx["values"][:FORMAT_N // 10]])
+
+def _case_date_br_many(db, uid, ctx):
+    from formatting import date_br_many
+    return len(date_br_many(ctx["dates"]))
+
+CASES: Dict[str, Callable] = {
+    "load_buckets": _case_load_buckets,
+    "load_movements": _case_load_movements,
+    "giant_totals": _case_giant_totals,
+    "recent_giant_payments": _case_recent_giant_payments,
+    "check_due_alerts": _case_check_due_alerts,
+    "dashboard_summary": _case_dashboard_summary,
+    "monthly_flow_history": _case_monthly_flow_history,
+    "yearly_flow_history": _case_yearly_flow_history,
+    "balance_history_lttb": _case_balance_history_lttb,
+    "search_movements": _case_search_movements,
+    "ledger_first_page": _case_ledger_first_page,
+    "compute_bucket_splits": _case_compute_bucket_splits,
+    "split_cents_batch": _case_split_cents_batch,
+    "export_csv_raw": _case_export_csv_raw,
+    "export_csv_formatted": _case_export_csv_formatted,
+    "money_br_many": _case_money_br_many,
+    "money_br_loop_10pct": _case_money_br_loop,
+    "date_br_many": _case_date_br_many,
+}
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def bench_run(db_path: str, sizes: Dict, seed_value: int = 0, repeat: int = 5,
+              only: Optional[List[str]] = None) -> Dict:
+    import numpy as np
+    from datetime import timedelta
+    from sqlalchemy import select
+    from sqlalchemy.orm import sessionmaker
+    from db import make_engine
+    from models import User
+    import queries
+    import seed as seeder
+
+    engine = make_engine(f"sqlite:///{db_path}")
+    t0 = time.perf_counter()
+    fresh = not os.path.exists(db_path) or os.path.getsize(db_path) == 0
+    counts = seeder.seed(engine, sizes, seed_value) if fresh else seeder.counts(engine)
+    seed_s = time.perf_counter() - t0 if fresh else None
+
+    Session = sessionmaker(bind=engine)
+    today = date.today()
+    rng = np.random.default_rng(seed_value)
+    with Session() as db:
+        uid = db.execute(select(User.id).order_by(User.id).limit(1)).scalar_one()
+        ctx = {
+            "today": today,
+            "buckets": queries.load_buckets(db, uid),
+            "n_movements": queries.ledger_count(db, uid),
+            "incomes": np.round(rng.uniform(10, 20000, size=10_000), 2),
+            "values": np.round(rng.normal(0, 5000, size=FORMAT_N), 2).tolist(),
+            "dates": [today - timedelta(days=int(d)) for d in rng.integers(0, 3650, size=FORMAT_N)],
+        }
+    results = {}
+    for name, fn in CASES.items():
+        if only and name not in only:
+            continue
+        times, n = [], 0
+        for _ in range(repeat):
+            with Session() as db:  # sessão nova = sem identity map aquecido
+                t = time.perf_counter()
+                n = fn(db, uid, ctx)
+                times.append((time.perf_counter() - t) * 1000)
+        results[name] = {"median_ms": round(statistics.median(times), 3),
+                         "min_ms": round(min(times), 3), "items": n}
+    engine.dispose()
+    return {
+        "meta": {"commit": _git_commit(), "python": platform.python_version(),
+                 "platform": platform.platform(), "date": today.isoformat(), "repeat": repeat,
+                 "sizes": sizes, "seed": seed_value, "counts": counts, "seed_seconds": seed_s},
+        "results": results,
+    }
+
+def compare(base: Dict, new: Dict, ratio: float = REGRESSION_RATIO,
+            min_delta_ms: float = MIN_DELTA_MS) -> List[Dict]:
+    rows = []
+    for name, r in new["results"].items():
+        b = base["results"].get(name)
+        if b is None:
+            continue
+        limit = THRESHOLDS.get(name, ratio)
+        rel = r["min_ms"] / b["min_ms"] if b["min_ms"] else float("inf")
+        regressed = rel > limit and r["min_ms"] - b["min_ms"] > min_delta_ms
+        rows.append({"case": name, "base_ms": b["min_ms"], "new_ms": r["min_ms"],
+                     "ratio": round(rel, 3), "limit": limit, "regression": regressed})
+    if base["meta"].get("sizes") != new["meta"].get("sizes"):
+        print("aviso: tamanhos de dados diferentes entre os arquivos")
+    return rows
+
+def _print_compare(rows: List[Dict]):
+    for r in rows:
+        flag = "REGRESSÃO" if r["regression"] else "ok"
+        print(f"{r['case']:24s} {r['base_ms']:10.2f} -> {r['new_ms']:10.2f} ms  x{r['ratio']:.2f} (lim x{r['limit']:.2f})  {flag}")
+
+def _print_run(res: Dict):
+    print(f"dados: {res['meta']['counts']}")
+    for name, r in res["results"].items():
+        print(f"{name:24s} {r['median_ms']:10.2f} ms (min {r['min_ms']:.2f})  itens={r['items']}")
+
+# ---------------------------------------
+# Formatação pt-BR (formatting.py, sem banco)
+# ---------------------------------------
+# Mesmo texto valor a valor e em lote (senão falha), e o ganho do lote por coluna.
+def _best_ms(fn: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return min(times)
+
+def bench_format(n: int = FORMAT_N, repeat: int = 3, seed_value: int = 0) -> Dict:
+    import numpy as np
+    from datetime import timedelta
+    from formatting import date_br, date_br_many, money_br, money_br_many
+
+    rng = np.random.default_rng(seed_value)
+    values = np.round(rng.normal(0, 5000, size=n), 2).tolist()
+    today = date.today()
+    dates = [today - timedelta(days=int(d)) for d in rng.integers(0, 3650, size=n)]
+    cases = {
+        "money": (lambda: [money_br(v) for v in values], lambda: money_br_many(values)),
+        "date": (lambda: [date_br(d) for d in dates], lambda: date_br_many(dates)),
+    }
+    out = {"n": n}
+    for name, (loop, batch) in cases.items():
+        same = loop() == batch()
+        loop_ms, batch_ms = _best_ms(loop, repeat), _best_ms(batch, repeat)
+        out[name] = {"loop_ms": round(loop_ms, 1), "batch_ms": round(batch_ms, 1),
+                     "speedup": round(loop_ms / batch_ms, 1) if batch_ms else None, "identical": same}
+    return out
+
+def _print_format(res: Dict):
+    for name in ("money", "date"):
+        r = res[name]
+        flag = "ok" if r["identical"] else "DIVERGE"
+        print(f"{name:6s} n={res['n']}: valor a valor {r['loop_ms']:9.1f} ms  lote {r['batch_ms']:8.1f} ms  "
+              f"x{r['speedup']}  {flag}")
+
+# ---------------------------------------
+# Carga na API local (api.py + uvicorn)
+# ---------------------------------------
+# Cliente HTTP/1.1 mínimo em asyncio (keep-alive, uma conexão por worker) para
+# não depender de httpx/aiohttp. No fim confere, balde a balde, se o saldo
+# gravado bate com a soma do livro caixa (escritas concorrentes sem perda).
+LOAD_MIX = {"movement": 40, "transfer": 15, "giant_payment": 10, "summary": 25, "batch": 10}
+LOAD_BATCH_OPS = 50
+LOAD_BUCKETS = 4
+
+async def _request(conn, method: str, path: str, payload=None):
+    reader, writer = conn
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        k, _, v = line.decode().partition(":")
+        if k.lower() == "content-length":
+            length = int(v)
+    data = await reader.readexactly(length) if length else b""
+    return status, json.loads(data) if data else None
+
+async def _connect(port: int, wait_s: float = 0.0):
+    import asyncio
+    deadline = time.perf_counter() + wait_s
+    while True:
+        try:
+            return await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+def _load_op(rng, uid: int, buckets: List[int], giant: int):
+    op = rng.choices(list(LOAD_MIX), weights=list(LOAD_MIX.values()))[0]
+    amount = round(rng.uniform(1, 50), 2)
+    if op == "movement":
+        kind = rng.choice(("income", "expense"))
+        return op, "POST", f"/users/{uid}/movements", {"bucket_id": rng.choice(buckets), "kind": kind, "amount": amount}
+    if op == "transfer":
+        a, b = rng.sample(buckets, 2)
+        return op, "POST", f"/users/{uid}/transfers", {"from_bucket": a, "to_bucket": b, "amount": amount}
+    if op == "giant_payment":
+        return op, "POST", f"/users/{uid}/giants/{giant}/payments", {"amount": amount}
+    if op == "summary":
+        return op, "GET", f"/users/{uid}/summary", None
+    ops = [{"op": "movement", "bucket_id": rng.choice(buckets), "kind": "income" if i % 2 == 0 else "expense",
+            "amount": round(rng.uniform(1, 20), 2), "allow_negative": True} for i in range(LOAD_BATCH_OPS)]
+    return op, "POST", f"/users/{uid}/batch", {"ops": ops}
+
+async def _loadtest(port: int, n: int, concurrency: int, seed_value: int) -> Dict:
+    import asyncio
+    import random
+    conn = await _connect(port, wait_s=30)
+    await _request(conn, "GET", "/health")
+    _, user = await _request(conn, "POST", "/users", {"name": f"load_{seed_value}"})
+    uid = user["id"]
+    buckets = []
+    for i in range(LOAD_BUCKETS):
+        _, b = await _request(conn, "POST", f"/users/{uid}/buckets", {"name": f"Carga {i}", "percent": 100 / LOAD_BUCKETS})
+        buckets.append(b["id"])
+    await _request(conn, "POST", f"/users/{uid}/income", {"amount": 100_000})
+    _, g = await _request(conn, "POST", f"/users/{uid}/giants", {"name": "Carga", "total_to_pay": 1e9})
+    conn[1].close()
+
+    lat: Dict[str, List[float]] = {op: [] for op in LOAD_MIX}
+    statuses: Dict[str, int] = {}
+    issued = 0
+
+    async def worker(w: int):
+        nonlocal issued
+        rng = random.Random(seed_value * 1000 + w)
+        c = await _connect(port)
+        try:
+            while issued < n:
+                issued += 1
+                op, method, path, payload = _load_op(rng, uid, buckets, g["id"])
+                t = time.perf_counter()
+                status, _ = await _request(c, method, path, payload)
+                lat[op].append((time.perf_counter() - t) * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        finally:
+            c[1].close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    # Conferência: saldo == Σ entradas - Σ (gastos + transferências) por balde
+    conn = await _connect(port)  # a conexão ociosa da preparação já expirou (keep-alive)
+    ledger = {b: 0.0 for b in buckets}
+    path = f"/users/{uid}/movements?limit=1000"
+    while path:
+        _, page = await _request(conn, "GET", path)
+        for m in page["items"]:
+            ledger[m["bucket_id"]] += m["amount"] if m["kind"] == "income" else -m["amount"]
+        nxt = page["next"]
+        path = f"/users/{uid}/movements?limit=1000&after_date={nxt['after_date']}&after_id={nxt['after_id']}" if nxt else None
+    _, rows = await _request(conn, "GET", f"/users/{uid}/buckets")
+    conn[1].close()
+    mismatch = {r["id"]: {"balance": round(r["balance"], 2), "ledger": round(ledger[r["id"]], 2)}
+                for r in rows if abs(r["balance"] - ledger[r["id"]]) > 0.005}
+
+    def pct(xs: List[float], q: float) -> float:
+        xs = sorted(xs)
+        return round(xs[min(int(q * len(xs)), len(xs) - 1)], 2) if xs else 0.0
+    everything = [x for xs in lat.values() for x in xs]
+    return {
+        "requests": len(everything), "concurrency": concurrency, "seconds": round(elapsed, 3),
+        "req_per_s": round(len(everything) / elapsed, 1),
+        "p50_ms": pct(everything, 0.50), "p95_ms": pct(everything, 0.95), "p99_ms": pct(everything, 0.99),
+        "by_op": {op: {"n": len(xs), "p50_ms": pct(xs, 0.50), "p95_ms": pct(xs, 0.95)} for op, xs in lat.items()},
+        "statuses": statuses, "ledger_ok": not mismatch, "mismatch": mismatch,
+    }
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bench_load(n: int = 2000, concurrency: int = 16, db_path: Optional[str] = None, seed_value: int = 0) -> Dict:
+    import asyncio
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DAVI_DB_URL=f"sqlite:///{db_path or os.path.join(tmp, 'load.db')}")
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "api.py"), "--port", str(port)],
+                                cwd=ROOT, env=env)
+        try:
+            res = asyncio.run(_loadtest(port, n, concurrency, seed_value))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    res["meta"] = {"commit": _git_commit(), "python": platform.python_version(), "date": date.today().isoformat()}
+    return res
+
+def _print_load(res: Dict):
+    print(f"{res['requests']} requisições, {res['concurrency']} conexões, {res['seconds']:.2f} s "
+          f"-> {res['req_per_s']:.0f} req/s  p50 {res['p50_ms']} ms  p95 {res['p95_ms']} ms  p99 {res['p99_ms']} ms")
+    for op, r in res["by_op"].items():
+        print(f"  {op:14s} n={r['n']:6d}  p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms")
+    print(f"status: {res['statuses']}")
+    print("saldos x livro caixa: " + ("ok" if res["ledger_ok"] else f"DIVERGENTE {res['mismatch']}"))
+
+def main(argv: List[str] = None):
+    import seed as seeder
+    ap = argparse.ArgumentParser(description="Benchmarks do APP DAVI")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("startup", help="tempo de import e do primeiro render")
+    s.add_argument("--repeat", type=int, default=3)
+    s.add_argument("--json", help="grava o resultado neste arquivo")
+
+    r = sub.add_parser("run", help="popula um SQLite e mede os caminhos de dados")
+    r.add_argument("--db", help="SQLite a usar (criado e populado se não existir); padrão: temporário")
+    r.add_argument("--repeat", type=int, default=5)
+    r.add_argument("--only", nargs="*", help="só estes casos")
+    r.add_argument("--out", help="grava o resultado (JSON) neste arquivo")
+    r.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    seeder.add_size_args(r)
+
+    c = sub.add_parser("compare", help="compara dois JSON de `run`")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--ratio", type=float, default=REGRESSION_RATIO)
+
+    lt = sub.add_parser("loadtest", help="sobe a API local e mede escritas concorrentes")
+    lt.add_argument("-n", "--requests", type=int, default=2000)
+    lt.add_argument("-c", "--concurrency", type=int, default=16)
+    lt.add_argument("--db", help="SQLite a usar; padrão: temporário")
+    lt.add_argument("--seed", type=int, default=0)
+    lt.add_argument("--out", help="grava o resultado (JSON) neste arquivo")
+    f = sub.add_parser("format", help="formatação pt-BR valor a valor x em lote (sem banco)")
+    f.add_argument("-n", type=int, default=FORMAT_N)
+    f.add_argument("--repeat", type=int, default=3)
+    f.add_argument("--out", help="grava o resultado (JSON) neste arquivo")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "format":
+        res = bench_format(args.n, args.repeat)
+        _print_format(res)
+        if args.out:
+            with open(args.out, "w") as fh:
+                json.dump(res, fh, indent=2)
+        return 0 if all(res[k]["identical"] for k in ("money", "date")) else 1
+
+    if args.cmd == "loadtest":
+        res = bench_load(args.requests, args.concurrency, args.db, args.seed)
+        _print_load(res)
+        if args.out:
+            with open(args.out, "w") as fh:
+                json.dump(res, fh, indent=2)
+        return 0 if res["ledger_ok"] and not any(k.startswith("5") for k in res["statuses"]) else 1
+
+    if args.cmd == "startup":
+        res = bench_startup(args.repeat)
+        _print_startup(res)
+        if args.json:
+            with open(args.json, "w") as fh:
+                json.dump(res, fh, indent=2)
+        return 0
+
+    if args.cmd == "run":
+        sizes = seeder.sizes_from_args(args)
+        if args.db:
+            res = bench_run(args.db, sizes, args.seed, args.repeat, args.only)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                res = bench_run(os.path.join(tmp, "bench.db"), sizes, args.seed, args.repeat, args.only)
+        _print_run(res)
+        if args.out:
+            with open(args.out, "w") as fh:
+                json.dump(res, fh, indent=2)
+        if args.baseline:
+            with open(args.baseline) as fh:
+                rows = compare(json.load(fh), res)
+            _print_compare(rows)
+            return 1 if any(x["regression"] for x in rows) else 0
+        return 0
+
+    with open(args.base) as fb, open(args.new) as fn:
+        rows = compare(json.load(fb), json.load(fn), args.ratio)
+    _print_compare(rows)
+    return 1 if any(x["regression"] for x in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import date
+from functools import wraps
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+from db import SessionLocal
+import queries
+
+# ==========================================
+# Cache por usuário + versão de escrita
+# ==========================================
+# Cada commit em app.py chama bump_version(user_id); as chaves incluem a
+# versão atual, então reruns sem escrita nunca tocam o SQLite.
+
+MAX_ENTRIES = int(os.getenv("DAVI_CACHE_MAX_ENTRIES", "512"))
+
+_MISS = object()
+
+class LRUCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return _MISS
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def drop_user(self, user_id: int):
+        with self._lock:
+            for k in [k for k in self._data if k[0] == user_id]:
+                del self._data[k]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+_cache = LRUCache()
+_versions: Dict[int, int] = {}
+_versions_lock = threading.Lock()
+
+def data_version(user_id: int) -> int:
+    return _versions.get(user_id, 0)
+
+def bump_version(user_id: int) -> int:
+    with _versions_lock:
+        v = _versions.get(user_id, 0) + 1
+        _versions[user_id] = v
+    _cache.drop_user(user_id)
+    return v
+
+def invalidate_all():
+    with _versions_lock:
+        for uid in list(_versions):
+            _versions[uid] += 1
+    _cache.clear()
+
+# ==========================================
+# Escritas de outros processos (ex.: api.py)
+# ==========================================
+# PRAGMA data_version muda quando OUTRA conexão grava no arquivo. Uma conexão
+# dedicada (fora do pool) confere isso uma vez por rerun; se mudou, o cache
+# inteiro é descartado. As escritas do próprio processo (services.transaction)
+# são "absorvidas" em commit_own_write. data_version não conta commits (vários
+# viram uma mudança só), então a absorção só vale se nenhuma outra conexão
+# gravou entre a última leitura e o COMMIT (confere com a trava de escrita na
+# mão) nem entre o COMMIT e a nova leitura (confere na conexão que gravou, cujo
+# data_version só muda com commits dos outros).
+_watch = {"engine": None, "con": None, "seen": None}
+_watch_lock = threading.Lock()
+
+def _read_data_version() -> Optional[int]:
+    if _watch["con"] is None:
+        con = _watch["engine"].raw_connection()
+        con.detach()  # não volta ao pool: data_version é por conexão
+        _watch["con"] = con
+    cur = _watch["con"].cursor()
+    try:
+        return cur.execute("PRAGMA data_version").fetchone()[0]
+    finally:
+        cur.close()
+
+def sync_external_writes(engine) -> bool:
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return False
+    with _watch_lock:
+        _watch["engine"] = engine
+        v = _read_data_version()
+        changed = _watch["seen"] is not None and v != _watch["seen"]
+        _watch["seen"] = v
+    if changed:
+        invalidate_all()
+    return changed
+
+def commit_own_write(con) -> bool:
+    # Faz o COMMIT da transação de `con` (BEGIN IMMEDIATE já feito). True = absorvida (só esta
+    # escrita desde a última leitura); False = sem conexão vigia ou outra conexão também gravou
+    with _watch_lock:
+        if _watch["con"] is None or con.engine is not _watch["engine"]:
+            con.exec_driver_sql("COMMIT")
+            return False
+        before = _read_data_version()
+        mine = con.exec_driver_sql("PRAGMA data_version").scalar()
+        con.exec_driver_sql("COMMIT")
+        after = _read_data_version()
+        alone = before == _watch["seen"] and con.exec_driver_sql("PRAGMA data_version").scalar() == mine
+        _watch["seen"] = after
+    if not alone:
+        invalidate_all()
+    return alone
+
+def user_cached(fn):
+    name = fn.__qualname__
+
+    @wraps(fn)
+    def wrapper(user_id: int, *args):
+        key = (user_id, data_version(user_id), name, args)
+        hit = _cache.get(key)
+        if hit is not _MISS:
+            return hit
+        value = fn(user_id, *args)
+        _cache.put(key, value)
+        return value
+
+    def peek(user_id: int, *args):
+        # Só consulta: None se ainda não calculado nesta versão (ex.: tarefa em segundo plano rodando)
+        hit = _cache.get((user_id, data_version(user_id), name, args))
+        return None if hit is _MISS else hit
+
+    wrapper.peek = peek
+    return wrapper
+
+# ================================
+# Snapshots imutáveis (sem sessão)
+# ================================
+@dataclass(frozen=True)
+class BucketSnap:
+    id: int
+    user_id: int
+    name: str
+    description: str
+    percent: float
+    type: str
+    balance: float
+
+@dataclass(frozen=True)
+class GiantSnap:
+    id: int
+    user_id: int
+    name: str
+    total_to_pay: float
+    parcels: int
+    months_left: int
+    priority: int
+    status: str
+
+@dataclass(frozen=True)
+class MovementSnap:
+    id: int
+    user_id: int
+    bucket_id: Optional[int]
+    kind: str
+    amount: float
+    description: str
+    date: date
+
+@dataclass(frozen=True)
+class BillSnap:
+    id: object  # int (avulsa) ou "r<id>:<data>" (ocorrência de recorrente)
+    user_id: int
+    title: str
+    amount: float
+    due_date: date
+    is_critical: bool
+    paid: bool
+
+@dataclass(frozen=True)
+class RecurringSnap:
+    id: int
+    user_id: int
+    title: str
+    amount: float
+    is_critical: bool
+    rule: str
+    start_date: date
+    end_date: Optional[date]
+    settled_through: Optional[date]
+
+@dataclass(frozen=True)
+class ProfileSnap:
+    id: int
+    user_id: int
+    monthly_income: float
+    monthly_expense: float
+
+@dataclass(frozen=True)
+class GiantPaymentSnap:
+    id: int
+    giant_id: int
+    amount: float
+    date: date
+    note: str
+
+def snapshot(cls, obj):
+    return cls(**{f.name: getattr(obj, f.name) for f in fields(cls)})
+
+def snapshots(cls, objs) -> Tuple:
+    return tuple(snapshot(cls, o) for o in objs)
+
+# =================
+# Loaders em cache
+# =================
+@user_cached
+def buckets(user_id: int) -> Tuple[BucketSnap, ...]:
+    with SessionLocal() as db:
+        return snapshots(BucketSnap, queries.load_buckets(db, user_id))
+
+@user_cached
+def giants(user_id: int) -> Tuple[GiantSnap, ...]:
+    with SessionLocal() as db:
+        return snapshots(GiantSnap, queries.load_giants(db, user_id))
+
+@user_cached
+def movements(user_id: int) -> Tuple[MovementSnap, ...]:
+    with SessionLocal() as db:
+        return snapshots(MovementSnap, queries.load_movements(db, user_id))
+
+@user_cached
+def bills(user_id: int) -> Tuple[BillSnap, ...]:
+    with SessionLocal() as db:
+        return snapshots(BillSnap, queries.load_bills(db, user_id))
+
+@user_cached
+def recurring_bills(user_id: int) -> Tuple[RecurringSnap, ...]:
+    import recurring
+    with SessionLocal() as db:
+        return snapshots(RecurringSnap, recurring.load_recurring(db, user_id))
+
+@user_cached
+def occurrences(user_id: int, start: date, end: date) -> Tuple[BillSnap, ...]:
+    # Ocorrências das recorrentes só na janela pedida (geradas + exceções)
+    import recurring
+    with SessionLocal() as db:
+        return snapshots(BillSnap, recurring.occurrences(db, user_id, start, end))
+
+@user_cached
+def profile(user_id: int) -> ProfileSnap:
+    with SessionLocal() as db:
+        return snapshot(ProfileSnap, queries.get_profile(db, user_id))
+
+@user_cached
+def due_alerts(user_id: int, days: int, today: date):
+    # `today` entra na chave para o cache virar à meia-noite; o hash do aviso vai junto
+    with SessionLocal() as db:
+        overdue, due_soon = queries.check_due_alerts(db, user_id, days=days, today=today)
+        overdue, due_soon = snapshots(BillSnap, overdue), snapshots(BillSnap, due_soon)
+        return overdue, due_soon, queries.alerts_hash(overdue, due_soon)
+
+@user_cached
+def dashboard_summary(user_id: int, today: date):
+    with SessionLocal() as db:
+        return MappingProxyType(queries.dashboard_summary(db, user_id, today))
+
+@user_cached
+def flow_history(user_id: int, since: date):
+    # Mensal (desde `since`) e anual, ambos do rollup mensal
+    with SessionLocal() as db:
+        return (tuple(queries.monthly_flow_history(db, user_id, since)),
+                tuple(queries.yearly_flow_history(db, user_id)))
+
+@user_cached
+def balance_chart(user_id: int, n_points: int) -> Optional[bytes]:
+    import charts  # NumPy/matplotlib só quando o gráfico é pedido
+    with SessionLocal() as db:
+        series = charts.bucket_balance_history(db, user_id)
+    return charts.render_png(charts.downsample(series, n_points), "Saldo por balde") if series else None
+
+@user_cached
+def paydown_chart(user_id: int, n_points: int) -> Optional[bytes]:
+    import charts
+    with SessionLocal() as db:
+        series = charts.giant_paydown_history(db, user_id)
+    return charts.render_png(charts.downsample(series, n_points), "Saldo devedor dos gigantes") if series else None
+
+@user_cached
+def giant_totals(user_id: int):
+    with SessionLocal() as db:
+        return MappingProxyType(queries.giant_totals(db, user_id))
+
+@user_cached
+def recent_giant_payments(user_id: int, limit: int = 5):
+    with SessionLocal() as db:
+        rows = queries.recent_giant_payments(db, user_id, limit=limit)
+        return MappingProxyType({gid: snapshots(GiantPaymentSnap, pays) for gid, pays in rows.items()})
+
+@user_cached
+def ledger_page(user_id: int, after, limit: int, bucket_id, kind, date_from, date_to):
+    with SessionLocal() as db:
+        rows, next_cursor = queries.ledger_page(db, user_id, after, limit, bucket_id, kind, date_from, date_to)
+        return snapshots(MovementSnap, rows), next_cursor
+
+@user_cached
+def search_movements(user_id: int, query: str, bucket_id, kind, date_from, date_to, limit: int = 200):
+    import search
+    with SessionLocal() as db:
+        return snapshots(MovementSnap, search.search_movements(db, user_id, query, bucket_id, kind,
+                                                               date_from, date_to, limit))
+
+@user_cached
+def search_bills(user_id: int, query: str, limit: int = 200):
+    import search
+    with SessionLocal() as db:
+        return snapshots(BillSnap, search.search_bills(db, user_id, query, limit=limit))
+
+@user_cached
+def ledger_count(user_id: int, bucket_id, kind, date_from, date_to) -> int:
+    with SessionLocal() as db:
+        return queries.ledger_count(db, user_id, bucket_id, kind, date_from, date_to)
+
+@user_cached
+def projection(user_id: int, months: int, n_paths: int, seed: int, today: date):
+    from projection import project_user  # NumPy só quando a projeção é pedida
+    import jobs
+    with SessionLocal() as db:
+        # Cenários em blocos no pool de processos (jobs.cpu_map) quando há mais de um núcleo
+        return MappingProxyType(project_user(db, user_id, months=months, n_paths=n_paths, seed=seed, today=today,
+                                             map_fn=jobs.cpu_map, blocks=jobs.cpu_blocks(n_paths)))
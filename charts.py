@@ -0,0 +1,145 @@
+import io
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+from sqlalchemy import String, case, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from models import Bucket, Giant, Movement, GiantPayment
+
+# ==============================================
+# Gráficos de evolução (saldos e quitação)
+# ==============================================
+# O SQLite entrega uma linha por (série, dia) com a soma acumulada já pronta
+# (SUM() OVER ... window function); o NumPy reduz cada série a MAX_POINTS
+# pontos com LTTB antes de desenhar. Assim 5 anos de histórico custam o mesmo
+# que 1 mês para o matplotlib. Os PNGs ficam no cache por versão de dados
+# (cache.balance_chart / cache.paydown_chart).
+
+MAX_POINTS = int(os.getenv("DAVI_CHART_POINTS", "300"))
+FIG_SIZE = (9, 3.6)
+FIG_DPI = 100
+
+Series = Dict[str, Tuple[np.ndarray, np.ndarray]]  # nome -> (dias datetime64[D], valores)
+
+# ---------------------------
+# Séries (window functions)
+# ---------------------------
+def _to_series(rows, names: Dict[int, str]) -> Series:
+    out: Series = {}
+    if not rows:
+        return out
+    ids = np.array([r[0] for r in rows])
+    days = np.array([r[1] for r in rows], dtype="datetime64[D]")  # 'AAAA-MM-DD' direto, sem date do Python
+    vals = np.array([r[2] for r in rows], dtype=np.float64)
+    # Linhas vêm ordenadas por série: corta nos pontos de troca de id
+    cuts = np.flatnonzero(np.diff(ids)) + 1
+    for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(ids)]):
+        name = names.get(int(ids[a]), str(ids[a]))
+        out[name if name not in out else f"{name} #{ids[a]}"] = (days[a:b], vals[a:b])
+    return out
+
+def bucket_balance_history(db: Session, user_id: int) -> Series:
+    # Saldo no fim de cada dia com movimento, ancorado no saldo atual do balde:
+    # saldo(d) = saldo_atual - Σ líquido + Σ líquido até d
+    net = case((Movement.kind == "income", Movement.amount), else_=-Movement.amount)
+    daily = (
+        select(Movement.bucket_id.label("bucket_id"), Movement.date.label("day"), func.sum(net).label("net"))
+        .where(Movement.user_id == user_id, Movement.bucket_id.is_not(None))
+        .group_by(Movement.bucket_id, Movement.date)
+        .subquery()
+    )
+    running = func.sum(daily.c.net).over(partition_by=daily.c.bucket_id, order_by=daily.c.day)
+    total = func.sum(daily.c.net).over(partition_by=daily.c.bucket_id)
+    rows = db.execute(
+        select(daily.c.bucket_id, type_coerce(daily.c.day, String), Bucket.balance - total + running)
+        .join(Bucket, Bucket.id == daily.c.bucket_id)
+        .order_by(daily.c.bucket_id, daily.c.day)
+    ).all()
+    names = dict(db.execute(select(Bucket.id, Bucket.name).where(Bucket.user_id == user_id)).all())
+    return _to_series(rows, names)
+
+def _with_start(rows, totals: Dict[int, float]) -> list:
+    out, prev = [], None
+    for gid, day, remaining in rows:
+        if gid != prev:
+            out.append((gid, str(np.datetime64(day) - 1), totals[gid]))
+            prev = gid
+        out.append((gid, day, remaining))
+    return out
+
+def giant_paydown_history(db: Session, user_id: int) -> Series:
+    # Saldo devedor de cada gigante após os aportes de cada dia
+    daily = (
+        select(GiantPayment.giant_id.label("giant_id"), GiantPayment.date.label("day"),
+               func.sum(GiantPayment.amount).label("paid"))
+        .where(GiantPayment.user_id == user_id)
+        .group_by(GiantPayment.giant_id, GiantPayment.date)
+        .subquery()
+    )
+    running = func.sum(daily.c.paid).over(partition_by=daily.c.giant_id, order_by=daily.c.day)
+    rows = db.execute(
+        select(daily.c.giant_id, type_coerce(daily.c.day, String), func.max(Giant.total_to_pay - running, 0.0))
+        .join(Giant, Giant.id == daily.c.giant_id)
+        .order_by(daily.c.giant_id, daily.c.day)
+    ).all()
+    giants = db.execute(select(Giant.id, Giant.name, Giant.total_to_pay).where(Giant.user_id == user_id)).all()
+    # Ponto inicial: valor cheio na véspera do primeiro aporte
+    totals = {gid: total for gid, _name, total in giants}
+    rows = _with_start(rows, totals)
+    return _to_series(rows, {gid: name for gid, name, _ in giants})
+
+# -------------------------------------------
+# LTTB (Largest-Triangle-Three-Buckets)
+# -------------------------------------------
+def lttb(x: np.ndarray, y: np.ndarray, n: int = MAX_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    # Mantém o 1º e o último ponto; em cada faixa escolhe o ponto que forma o
+    # maior triângulo com o ponto anterior escolhido e a média da faixa seguinte
+    size = len(x)
+    if n >= size or n < 3:
+        return x, y
+    xf = x.astype(np.float64)
+    every = (size - 2) / (n - 2)
+    edges = (np.arange(n - 1) * every).astype(np.int64) + 1
+    edges[-1] = size - 1
+    idx = np.empty(n, dtype=np.int64)
+    idx[0], idx[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < n - 1 else size)
+        avg_x, avg_y = xf[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((xf[a] - avg_x) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+def downsample(series: Series, n: int = MAX_POINTS) -> Series:
+    return {name: lttb(days, vals, n) for name, (days, vals) in series.items()}
+
+# -------------
+# Renderização
+# -------------
+def render_png(series: Series, title: str, step: bool = True) -> bytes:
+    # Figure direto (sem pyplot): sem estado global, seguro entre sessões
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+    from formatting import money_br
+
+    fig = Figure(figsize=FIG_SIZE, dpi=FIG_DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for name, (days, vals) in series.items():
+        ax.plot(days, vals, label=name, linewidth=1.4, drawstyle="steps-post" if step else "default")
+    ax.set_title(title, fontsize=11)
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda v, _pos: money_br(v)))
+    ax.grid(alpha=0.3)
+    if len(series) > 1:
+        ax.legend(fontsize=8, ncols=min(len(series), 4), loc="upper left")
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
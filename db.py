@@ -1,13 +1,60 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DB_URL = "sqlite:///./davi.db"
+# =========================
+# Configuração via ambiente
+# =========================
+DB_URL = os.getenv("DAVI_DB_URL", "sqlite:///./davi.db")
+
+SQLITE_JOURNAL_MODE = os.getenv("DAVI_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS  = os.getenv("DAVI_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("DAVI_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE   = int(os.getenv("DAVI_SQLITE_CACHE_SIZE", "-20000"))    # negativo = KiB (~20 MB)
+SQLITE_MMAP_SIZE    = int(os.getenv("DAVI_SQLITE_MMAP_SIZE", "268435456"))  # 256 MB
+
+POOL_SIZE     = int(os.getenv("DAVI_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW  = int(os.getenv("DAVI_DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT  = float(os.getenv("DAVI_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE  = int(os.getenv("DAVI_DB_POOL_RECYCLE", "-1"))
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def make_engine(url: str = DB_URL):
+    kwargs = {"pool_pre_ping": True}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000.0}
+    if not _is_memory(url):
+        kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                      pool_timeout=POOL_TIMEOUT, pool_recycle=POOL_RECYCLE)
+    eng = create_engine(url, **kwargs)
+    if _is_sqlite(url):
+        event.listen(eng, "connect", _make_sqlite_pragmas(memory=_is_memory(url)))
+    return eng
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+def _make_sqlite_pragmas(memory: bool):
+    # Aplicado em TODA conexão nova do pool (não só na primeira)
+    def _set_pragmas(dbapi_con, _record):
+        cur = dbapi_con.cursor()
+        try:
+            if not memory:
+                cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+                cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+            cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+            # Garantir integridade referencial no SQLite
+            cur.execute("PRAGMA foreign_keys=ON")
+        finally:
+            cur.close()
+    return _set_pragmas
 
-# Garantir integridade referencial no SQLite
-with engine.connect() as con:
-    con.exec_driver_sql("PRAGMA foreign_keys=ON;")
+engine = make_engine()
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
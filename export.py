@@ -0,0 +1,131 @@
+import csv
+import importlib.util
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import select, type_coerce, String
+from sqlalchemy.orm import Session
+
+from formatting import money_br_many, date_br_many
+from models import Movement
+from queries import ledger_filters
+
+# Parquet é opcional (pyarrow não está no requirements.txt) e pesado para
+# importar: só é carregado na primeira exportação Parquet.
+
+# ======================================================
+# Exportação do Livro Caixa em streaming (CSV / Parquet)
+# ======================================================
+# As linhas saem do SQLite em blocos de CHUNK_SIZE (yield_per) e vão direto
+# para um arquivo temporário; o DataFrame completo nunca é montado.
+
+CHUNK_SIZE = int(os.getenv("DAVI_EXPORT_CHUNK_SIZE", "5000"))
+
+RAW_HEADER     = ["id", "date", "kind", "bucket_id", "amount", "description"]
+DISPLAY_HEADER = ["Data", "Tipo", "BaldeID", "Valor", "Descrição"]
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+def iter_movement_chunks(db: Session, user_id: int, chunk_size: int = CHUNK_SIZE, iso_dates: bool = False,
+                         bucket_id: Optional[int] = None, kind: Optional[str] = None,
+                         date_from: Optional[date] = None, date_to: Optional[date] = None) -> Iterator[List]:
+    conds = ledger_filters(user_id, bucket_id, kind, date_from, date_to)
+    # iso_dates: devolve a data como o texto gravado no SQLite ('AAAA-MM-DD'), sem converter para date
+    date_col = type_coerce(Movement.date, String) if iso_dates else Movement.date
+    stmt = (
+        select(Movement.id, date_col, Movement.kind, Movement.bucket_id,
+               Movement.amount, Movement.description)
+        .where(*conds)
+        .order_by(Movement.date.desc(), Movement.id.desc())
+        .execution_options(yield_per=chunk_size)
+    )
+    for part in db.execute(stmt).partitions(chunk_size):
+        yield part
+
+def _display_rows(part, money_fmt: Optional[Callable], date_fmt: Optional[Callable]) -> List[list]:
+    # Sem formatadores próprios: colunas inteiras em lote (pt-BR, formatting.py)
+    if money_fmt is None and date_fmt is None:
+        ids, dates, kinds, buckets, amounts, descs = zip(*part)
+        return list(map(list, zip(date_br_many(dates), kinds, buckets, money_br_many(amounts), descs)))
+    return [[date_fmt(r.date), r.kind, r.bucket_id, money_fmt(r.amount), r.description] for r in part]
+
+def _new_temp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="livro_caixa_", suffix=suffix)
+    os.close(fd)
+    return path
+
+@contextmanager
+def _removed_on_error(path: str):
+    # Erro ou cancelamento no meio: não deixa arquivo pela metade no disco
+    try:
+        yield
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+def export_csv(db: Session, user_id: int, formatted: bool = False,
+               money_fmt: Optional[Callable] = None, date_fmt: Optional[Callable] = None,
+               path: Optional[str] = None, chunk_size: int = CHUNK_SIZE,
+               on_rows: Optional[Callable[[int], None]] = None, **filters) -> str:
+    # on_rows(linhas_gravadas) a cada bloco (progresso/cancelamento em jobs.py)
+    if formatted and (money_fmt is None) != (date_fmt is None):
+        raise ValueError("Exportação formatada exige money_fmt e date_fmt juntos.")
+    path = path or _new_temp_path(".csv")
+    written = 0
+    with _removed_on_error(path), open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(DISPLAY_HEADER if formatted else RAW_HEADER)
+        for part in iter_movement_chunks(db, user_id, chunk_size, iso_dates=not formatted, **filters):
+            if formatted:
+                w.writerows(_display_rows(part, money_fmt, date_fmt))
+            else:
+                w.writerows(part)
+            written += len(part)
+            if on_rows:
+                on_rows(written)
+    return path
+
+def _parquet_schema(pa, formatted: bool):
+    if formatted:
+        return pa.schema([(c, pa.string()) if c != "BaldeID" else (c, pa.int64()) for c in DISPLAY_HEADER])
+    return pa.schema([
+        ("id", pa.int64()), ("date", pa.date32()), ("kind", pa.string()),
+        ("bucket_id", pa.int64()), ("amount", pa.float64()), ("description", pa.string()),
+    ])
+
+def export_parquet(db: Session, user_id: int, formatted: bool = False,
+                   money_fmt: Optional[Callable] = None, date_fmt: Optional[Callable] = None,
+                   path: Optional[str] = None, chunk_size: int = CHUNK_SIZE,
+                   on_rows: Optional[Callable[[int], None]] = None, **filters) -> str:
+    if not parquet_available():
+        raise RuntimeError("Exportação Parquet requer o pacote pyarrow.")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if formatted and (money_fmt is None) != (date_fmt is None):
+        raise ValueError("Exportação formatada exige money_fmt e date_fmt juntos.")
+    path = path or _new_temp_path(".parquet")
+    schema = _parquet_schema(pa, formatted)
+    written = 0
+    with _removed_on_error(path), pq.ParquetWriter(path, schema) as writer:
+        for part in iter_movement_chunks(db, user_id, chunk_size, **filters):
+            if formatted:
+                cols = list(zip(*_display_rows(part, money_fmt, date_fmt)))
+            else:
+                cols = list(zip(*part))
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema))
+            written += len(part)
+            if on_rows:
+                on_rows(written)
+    return path
+
+def export_movements(db: Session, user_id: int, fmt: str = "csv", **kwargs) -> str:
+    if fmt == "csv":
+        return export_csv(db, user_id, **kwargs)
+    if fmt == "parquet":
+        return export_parquet(db, user_id, **kwargs)
+    raise ValueError(f"Formato de exportação desconhecido: {fmt}")
@@ -0,0 +1,120 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Iterable, List
+
+try:
+    from babel import Locale
+    from babel.numbers import format_currency, get_currency_symbol, get_decimal_symbol, get_group_symbol
+    from babel.dates import format_date
+except ImportError:  # pragma: no cover
+    Locale = None
+
+# =========================
+#  Helpers de formatação BR
+# =========================
+def money_br(v: float) -> str:
+    if v is None or v != v:  # vazio / NaN: célula em branco
+        return ""
+    try:
+        return format_currency(v, 'BRL', locale='pt_BR')
+    except Exception:
+        s = f"{v:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        return f"R$ {s}"
+
+def date_br(d) -> str:
+    if d is None or d != d:  # vazio / NaT (o Babel formataria a data de hoje)
+        return ""
+    try:
+        return format_date(d, format='short', locale='pt_BR')  # dd/mm/aa
+    except Exception:
+        return d.strftime('%d/%m/%y')
+
+def parse_money_br(s: str) -> float:
+    if s is None: return 0.0
+    s = s.strip().replace('.', '').replace(',', '.')
+    try: return float(s)
+    except Exception: return 0.0
+
+# ==========================================================
+# Formatação em lote (colunas inteiras) — mesmo texto do Babel
+# ==========================================================
+# Os padrões pt_BR são lidos do Babel UMA vez; depois cada coluna é
+# arredondada em NumPy e montada sem passar por format_currency/format_date.
+
+def _compile_money():
+    if Locale is None:
+        return None
+    pat = Locale.parse('pt_BR').currency_formats['standard']
+    if pat.frac_prec != (2, 2) or pat.grouping != (3, 3) or pat.suffix != ('', ''):
+        return None  # padrão inesperado: usa o caminho valor a valor
+    cur = get_currency_symbol('BRL', locale='pt_BR')
+    return {
+        "pos": pat.prefix[0].replace('¤', cur),
+        "neg": pat.prefix[1].replace('¤', cur),
+        "group": get_group_symbol('pt_BR'),
+        "decimal": get_decimal_symbol('pt_BR'),
+    }
+
+_DATE_TOKENS = {"dd": "%d", "MM": "%m", "y": "%Y", "yyyy": "%Y"}
+
+def _compile_date():
+    if Locale is None:
+        return None
+    pattern = Locale.parse('pt_BR').date_formats['short'].pattern  # ex.: dd/MM/y
+    out = ""
+    for tok in pattern.replace("/", " / ").split():
+        if tok == "/":
+            out += "/"
+        elif tok in _DATE_TOKENS:
+            out += _DATE_TOKENS[tok]
+        else:
+            return None
+    return out
+
+_MONEY = _compile_money()
+_DATE_FMT = _compile_date()
+_CENT = Decimal("0.01")
+_MAX_FAST = 1e13  # acima disso o float*100 perde os centavos: caminho exato
+
+def _cents_exact(v: float) -> int:
+    # Mesmo arredondamento do Babel: Decimal(str(v)) com HALF_EVEN
+    return int((Decimal(str(v)).quantize(_CENT, rounding=ROUND_HALF_EVEN) * 100).to_integral_value())
+
+def money_br_many(values: Iterable[float]) -> List[str]:
+    import numpy as np  # lazy: a tela de entrada não carrega NumPy
+    arr = np.asarray(values if hasattr(values, "__len__") else list(values), dtype=np.float64)
+    if _MONEY is None:
+        return [money_br(float(v)) for v in arr]
+    finite = np.isfinite(arr) & (np.abs(arr) < _MAX_FAST)
+    x = np.abs(np.where(finite, arr, 0.0)) * 100.0
+    cents = np.rint(x).astype(np.int64)
+    # Perto de meio centavo o float binário pode divergir do texto decimal: recalcula exato
+    # (a janela cresce com o ulp do valor; em 1e12 o erro de v*100 já passa de 0,01 centavo)
+    tol = np.maximum(1e-6, 400.0 * np.spacing(np.abs(np.where(finite, arr, 0.0))))
+    tie = finite & (np.abs(x - np.floor(x) - 0.5) < tol)
+    neg = np.signbit(arr)
+    g, dec, pos_p, neg_p = _MONEY["group"], _MONEY["decimal"], _MONEY["pos"], _MONEY["neg"]
+    out = []
+    for v, c, ok, t, n in zip(arr.tolist(), cents.tolist(), finite.tolist(), tie.tolist(), neg.tolist()):
+        if not ok:
+            out.append(money_br(v))
+            continue
+        if t:
+            c = abs(_cents_exact(v))
+        ip, fp = divmod(c, 100)
+        out.append(f"{neg_p if n else pos_p}{ip:,}".replace(",", g) + f"{dec}{fp:02d}")
+    return out
+
+def date_br_many(values: Iterable[date]) -> List[str]:
+    if _DATE_FMT is None:
+        return [date_br(d) for d in values]
+    # strftime('%Y') só coincide com o 'y' do Babel a partir do ano 1000; vazios/NaT vão para date_br
+    return [d.strftime(_DATE_FMT) if d is not None and d.year >= 1000 else date_br(d) for d in values]
+
+def format_columns(df, money=(), dates=()):
+    # Formata colunas de um DataFrame de uma vez (retorna o próprio df)
+    for col in money:
+        df[col] = money_br_many(df[col].to_numpy())
+    for col in dates:
+        df[col] = date_br_many(df[col].tolist())
+    return df
@@ -0,0 +1,260 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import Bucket, Movement
+import reconcile
+import services
+
+# ==================================================
+# Importação de extratos bancários (OFX / CSV)
+# ==================================================
+# Pipeline: parse em streaming -> regra de balde -> hash de conteúdo ->
+# INSERT em lote com ON CONFLICT DO NOTHING (índice único user_id+import_hash)
+# -> um UPDATE de saldo por balde -> conferência de saldos (reconcile.py).
+# Tudo em uma única transação.
+
+BATCH_SIZE = int(os.getenv("DAVI_IMPORT_BATCH_SIZE", "500"))
+
+# ---------
+# Utilidades
+# ---------
+def _fold(s: str) -> str:
+    # minúsculas e sem acento (p/ cabeçalhos e regras)
+    s = unicodedata.normalize("NFKD", s or "")
+    return "".join(c for c in s if not unicodedata.combining(c)).lower().strip()
+
+def open_text(raw, encoding: Optional[str] = None) -> io.TextIOBase:
+    # Aceita bytes/arquivo binário (ex.: st.file_uploader); detecta UTF-8 x CP1252 pelo início
+    if isinstance(raw, bytes):
+        raw = io.BytesIO(raw)
+    if isinstance(raw, io.TextIOBase):
+        return raw
+    if encoding is None:
+        head = raw.read(4096)
+        raw.seek(0)
+        try:
+            head.decode("utf-8")
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            encoding = "cp1252"
+    return io.TextIOWrapper(raw, encoding=encoding, errors="replace", newline="")
+
+def parse_amount(s) -> float:
+    # "1.234,56", "-12,30", "1234.56", "1,234.56", "R$ 10,00"
+    # O separador decimal é o último entre "," e "."; o outro é de milhar
+    if isinstance(s, (int, float)):
+        return float(s)
+    s = (s or "").strip().replace("R$", "").replace(" ", "").replace("\xa0", "")
+    if s.rfind(",") > s.rfind("."):
+        s = s.replace(".", "").replace(",", ".")
+    else:
+        s = s.replace(",", "")
+    return float(s) if s else 0.0
+
+_DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d", "%Y%m%d")
+
+def parse_date(s: str) -> date:
+    s = (s or "").strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s[:10] if fmt != "%Y%m%d" else s[:8], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida no extrato: {s!r}")
+
+# ----------
+# Parser OFX
+# ----------
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+def parse_ofx(fh) -> Iterator[Dict]:
+    # OFX 1.x (SGML, tags sem fechamento) e 2.x (XML) linha a linha
+    cur = None
+    for line in fh:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing:
+                    if cur is not None and "date" in cur and "amount" in cur:
+                        yield cur
+                    cur = None
+                else:
+                    cur = {}
+                continue
+            if cur is None or closing:
+                continue
+            value = value.strip()
+            if tag == "DTPOSTED":
+                cur["date"] = parse_date(value)
+            elif tag == "TRNAMT":
+                cur["amount"] = parse_amount(value)
+            elif tag == "FITID":
+                cur["fitid"] = value
+            elif tag == "MEMO":
+                cur["description"] = value
+            elif tag == "NAME" and not cur.get("description"):
+                cur["description"] = value
+
+# ----------
+# Parser CSV
+# ----------
+DATE_KEYS   = ("data", "date", "data lancamento", "data movimento")
+DESC_KEYS   = ("descricao", "historico", "description", "memo", "lancamento")
+AMOUNT_KEYS = ("valor", "amount", "value", "valor (r$)")
+ID_KEYS     = ("id", "fitid", "documento", "identificador")
+
+def _pick(row: Dict[str, str], keys) -> Optional[str]:
+    for k in keys:
+        if k in row and row[k] not in (None, ""):
+            return row[k]
+    return None
+
+def parse_csv(fh, delimiter: Optional[str] = None) -> Iterator[Dict]:
+    if delimiter is None:
+        sample = fh.read(4096)
+        fh.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=";,\t").delimiter
+        except csv.Error:
+            delimiter = ";"
+    reader = csv.reader(fh, delimiter=delimiter)
+    header = None
+    for raw in reader:
+        if not raw or not any(c.strip() for c in raw):
+            continue
+        if header is None:
+            header = [_fold(c) for c in raw]
+            continue
+        row = dict(zip(header, raw))
+        d, amt = _pick(row, DATE_KEYS), _pick(row, AMOUNT_KEYS)
+        if d is None or amt is None:
+            continue
+        out = {"date": parse_date(d), "amount": parse_amount(amt), "description": (_pick(row, DESC_KEYS) or "").strip()}
+        fitid = _pick(row, ID_KEYS)
+        if fitid:
+            out["fitid"] = fitid.strip()
+        yield out
+
+def parse_statement(raw, filename: str = "", encoding: Optional[str] = None) -> Iterator[Dict]:
+    fh = open_text(raw, encoding)
+    if filename.lower().endswith((".ofx", ".qfx")):
+        return parse_ofx(fh)
+    if filename.lower().endswith(".csv"):
+        return parse_csv(fh)
+    # sem extensão conhecida: olha o início do arquivo
+    head = fh.read(512)
+    fh.seek(0)
+    return parse_ofx(fh) if ("OFXHEADER" in head or "<OFX>" in head.upper()) else parse_csv(fh)
+
+# -------------
+# Regras/baldes
+# -------------
+def parse_rules(text: str) -> List[Dict]:
+    # Uma regra por linha: "trecho da descrição = ID do balde" (ex.: "ifood = 3")
+    rules = []
+    for line in (text or "").splitlines():
+        if "=" not in line:
+            continue
+        pat, bid = line.rsplit("=", 1)
+        pat, bid = _fold(pat), bid.strip()
+        if pat and bid.isdigit():
+            rules.append({"contains": pat, "bucket_id": int(bid)})
+    return rules
+
+def map_bucket(description: str, rules: List[Dict], default_bucket_id: Optional[int]) -> Optional[int]:
+    desc = _fold(description)
+    for r in rules:
+        if r["contains"] in desc:
+            return r["bucket_id"]
+    return default_bucket_id
+
+def content_hash(user_id: int, row: Dict, occurrence: int) -> str:
+    # FITID do banco quando existe; senão data+valor+descrição (+ n-ésima repetição no arquivo)
+    if row.get("fitid"):
+        key = f"fitid|{row['fitid']}|{row['date'].isoformat()}|{round(row['amount'] * 100)}"
+    else:
+        key = f"row|{row['date'].isoformat()}|{round(row['amount'] * 100)}|{_fold(row.get('description', ''))}|{occurrence}"
+    return hashlib.sha256(f"{user_id}|{key}".encode()).hexdigest()
+
+def to_movements(user_id: int, rows: Iterable[Dict], rules: List[Dict],
+                 default_bucket_id: Optional[int]) -> Iterator[Dict]:
+    seen: Dict[str, int] = defaultdict(int)
+    for row in rows:
+        amt = row["amount"]
+        if amt == 0:
+            continue
+        base = f"{row['date']}|{round(amt * 100)}|{_fold(row.get('description', ''))}"
+        occurrence = seen[base]
+        seen[base] += 1
+        yield {
+            "user_id": user_id,
+            "bucket_id": map_bucket(row.get("description", ""), rules, default_bucket_id),
+            "kind": "income" if amt > 0 else "expense",
+            "amount": abs(amt),
+            "description": row.get("description", ""),
+            "date": row["date"],
+            "import_hash": content_hash(user_id, row, occurrence),
+        }
+
+# -------------------
+# Gravação em lote
+# -------------------
+_INSERT_MOVEMENT = (
+    sqlite_insert(Movement.__table__)
+    .on_conflict_do_nothing(index_elements=["user_id", "import_hash"])
+    .returning(Movement.__table__.c.bucket_id, Movement.__table__.c.kind, Movement.__table__.c.amount)
+)
+
+def _insert_batch(db: Session, batch: List[Dict], deltas: Dict[int, float]) -> int:
+    # executemany no Core (statement compilado uma vez; "insertmanyvalues" agrupa os VALUES)
+    inserted = 0
+    for bucket_id, kind, amount in db.connection().execute(_INSERT_MOVEMENT, batch):
+        inserted += 1
+        if bucket_id is not None:
+            deltas[bucket_id] += amount if kind == "income" else -amount
+    return inserted
+
+def import_statement(db: Session, user_id: int, rows: Iterable[Dict], rules: Optional[List[Dict]] = None,
+                     default_bucket_id: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                     on_batch: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    # on_batch(linhas_lidas) após cada lote; exceção lançada por ele desfaz a importação inteira.
+    # Tudo numa transação de serviço (BEGIN IMMEDIATE; reentrante dentro de services.run_batch)
+    deltas: Dict[int, float] = defaultdict(float)
+    read = inserted = 0
+    batch: List[Dict] = []
+    with services.transaction(db):
+        # Só baldes do próprio usuário recebem lançamentos
+        own = set(db.execute(select(Bucket.id).where(Bucket.user_id == user_id)).scalars())
+        rules = [r for r in (rules or []) if r["bucket_id"] in own]
+        if default_bucket_id is not None and default_bucket_id not in own:
+            default_bucket_id = None
+
+        for mov in to_movements(user_id, rows, rules, default_bucket_id):
+            read += 1
+            batch.append(mov)
+            if len(batch) >= batch_size:
+                inserted += _insert_batch(db, batch, deltas)
+                batch = []
+                if on_batch:
+                    on_batch(read)
+        if batch:
+            inserted += _insert_batch(db, batch, deltas)
+        # Um UPDATE agregado por balde (não um por linha)
+        for bucket_id, delta in deltas.items():
+            db.execute(
+                update(Bucket).where(Bucket.id == bucket_id, Bucket.user_id == user_id)
+                .values(balance=Bucket.balance + delta)
+            )
+        reconcile.run(db.connection(), user_id)
+    return {"read": read, "inserted": inserted, "duplicates": read - inserted, "buckets_updated": len(deltas)}
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ==============================================
+# Instrumentação por rerun (consultas + tempo)
+# ==============================================
+# Desligado (padrão) não há listener no engine. Ligado (DAVI_INSTRUMENT=1 ou
+# o toggle de debug na sidebar), cada rerun conta consultas, tempo de banco e
+# linhas lidas, cronometra as fases (global -> página) e grava uma linha JSON
+# em LOG_PATH. A mesma consulta com os mesmos parâmetros mais de uma vez no
+# rerun aparece em "repeated"; o mesmo SQL muitas vezes (N+1) em "hot_sql".
+
+ENABLED = os.getenv("DAVI_INSTRUMENT", "").lower() in ("1", "true", "yes", "on")
+LOG_PATH = os.getenv("DAVI_INSTRUMENT_LOG", "instrument.jsonl")
+HOT_SQL_MIN = int(os.getenv("DAVI_INSTRUMENT_HOT_SQL_MIN", "5"))
+SQL_MAX_CHARS = 300
+STATE_KEY = "_instrument_pending"
+
+_local = threading.local()
+_installed: set = set()
+_install_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+class RerunStats:
+    def __init__(self, user_id: Optional[int] = None):
+        self.user_id = user_id
+        self.t0 = self.last = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.rows = 0
+        self.by_query: Dict[tuple, List] = defaultdict(lambda: [0, 0.0])  # (sql, params) -> [n, ms]
+        self.by_sql: Dict[str, int] = defaultdict(int)
+        self.phases: List[Dict] = []
+        self.phase("global")
+
+    def phase(self, name: str):
+        now = self.last = time.perf_counter()
+        if self.phases:
+            self._close_phase(now)
+        self.phases.append({"name": name, "start": now, "queries": self.queries, "db_ms": self.db_ms, "rows": self.rows})
+
+    def _close_phase(self, now: float):
+        p = self.phases[-1]
+        if "ms" in p:
+            return
+        p.update(ms=(now - p.pop("start")) * 1000, queries=self.queries - p["queries"],
+                 db_ms=self.db_ms - p["db_ms"], rows=self.rows - p["rows"])
+
+    def report(self, interrupted: bool = False) -> Dict:
+        end = self.last if interrupted else time.perf_counter()
+        self._close_phase(end)
+        repeated = [{"sql": sql[:SQL_MAX_CHARS], "params": params, "count": n, "ms": round(ms, 2)}
+                    for (sql, params), (n, ms) in self.by_query.items() if n > 1]
+        hot = [{"sql": sql[:SQL_MAX_CHARS], "count": n} for sql, n in self.by_sql.items() if n >= HOT_SQL_MIN]
+        return {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "user_id": self.user_id,
+            "page": self.phases[-1]["name"] if len(self.phases) > 1 else None,
+            "total_ms": round((end - self.t0) * 1000, 2),
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 2),
+            "rows": self.rows,
+            "phases": [{k: (round(v, 2) if isinstance(v, float) else v) for k, v in p.items()} for p in self.phases],
+            "repeated": sorted(repeated, key=lambda r: -r["count"]),
+            "hot_sql": sorted(hot, key=lambda r: -r["count"]),
+            "interrupted": interrupted,
+        }
+
+class _CountingCursor:
+    # Repassa tudo ao cursor DBAPI e soma as linhas lidas no rerun atual
+    __slots__ = ("_cursor", "_stats")
+
+    def __init__(self, cursor, stats: RerunStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *size):
+        rows = self._cursor.fetchmany(*size)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+# ---------------------
+# Listeners do engine
+# ---------------------
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, "run", None) is not None:
+        conn.info.setdefault("_instrument_t", []).append(time.perf_counter())
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("_instrument_t")
+    if not started:
+        return
+    t = started.pop()
+    stats = getattr(_local, "run", None)
+    if stats is None:
+        return
+    now = time.perf_counter()
+    ms = (now - t) * 1000
+    stats.queries += 1
+    stats.db_ms += ms
+    stats.last = now
+    entry = stats.by_query[(statement, repr(parameters)[:SQL_MAX_CHARS])]
+    entry[0] += 1
+    entry[1] += ms
+    stats.by_sql[statement] += 1
+    if executemany or cursor.description is None:
+        stats.rows += max(cursor.rowcount, 0)  # DML: linhas afetadas
+    elif context is not None:
+        context.cursor = _CountingCursor(cursor, stats)  # SELECT: conta o que for lido
+
+def install(engine: Engine):
+    with _install_lock:
+        if id(engine) in _installed:
+            return
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
+        _installed.add(id(engine))
+
+# ------------------------
+# API usada pelo app.py
+# ------------------------
+def start(engine: Engine, enabled: bool = ENABLED, user_id: Optional[int] = None,
+          state=None, log_path: Optional[str] = LOG_PATH) -> Optional[RerunStats]:
+    # `state` (ex.: st.session_state) guarda o rerun em andamento: se o anterior
+    # parou no meio (st.stop/st.rerun/exceção), ele é gravado agora como interrompido
+    if state is not None and state.get(STATE_KEY) is not None:
+        _write(state.pop(STATE_KEY).report(interrupted=True), log_path)
+    _local.run = None
+    if not enabled:
+        return None
+    install(engine)
+    stats = _local.run = RerunStats(user_id)
+    if state is not None:
+        state[STATE_KEY] = stats
+    return stats
+
+def phase(name: str):
+    stats = getattr(_local, "run", None)
+    if stats is not None:
+        stats.phase(name)
+
+def finish(state=None, log_path: Optional[str] = LOG_PATH) -> Optional[Dict]:
+    stats = getattr(_local, "run", None)
+    _local.run = None
+    if stats is None:
+        return None
+    if state is not None:
+        state.pop(STATE_KEY, None)
+    rep = stats.report()
+    _write(rep, log_path)
+    return rep
+
+def _write(rep: Dict, log_path: Optional[str]):
+    if not log_path:
+        return
+    line = json.dumps(rep, ensure_ascii=False, default=str)
+    with _log_lock, open(log_path, "a", encoding="utf-8") as fh:
+        fh.write(line + "\n")
@@ -0,0 +1,476 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String, Text, delete, insert, or_, select, update
+from sqlalchemy.orm import declarative_base
+
+from db import make_engine
+
+# ==========================================
+# Tarefas em segundo plano (jobs)
+# ==========================================
+# Trabalho pesado (exportação, importação, normalização, reset, projeção,
+# snapshots, restauração, conferência de saldos) sai do thread do script
+# Streamlit: entra num pool de threads limitado e o estado fica numa tabela
+# SQLite (status, progresso, resultado, cancelamento). A tela só consulta a
+# tabela (widget com polling em app.py), então a tarefa sobrevive a reruns e
+# usuários diferentes rodam em paralelo.
+# A tabela fica num arquivo próprio (DAVI_JOBS_DB_URL): o progresso grava
+# mesmo enquanto a própria tarefa segura a trava de escrita do banco principal,
+# e não conta como "escrita externa" para o cache (cache.sync_external_writes).
+# Passos de CPU (Monte Carlo) usam cpu_map: pool de processos, um por núcleo.
+
+JOBS_DB_URL = os.getenv("DAVI_JOBS_DB_URL", "sqlite:///./davi_jobs.db")
+JOB_WORKERS = int(os.getenv("DAVI_JOB_WORKERS", "4"))
+JOB_PROCESSES = int(os.getenv("DAVI_JOB_PROCESSES", str(os.cpu_count() or 1)))
+PROGRESS_EVERY = float(os.getenv("DAVI_JOB_PROGRESS_SECONDS", "0.5"))
+KEEP_PER_USER = int(os.getenv("DAVI_JOB_KEEP", "20"))
+EXPORT_TTL_HOURS = float(os.getenv("DAVI_EXPORT_TTL_HOURS", "24"))
+MIN_PATHS_PER_BLOCK = 2_000
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed", "cancelled")
+
+JobsBase = declarative_base()
+
+class Job(JobsBase):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)       # None = tarefa global (ex.: reset)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed | cancelled
+    progress = Column(Float, nullable=False, default=0.0)      # 0..1
+    message = Column(String, default="")
+    params = Column(Text, default="{}")            # JSON (bytes viram tamanho + hash)
+    result = Column(Text, nullable=True)           # JSON
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    owner_pid = Column(Integer, nullable=True)     # processo que executa
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_user_kind_id", "user_id", "kind", "id"),
+        Index("ix_jobs_status", "status"),
+    )
+
+_JOBS = Job.__table__
+_FIELDS = ("id", "user_id", "kind", "status", "progress", "message", "params", "result", "error",
+           "cancel_requested", "created_at", "started_at", "finished_at")
+
+class Cancelled(Exception):
+    pass
+
+_state = {"engine": None, "threads": None, "procs": None}
+_setup_lock = threading.Lock()
+_cancel_events: Dict[int, threading.Event] = {}
+_current = threading.local()  # JobContext da tarefa que roda neste thread (cpu_map confere o cancelamento)
+
+# -----------------
+# Banco e pools
+# -----------------
+def _engine():
+    if _state["engine"] is None:
+        with _setup_lock:
+            if _state["engine"] is None:
+                eng = make_engine(JOBS_DB_URL)
+                JobsBase.metadata.create_all(bind=eng)
+                _recover(eng)
+                _state["engine"] = eng
+    return _state["engine"]
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid or pid == os.getpid():  # mesmo pid num processo novo (contêiner reiniciado) = órfã
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _recover(eng):
+    # Tarefas que ficaram "rodando" num processo que já morreu não vão terminar sozinhas
+    with eng.begin() as con:
+        rows = con.execute(select(_JOBS.c.id, _JOBS.c.owner_pid).where(_JOBS.c.status.in_(ACTIVE))).all()
+        dead = [jid for jid, pid in rows if not _pid_alive(pid)]
+        if dead:
+            con.execute(update(_JOBS).where(_JOBS.c.id.in_(dead)).values(
+                status="failed", message="Interrompida: o app foi reiniciado.", finished_at=datetime.now()))
+
+def _threads() -> ThreadPoolExecutor:
+    if _state["threads"] is None:
+        with _setup_lock:
+            if _state["threads"] is None:
+                _state["threads"] = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="davi-job")
+    return _state["threads"]
+
+def _procs() -> ProcessPoolExecutor:
+    if _state["procs"] is None:
+        with _setup_lock:
+            if _state["procs"] is None:
+                # spawn: sem herdar threads/conexões abertas do processo do Streamlit
+                _state["procs"] = ProcessPoolExecutor(max_workers=JOB_PROCESSES,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+    return _state["procs"]
+
+def cpu_blocks(n_items: int) -> int:
+    # Quantos blocos dividir um passo de CPU (1 = roda no próprio thread)
+    if JOB_PROCESSES <= 1:
+        return 1
+    return max(1, min(JOB_PROCESSES, n_items // MIN_PATHS_PER_BLOCK))
+
+def cpu_map(fn: Callable, items: Iterable) -> List:
+    # map em vários processos (fn precisa ser função de módulo); com 1 núcleo, map comum.
+    # Dentro de uma tarefa, confere o cancelamento entre os blocos
+    ctx: Optional[JobContext] = getattr(_current, "ctx", None)
+    check = ctx.check_cancel if ctx is not None else (lambda: None)
+    items = list(items)
+    if JOB_PROCESSES <= 1 or len(items) <= 1:
+        out = []
+        for item in items:
+            check()
+            out.append(fn(item))
+        return out
+    futures = [_procs().submit(fn, item) for item in items]
+    try:
+        pending = set(futures)
+        while pending:
+            check()
+            _done, pending = wait(pending, timeout=PROGRESS_EVERY, return_when=FIRST_COMPLETED)
+        return [f.result() for f in futures]
+    finally:
+        for f in futures:
+            f.cancel()
+
+def shutdown():
+    for key in ("threads", "procs"):
+        if _state[key] is not None:
+            _state[key].shutdown(wait=False, cancel_futures=True)
+            _state[key] = None
+
+# ---------------
+# Serialização
+# ---------------
+def _json_default(o):
+    if isinstance(o, (date, datetime)):
+        return o.isoformat()
+    if isinstance(o, (bytes, bytearray)):  # arquivo enviado: só tamanho + hash (identifica na deduplicação)
+        return f"<{len(o)} bytes sha1:{hashlib.sha1(o).hexdigest()[:12]}>"
+    if hasattr(o, "tolist"):  # NumPy
+        return o.tolist()
+    return str(o)
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=_json_default, sort_keys=True)
+
+def _row_dict(row) -> Dict:
+    d = dict(zip(_FIELDS, row))
+    d["params"] = json.loads(d["params"] or "{}")
+    d["result"] = json.loads(d["result"]) if d["result"] else None
+    return d
+
+def _owner(user_id: Optional[int]):
+    return _JOBS.c.user_id.is_(None) if user_id is None else _JOBS.c.user_id == user_id
+
+def _set(job_id: int, **values):
+    with _engine().begin() as con:
+        con.execute(update(_JOBS).where(_JOBS.c.id == job_id).values(**values))
+
+def _cancel_requested(job_id: int) -> bool:
+    with _engine().connect() as con:
+        return bool(con.execute(select(_JOBS.c.cancel_requested).where(_JOBS.c.id == job_id)).scalar())
+
+# -----------------------
+# Contexto da tarefa
+# -----------------------
+class JobContext:
+    def __init__(self, job_id: int, user_id: Optional[int]):
+        self.job_id = job_id
+        self.user_id = user_id
+        self._event = _cancel_events.setdefault(job_id, threading.Event())
+        self._last = 0.0
+
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check_cancel(self, poll: bool = True):
+        # O evento só vale neste processo; poll também lê cancel_requested na tabela
+        # (cancelada por outro processo, ex. api.py, ou antes de um reinício)
+        if not self._event.is_set() and poll and _cancel_requested(self.job_id):
+            self._event.set()
+        if self._event.is_set():
+            raise Cancelled()
+
+    def progress(self, fraction: Optional[float] = None, message: Optional[str] = None, force: bool = False):
+        # Grava no máximo a cada PROGRESS_EVERY s; também é o ponto de cancelamento
+        self.check_cancel(poll=False)
+        now = time.monotonic()
+        if not force and now - self._last < PROGRESS_EVERY:
+            return
+        self._last = now
+        self.check_cancel()
+        values = {}
+        if fraction is not None:
+            values["progress"] = max(0.0, min(float(fraction), 1.0))
+        if message is not None:
+            values["message"] = message
+        if values:
+            _set(self.job_id, **values)
+
+# ------------------
+# Registro e execução
+# ------------------
+HANDLERS: Dict[str, Callable] = {}
+
+def handler(kind: str):
+    def deco(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return deco
+
+def submit(kind: str, user_id: Optional[int] = None, /, **params) -> int:
+    # kind/user_id só posicionais: os parâmetros da tarefa podem ter os mesmos nomes (ex.: filtro kind)
+    # Mesma tarefa (tipo + parâmetros) já na fila ou rodando para o usuário: reaproveita
+    if kind not in HANDLERS:
+        raise ValueError(f"Tarefa desconhecida: {kind}")
+    params_json = _dumps(params)
+    with _engine().begin() as con:
+        running = con.execute(
+            select(_JOBS.c.id).where(_owner(user_id), _JOBS.c.kind == kind, _JOBS.c.params == params_json,
+                                     _JOBS.c.status.in_(ACTIVE))
+        ).scalar()
+        if running is not None:
+            return running
+        job_id = con.execute(insert(_JOBS).values(
+            user_id=user_id, kind=kind, status="queued", progress=0.0, message="Na fila…", params=params_json,
+            cancel_requested=False, owner_pid=os.getpid(), created_at=datetime.now(),
+        )).inserted_primary_key[0]
+    _cancel_events[job_id] = threading.Event()
+    _prune(user_id, kind)
+    _threads().submit(_run, job_id, kind, user_id, params)
+    return job_id
+
+def _run(job_id: int, kind: str, user_id: Optional[int], params: Dict):
+    ctx = _current.ctx = JobContext(job_id, user_id)
+    try:
+        ctx.check_cancel()
+        _set(job_id, status="running", message="Em andamento…", started_at=datetime.now())
+        result = HANDLERS[kind](ctx, **params)
+    except Cancelled:
+        _set(job_id, status="cancelled", message="Cancelada.", finished_at=datetime.now())
+    except Exception as e:
+        _set(job_id, status="failed", message=str(e) or type(e).__name__,
+             error=traceback.format_exc(limit=8), finished_at=datetime.now())
+    else:
+        _set(job_id, status="done", progress=1.0, message="Concluída.", result=_dumps(result),
+             finished_at=datetime.now())
+    finally:
+        _current.ctx = None
+        _cancel_events.pop(job_id, None)
+
+def cancel(job_id: int) -> bool:
+    # Na fila: nem começa. Rodando: para no próximo ctx.progress()/ctx.check_cancel() (ou bloco do cpu_map)
+    with _engine().begin() as con:
+        n = con.execute(update(_JOBS).where(_JOBS.c.id == job_id, _JOBS.c.status.in_(ACTIVE))
+                        .values(cancel_requested=True, message="Cancelando…")).rowcount
+    ev = _cancel_events.get(job_id)
+    if ev is not None:
+        ev.set()
+    return n > 0
+
+def get(job_id: int) -> Optional[Dict]:
+    with _engine().connect() as con:
+        row = con.execute(select(*[_JOBS.c[f] for f in _FIELDS]).where(_JOBS.c.id == job_id)).first()
+    return _row_dict(row) if row else None
+
+def recent(user_id: Optional[int], kind: Optional[str] = None, limit: int = 10) -> List[Dict]:
+    q = select(*[_JOBS.c[f] for f in _FIELDS]).where(_owner(user_id))
+    if kind is not None:
+        q = q.where(_JOBS.c.kind == kind)
+    with _engine().connect() as con:
+        return [_row_dict(r) for r in con.execute(q.order_by(_JOBS.c.id.desc()).limit(limit))]
+
+def latest(user_id: Optional[int], kind: str) -> Optional[Dict]:
+    rows = recent(user_id, kind, limit=1)
+    return rows[0] if rows else None
+
+def _remove_export_file(kind: str, result: Optional[str]):
+    path = (json.loads(result) or {}).get("path") if kind == "export" and result else None
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def _prune(user_id: Optional[int], kind: Optional[str] = None):
+    # Mantém só as KEEP_PER_USER tarefas mais recentes. Arquivos de exportação saem do
+    # disco antes: ao pedir uma nova exportação (a anterior do usuário é descartada)
+    # e, de qualquer usuário, EXPORT_TTL_HOURS depois de prontos
+    cutoff = datetime.now() - timedelta(hours=EXPORT_TTL_HOURS)
+    with _engine().begin() as con:
+        stale = or_(_JOBS.c.finished_at < cutoff, _owner(user_id)) if kind == "export" else _JOBS.c.finished_at < cutoff
+        for (result,) in con.execute(
+            select(_JOBS.c.result)
+            .where(_JOBS.c.kind == "export", _JOBS.c.status == "done", _JOBS.c.result.isnot(None), stale)
+        ).all():
+            _remove_export_file("export", result)
+        old = con.execute(
+            select(_JOBS.c.id, _JOBS.c.kind, _JOBS.c.result).where(_owner(user_id), _JOBS.c.status.in_(FINISHED))
+            .order_by(_JOBS.c.id.desc()).offset(KEEP_PER_USER)
+        ).all()
+        if not old:
+            return
+        for _jid, old_kind, result in old:
+            _remove_export_file(old_kind, result)
+        con.execute(delete(_JOBS).where(_JOBS.c.id.in_([r[0] for r in old])))
+
+# ======================
+# Tarefas do app
+# ======================
+# Cada tarefa recebe o dono em ctx.user_id, abre a própria sessão e invalida o
+# cache ao gravar (mesmo processo)
+@handler("export")
+def _export_job(ctx: JobContext, fmt: str = "csv", formatted: bool = False, **filters) -> Dict:
+    from db import SessionLocal
+    from export import export_movements
+    import queries
+    user_id = ctx.user_id
+    with SessionLocal() as db:
+        total = queries.ledger_count(db, user_id, filters.get("bucket_id"), filters.get("kind"),
+                                     filters.get("date_from"), filters.get("date_to"))
+
+        def on_rows(n: int):
+            ctx.progress(n / total if total else None, f"{n} de {total} linhas")
+
+        path = export_movements(db, user_id, fmt=fmt, formatted=formatted, on_rows=on_rows, **filters)
+    return {"path": path, "rows": total, "fmt": fmt}
+
+@handler("import")
+def _import_job(ctx: JobContext, data: bytes, filename: str = "", rules: str = "",
+                default_bucket_id: Optional[int] = None) -> Dict:
+    from db import SessionLocal
+    from importer import import_statement, parse_rules, parse_statement
+    import cache
+    user_id = ctx.user_id
+    with SessionLocal() as db:
+        res = import_statement(db, user_id, parse_statement(data, filename=filename), rules=parse_rules(rules),
+                               default_bucket_id=default_bucket_id,
+                               on_batch=lambda n: ctx.progress(None, f"{n} linhas lidas"))
+    cache.bump_version(user_id)
+    return res
+
+@handler("normalize")
+def _normalize_job(ctx: JobContext) -> Dict:
+    from db import SessionLocal
+    import cache
+    import services
+    user_id = ctx.user_id
+    with SessionLocal() as db:
+        percents = services.normalize_bucket_percents(db, user_id)
+    cache.bump_version(user_id)
+    return {"percents": percents}
+
+@handler("payoff")
+def _payoff_job(ctx: JobContext, budget: Optional[float] = None, rates: Optional[Dict[str, float]] = None) -> Dict:
+    # Compara as estratégias de quitação de um usuário (ou de todos, sem user_id) num só lote
+    from db import SessionLocal
+    from logic import compare_strategies
+    import queries
+    user_id = ctx.user_id
+    with SessionLocal() as db:
+        giants, paid, budgets = queries.payoff_inputs(db, user_id)
+    if budget is not None and user_id is not None:
+        budgets[user_id] = budget
+    ctx.check_cancel()
+    ctx.progress(None, f"Comparando estratégias de {len({g.user_id for g in giants})} usuário(s)…", force=True)
+    months = compare_strategies(giants, budgets, paid, {int(k): v for k, v in (rates or {}).items()})
+    return {"months": {str(uid): res for uid, res in months.items()}}
+
+@handler("reset")
+def _reset_job(ctx: JobContext) -> Dict:
+    from db import SessionLocal
+    import cache
+    import services
+    ctx.check_cancel()
+    safety = _safety_snapshot(ctx, "pre-reset")
+    ctx.check_cancel()
+    with SessionLocal() as db:
+        services.reset_all(db)
+    cache.invalidate_all()
+    return {"snapshot": safety}
+
+@handler("backup")
+def _backup_job(ctx: JobContext, label: str = "") -> Dict:
+    import backup
+
+    def on_progress(fraction: float):
+        ctx.check_cancel(poll=False)
+        ctx.progress(fraction, "Copiando o banco…")
+
+    res = backup.snapshot(label=label, on_progress=on_progress)
+    return {k: res[k] for k in ("name", "bytes", "raw_bytes", "seconds", "pruned")}
+
+@handler("restore")
+def _restore_job(ctx: JobContext, name: str, source_user_id: Optional[int] = None) -> Dict:
+    import backup
+    import cache
+    user_id = ctx.user_id
+    backup.snapshot_path(name)  # falha cedo, antes do snapshot de segurança
+    safety = _safety_snapshot(ctx, "pre-restore")
+    ctx.check_cancel()
+    ctx.progress(None, f"Restaurando de {name}…", force=True)
+    res = backup.restore_user(name, user_id, source_user_id)
+    cache.bump_version(user_id)
+    return {**res, "safety_snapshot": safety}
+
+def _safety_snapshot(ctx: JobContext, label: str) -> Optional[str]:
+    # Antes de apagar/substituir dados: snapshot para poder voltar (None se o banco não é arquivo)
+    import backup
+    from services import ServiceError
+    try:
+        return backup.snapshot(label=label, on_progress=lambda f: ctx.progress(
+            f, "Snapshot de segurança…"))["name"]
+    except ServiceError:
+        return None
+
+@handler("reconcile")
+def _reconcile_job(ctx: JobContext, repair: bool = False, accept: bool = False) -> Dict:
+    # Sem dono = todos os usuários (agendada pelo app); com dono = botões da tela
+    from db import SessionLocal
+    import cache
+    import services
+    with SessionLocal() as db:
+        res = services.reconcile_balances(db, ctx.user_id, repair=repair, accept=accept)
+    if res["repaired"]:
+        if ctx.user_id is None:
+            cache.invalidate_all()
+        else:
+            cache.bump_version(ctx.user_id)
+    return res
+
+@handler("projection")
+def _projection_job(ctx: JobContext, months: int, n_paths: int, seed: int, today: date) -> Dict:
+    # Calcula e deixa no cache da versão atual; a tela lê com cache.projection.peek
+    import cache
+    user_id = ctx.user_id
+    ctx.progress(None, f"Simulando {n_paths} cenários…", force=True)
+    proj = cache.projection(user_id, int(months), int(n_paths), int(seed), today)
+    return {"p_negative_any": proj["p_negative_any"], "paths": proj["paths"], "months": int(months)}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Tarefas em segundo plano")
+    ap.add_argument("--user", type=int, default=None)
+    ap.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args()
+    for j in recent(args.user, limit=args.limit):
+        print(f"#{j['id']:<5} {j['kind']:<10} {j['status']:<9} {j['progress']*100:5.1f}%  "
+              f"{j['created_at']:%d/%m %H:%M:%S}  {j['message']}")
@@ -1,7 +1,10 @@
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from models import Bucket, Giant
 from math import isclose
 
+import numpy as np
+
 def normalize_percents(buckets: List[Bucket]) -> List[float]:
     total = sum(b.percent for b in buckets)
     if total <= 0:
@@ -12,11 +15,38 @@ def normalize_percents(buckets: List[Bucket]) -> List[float]:
         norm = 1.0
     return [round(b.percent * norm, 2) for b in buckets]
 
+# ==============================================================
+# Divisão vetorizada em centavos (maiores restos / Hamilton)
+# ==============================================================
+def to_cents(values) -> np.ndarray:
+    return np.rint(np.asarray(values, dtype=np.float64) * 100.0).astype(np.int64)
+
+def split_cents(incomes, percents) -> np.ndarray:
+    # Divide N entradas entre K baldes -> matriz (N, K) em centavos.
+    # Cada linha soma exatamente a entrada: primeiro o piso de cada cota, depois
+    # os centavos que sobram vão para os maiores restos (empate: ordem dos baldes).
+    cents = to_cents(np.atleast_1d(incomes))
+    weights = np.clip(np.asarray(percents, dtype=np.float64), 0.0, None)
+    total_w = weights.sum()
+    if cents.size == 0 or weights.size == 0 or total_w <= 0:
+        return np.zeros((cents.size, weights.size), dtype=np.int64)
+    sign = np.sign(cents)
+    abs_cents = np.abs(cents)
+    exact = abs_cents[:, None] * (weights / total_w)[None, :]
+    floor = np.floor(exact).astype(np.int64)
+    leftover = abs_cents - floor.sum(axis=1)
+    order = np.argsort(-(exact - floor), axis=1, kind="stable")
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(weights.size)[None, :].repeat(cents.size, axis=0), axis=1)
+    alloc = floor + (rank < leftover[:, None])
+    return alloc * sign[:, None]
+
 def compute_bucket_splits(buckets: List[Bucket], total_income: float) -> List[Dict]:
     percents = normalize_percents(buckets)
+    values = split_cents([total_income], [b.percent for b in buckets])[0]
     out = []
-    for b, p in zip(buckets, percents):
-        value = round(total_income * (p / 100.0), 2)
+    for b, p, cents in zip(buckets, percents, values):
+        value = round(int(cents) / 100.0, 2)
         out.append({
             "bucket_id": b.id,
             "name": b.name,
@@ -31,4 +61,165 @@ def payoff_efficiency(giant: Giant, monthly_input: float) -> Dict:
     eff = round(1000.0 / monthly_input, 2)
     months = int((giant.total_to_pay + (monthly_input - 1)) // monthly_input)
     return {"r_per_1k": eff, "months_to_victory": months}
-    
\ No newline at end of file
+    
+# ==============================================================
+# Simulador de quitação de vários gigantes (avalanche/snowball)
+# ==============================================================
+PAYOFF_STRATEGIES = ("priority", "avalanche", "snowball", "custom")
+MAX_PAYOFF_MONTHS = 600
+
+def payoff_order(giants: List[Giant], remaining: List[float], strategy: str = "priority",
+                 rates: Optional[List[float]] = None, custom_order: Optional[List[int]] = None) -> List[int]:
+    # Índices dos gigantes na ordem de ataque
+    idx = list(range(len(giants)))
+    rates = rates or [0.0] * len(giants)
+    if strategy == "priority":   # mesma ordem da página Plano de Ataque
+        return sorted(idx, key=lambda i: (giants[i].priority, -giants[i].total_to_pay))
+    if strategy == "avalanche":  # maior juros primeiro
+        return sorted(idx, key=lambda i: (-rates[i], giants[i].priority, remaining[i]))
+    if strategy == "snowball":   # menor saldo primeiro
+        return sorted(idx, key=lambda i: (remaining[i], giants[i].priority))
+    if strategy == "custom":
+        pos = {gid: n for n, gid in enumerate(custom_order or [])}
+        return sorted(idx, key=lambda i: (pos.get(giants[i].id, len(pos)), giants[i].priority))
+    raise ValueError(f"Estratégia desconhecida: {strategy}")
+
+def simulate_payoff_batch(balances, budgets, rates=None, max_months: int = MAX_PAYOFF_MONTHS):
+    # balances: (U, K) saldos JÁ na ordem de ataque (0 = sem gigante); budgets: (U,) aporte mensal;
+    # rates: (U, K) juros ao mês (fração). Retorna (pagamentos, saldos) com shape (U, M, K).
+    bal = np.atleast_2d(np.asarray(balances, dtype=np.float64))
+    budget = np.broadcast_to(np.asarray(budgets, dtype=np.float64), bal.shape[:1])
+    r = np.zeros_like(bal) if rates is None else np.atleast_2d(np.asarray(rates, dtype=np.float64))
+    U, K = bal.shape
+    if not r.any():
+        # Sem juros: forma fechada, vetorizada em gigantes e meses
+        safe = np.where(budget > 0, budget, np.inf)
+        months = int(min(max_months, np.nanmax(np.ceil(np.where(budget > 0, bal.sum(1) / safe, 0.0))) if U else 0))
+        t = np.arange(1, months + 1, dtype=np.float64)
+        prev = np.cumsum(bal, axis=1) - bal                                   # (U, K)
+        cum_paid = np.clip(budget[:, None, None] * t[None, :, None] - prev[:, None, :], 0.0, bal[:, None, :])
+        payments = np.diff(np.concatenate([np.zeros((U, 1, K)), cum_paid], axis=1), axis=1)
+        return payments, bal[:, None, :] - cum_paid
+    # Com juros: laço mensal, vetorizado em usuários x gigantes
+    pays, bals = [], []
+    cur = bal.copy()
+    for _ in range(max_months):
+        if not (cur > 1e-9).any():
+            break
+        cur = cur * (1.0 + r)
+        prev = np.cumsum(cur, axis=1) - cur
+        pay = np.clip(budget[:, None] - prev, 0.0, cur)
+        cur = cur - pay
+        pays.append(pay); bals.append(cur.copy())
+    if not pays:
+        return np.zeros((U, 0, K)), np.zeros((U, 0, K))
+    return np.stack(pays, axis=1), np.stack(bals, axis=1)
+
+def defeat_months(balances_path, initial) -> np.ndarray:
+    # (U, M, K) -> (U, K) mês (1..M) em que o saldo zera; 0 se já estava quitado; -1 se não zera no horizonte
+    initial = np.atleast_2d(np.asarray(initial, dtype=np.float64))
+    if balances_path.shape[1] == 0:
+        return np.where(initial <= 1e-6, 0, -1)
+    done = balances_path <= 1e-6
+    first = np.argmax(done, axis=1) + 1
+    return np.where(initial <= 1e-6, 0, np.where(done.any(axis=1), first, -1))
+
+def defeat_months_batch(balances, budgets, rates=None, max_months: int = MAX_PAYOFF_MONTHS) -> np.ndarray:
+    # Só o mês de vitória (U, K), sem materializar o cronograma — p/ comparar estratégias em lote
+    bal = np.atleast_2d(np.asarray(balances, dtype=np.float64))
+    budget = np.broadcast_to(np.asarray(budgets, dtype=np.float64), bal.shape[:1])[:, None]
+    r = None if rates is None else np.atleast_2d(np.asarray(rates, dtype=np.float64))
+    if r is None or not r.any():
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m = np.ceil(np.cumsum(bal, axis=1) / budget - 1e-9)
+        m = np.where((budget > 0) & (m <= max_months), m, -1).astype(np.int64)
+        return np.where(bal <= 1e-6, 0, m)
+    out = np.where(bal <= 1e-6, 0, -1)
+    # Só as linhas (usuários) ainda com dívida seguem no laço
+    rows = np.flatnonzero((out < 0).any(axis=1))
+    cur, r, budget = bal[rows], r[rows], budget[rows]
+    for month in range(1, max_months + 1):
+        if rows.size == 0:
+            break
+        cur = cur * (1.0 + r)
+        prev = np.cumsum(cur, axis=1) - cur
+        cur = cur - np.clip(budget - prev, 0.0, cur)
+        sub = out[rows]
+        sub[(sub < 0) & (cur <= 1e-6)] = month
+        out[rows] = sub
+        keep = (sub < 0).any(axis=1)
+        rows, cur, r, budget = rows[keep], cur[keep], r[keep], budget[keep]
+    return out
+
+def compare_strategies(giants: List[Giant], budgets: Dict[int, float], paid: Optional[Dict[int, float]] = None,
+                       rates: Optional[Dict[int, float]] = None, strategies=PAYOFF_STRATEGIES[:3],
+                       max_months: int = MAX_PAYOFF_MONTHS) -> Dict[int, Dict[str, Optional[int]]]:
+    # Meses até vencer todos os gigantes ativos, por usuário e estratégia:
+    # uma matriz (usuários x gigantes) por estratégia, resolvida de uma vez em defeat_months_batch
+    paid = paid or {}
+    rates = rates or {}
+    by_user: Dict[int, List[Giant]] = {}
+    for g in giants:
+        if g.status == "active":
+            by_user.setdefault(g.user_id, []).append(g)
+    uids = sorted(by_user)
+    out: Dict[int, Dict[str, Optional[int]]] = {uid: {} for uid in uids}
+    if not uids:
+        return out
+    K = max(len(gs) for gs in by_user.values())
+    budget = np.array([float(budgets.get(uid, 0.0)) for uid in uids])
+    for strategy in strategies:
+        bal = np.zeros((len(uids), K))
+        r = np.zeros((len(uids), K))
+        for row, uid in enumerate(uids):
+            gs = by_user[uid]
+            remaining = [max(g.total_to_pay - paid.get(g.id, 0.0), 0.0) for g in gs]
+            rate_list = [float(rates.get(g.id, 0.0)) for g in gs]
+            order = payoff_order(gs, remaining, strategy, rate_list)
+            bal[row, :len(gs)] = [round(remaining[i], 2) for i in order]
+            r[row, :len(gs)] = [rate_list[i] for i in order]
+        months = defeat_months_batch(bal, budget, r if r.any() else None, max_months)
+        for row, uid in enumerate(uids):
+            finished = budget[row] > 0 and (months[row] >= 0).all()
+            out[uid][strategy] = int(months[row].max()) if finished else None
+    return out
+
+@lru_cache(maxsize=256)
+def _simulate_cached(balances: Tuple[float, ...], rates: Tuple[float, ...], budget: float, max_months: int):
+    pays, bals = simulate_payoff_batch([balances], [budget], [rates] if any(rates) else None, max_months)
+    pays, bals, months = pays[0], bals[0], defeat_months(bals, [balances])[0]
+    for a in (pays, bals, months):
+        a.setflags(write=False)  # resultado memoizado é compartilhado: somente leitura
+    return pays, bals, months
+
+def simulate_payoff(giants: List[Giant], monthly_budget: float, strategy: str = "priority",
+                    paid: Optional[Dict[int, float]] = None, rates: Optional[Dict[int, float]] = None,
+                    custom_order: Optional[List[int]] = None, max_months: int = MAX_PAYOFF_MONTHS) -> Dict:
+    paid = paid or {}
+    rates = rates or {}
+    active = [g for g in giants if g.status == "active"]
+    remaining = [max(g.total_to_pay - paid.get(g.id, 0.0), 0.0) for g in active]
+    rate_list = [float(rates.get(g.id, 0.0)) for g in active]
+    order = payoff_order(active, remaining, strategy, rate_list, custom_order)
+    ordered = [active[i] for i in order]
+    if monthly_budget <= 0 or not ordered:
+        return {"strategy": strategy, "order": [g.id for g in ordered], "months": None,
+                "defeat": [{"giant_id": g.id, "name": g.name, "month": None} for g in ordered],
+                "payments": np.zeros((0, len(ordered))), "balances": np.zeros((0, len(ordered))),
+                "total_paid": 0.0}
+    pays, bals, months = _simulate_cached(
+        tuple(round(remaining[i], 2) for i in order), tuple(rate_list[i] for i in order),
+        round(float(monthly_budget), 2), int(max_months),
+    )
+    defeat = [{"giant_id": g.id, "name": g.name, "month": int(m) if m >= 0 else None}
+              for g, m in zip(ordered, months)]
+    finished = all(d["month"] is not None for d in defeat)
+    return {
+        "strategy": strategy,
+        "order": [g.id for g in ordered],
+        "months": max((d["month"] for d in defeat), default=0) if finished else None,
+        "defeat": defeat,
+        "payments": pays,      # (M, K) na ordem de ataque
+        "balances": bals,      # (M, K) saldo após o aporte de cada mês
+        "total_paid": round(float(pays.sum()), 2),
+    }
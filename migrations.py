@@ -0,0 +1,130 @@
+from typing import Callable, List, Tuple
+
+from sqlalchemy.engine import Connection, Engine
+
+# =====================================================
+# Migrações versionadas (PRAGMA user_version do SQLite)
+# =====================================================
+# `Base.metadata.create_all` só cria tabelas novas; índices e colunas novas
+# em bancos já existentes (ex.: davi.db) chegam por aqui, em ordem.
+
+def has_column(con: Connection, table: str, column: str) -> bool:
+    rows = con.exec_driver_sql(f"PRAGMA table_info({table})").all()
+    return any(r[1] == column for r in rows)
+
+def _m001_hot_query_indexes(con: Connection):
+    con.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_movements_user_date ON movements (user_id, date)")
+    con.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_bills_user_due ON bills (user_id, due_date)")
+    con.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_bills_user_paid_due ON bills (user_id, paid, due_date)")
+    con.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_giant_payments_user_giant_date ON giant_payments (user_id, giant_id, date)"
+    )
+
+def _m002_movement_import_hash(con: Connection):
+    if not has_column(con, "movements", "import_hash"):
+        con.exec_driver_sql("ALTER TABLE movements ADD COLUMN import_hash VARCHAR")
+    con.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_movements_user_import_hash ON movements (user_id, import_hash)"
+    )
+
+def _m003_movement_monthly_rollup(con: Connection):
+    # Tabela já criada pelo create_all; aqui entram os triggers e a carga inicial
+    import rollup
+    rollup.install_triggers(con)
+    rollup.rebuild(con)
+
+def _m004_movement_bucket_date_index(con: Connection):
+    con.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_movements_user_bucket_date ON movements (user_id, bucket_id, date, kind, amount)"
+    )
+
+def _m005_search_index(con: Connection):
+    # Sem FTS5 compilado no SQLite a busca usa LIKE (search.py)
+    import search
+    search.install(con)
+
+def _m006_recurring_bills(con: Connection):
+    # Tabelas novas vêm do create_all; garante os índices das exceções em bancos antigos
+    con.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_bill_occurrences_recurring_date "
+        "ON bill_occurrences (recurring_id, occurrence_date)"
+    )
+    con.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_bill_occurrences_user_occurrence ON bill_occurrences (user_id, occurrence_date)"
+    )
+    con.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_bill_occurrences_user_due ON bill_occurrences (user_id, due_date)")
+
+def _m007_bucket_checkpoints(con: Connection):
+    # Tabela vem do create_all; a primeira conferência adota os saldos atuais como base
+    import reconcile
+    reconcile.run(con)
+
+def _m008_movements_autoincrement(con: Connection):
+    # Sem AUTOINCREMENT o SQLite reaproveita os ids mais altos depois de um DELETE (restore_user,
+    # reset_all) e a marca da conferência (id acima da marca = novo) perde movimentações.
+    # O SQLite não altera a chave primária: recria a tabela, índices e triggers
+    from sqlalchemy.schema import CreateTable
+    from models import Movement
+    import rollup
+    import search
+    sql = con.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'movements'").scalar()
+    if "AUTOINCREMENT" in (sql or "").upper():  # banco novo: create_all já criou assim
+        return
+    table = Movement.__table__
+    cols = ", ".join(c.name for c in table.columns)
+    ddl = str(CreateTable(table).compile(dialect=con.dialect))
+    con.exec_driver_sql(ddl.replace("CREATE TABLE movements ", "CREATE TABLE movements_new ", 1))
+    con.exec_driver_sql(f"INSERT INTO movements_new ({cols}) SELECT {cols} FROM movements")
+    con.exec_driver_sql("DROP TABLE movements")  # leva junto índices e triggers
+    con.exec_driver_sql("ALTER TABLE movements_new RENAME TO movements")
+    for index in table.indexes:
+        index.create(con)
+    rollup.install_triggers(con)
+    if search.installed(con):
+        search.install(con)
+    # Ids já reaproveitados antes desta migração: a sequência continua acima de qualquer marca
+    mark = con.exec_driver_sql("SELECT COALESCE(MAX(last_movement_id), 0) FROM bucket_checkpoints").scalar()
+    con.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'movements'")
+    con.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'movements', MAX(COALESCE(MAX(id), 0), ?) FROM movements",
+        (mark,),
+    )
+
+# (versão, descrição, função) — sempre acrescentar no final, nunca reordenar
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "índices das consultas quentes", _m001_hot_query_indexes),
+    (2, "movements.import_hash + índice único", _m002_movement_import_hash),
+    (3, "rollup mensal de movements (triggers)", _m003_movement_monthly_rollup),
+    (4, "índice coberto p/ gráficos de saldo", _m004_movement_bucket_date_index),
+    (5, "busca textual FTS5 (movements/bills)", _m005_search_index),
+    (6, "contas recorrentes (índices das exceções)", _m006_recurring_bills),
+    (7, "marcas de conferência de saldo por balde", _m007_bucket_checkpoints),
+    (8, "movements com AUTOINCREMENT (ids não reaproveitados)", _m008_movements_autoincrement),
+]
+
+def current_version(con: Connection) -> int:
+    return con.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+def run_migrations(engine: Engine) -> List[int]:
+    applied = []
+    with engine.begin() as con:
+        version = current_version(con)
+        for num, _desc, fn in MIGRATIONS:
+            if num <= version:
+                continue
+            fn(con)
+            con.exec_driver_sql(f"PRAGMA user_version = {int(num)}")
+            applied.append(num)
+    return applied
+
+def ensure_schema(engine: Engine) -> List[int]:
+    # create_all (tabelas novas) + migrações pendentes; chamado uma vez por processo
+    from db import Base
+    import models  # noqa: F401  (registra as tabelas no metadata)
+    Base.metadata.create_all(bind=engine)
+    return run_migrations(engine)
+
+if __name__ == "__main__":
+    from db import engine
+    done = ensure_schema(engine)
+    print(f"Migrações aplicadas: {done or 'nenhuma'}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from db import Base
 
@@ -44,6 +44,16 @@ class Movement(Base):
     amount = Column(Float, nullable=False)
     description = Column(String, default="")
     date = Column(Date, nullable=False)
+    import_hash = Column(String, nullable=True)  # hash de conteúdo p/ deduplicar extratos importados
+
+    __table_args__ = (
+        Index("ix_movements_user_date", "user_id", "date"),
+        Index("ux_movements_user_import_hash", "user_id", "import_hash", unique=True),
+        # Cobre o acumulado diário por balde dos gráficos (sem ler a tabela)
+        Index("ix_movements_user_bucket_date", "user_id", "bucket_id", "date", "kind", "amount"),
+        # ids nunca reaproveitados (reconcile.py confere "id acima da marca")
+        {"sqlite_autoincrement": True},
+    )
 
 class Bill(Base):
     __tablename__ = "bills"
@@ -55,6 +65,11 @@ class Bill(Base):
     is_critical = Column(Boolean, default=False)
     paid = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index("ix_bills_user_due", "user_id", "due_date"),
+        Index("ix_bills_user_paid_due", "user_id", "paid", "due_date"),
+    )
+
 # Perfil financeiro do usuário (receita/despesa declaradas)
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -72,4 +87,60 @@ class GiantPayment(Base):
     amount   = Column(Float, nullable=False)   # valor do aporte
     date     = Column(Date,  nullable=False)   # data do aporte
     note     = Column(String, default="")      # observação opcional
-    
\ No newline at end of file
+
+    __table_args__ = (
+        Index("ix_giant_payments_user_giant_date", "user_id", "giant_id", "date"),
+    )
+
+# Totais mensais do livro caixa por balde/tipo (mantidos por triggers, ver rollup.py)
+class MovementMonthlyRollup(Base):
+    __tablename__ = "movement_monthly_rollup"
+    user_id    = Column(Integer, primary_key=True)
+    bucket_id  = Column(Integer, primary_key=True, default=0)  # 0 = movimentação sem balde
+    year_month = Column(String,  primary_key=True)             # AAAA-MM
+    kind       = Column(String,  primary_key=True)             # income | expense | transfer
+    total      = Column(Float,   nullable=False, default=0.0)
+    count      = Column(Integer, nullable=False, default=0)
+
+# Conta recorrente: só a regra (RRULE, ver recurring.py); ocorrências são geradas sob demanda
+class RecurringBill(Base):
+    __tablename__ = "recurring_bills"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    title = Column(String, nullable=False)
+    amount = Column(Float, nullable=False)
+    is_critical = Column(Boolean, default=False)
+    rule = Column(String, nullable=False)          # RRULE sem DTSTART/COUNT, BY* explícitos
+    start_date = Column(Date, nullable=False)      # DTSTART (1º vencimento)
+    end_date = Column(Date, nullable=True)         # último vencimento possível (None = sem fim)
+    settled_through = Column(Date, nullable=True)  # tudo até aqui está pago
+
+# Exceções de uma conta recorrente: só ocorrências pagas ou editadas viram linha
+class BillOccurrence(Base):
+    __tablename__ = "bill_occurrences"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    recurring_id = Column(Integer, ForeignKey("recurring_bills.id", ondelete="CASCADE"), nullable=False)
+    occurrence_date = Column(Date, nullable=False)  # data gerada pela regra (identifica a ocorrência)
+    title = Column(String, nullable=False)
+    amount = Column(Float, nullable=False)
+    due_date = Column(Date, nullable=False)         # vencimento efetivo (pode ter sido remarcado)
+    is_critical = Column(Boolean, default=False)
+    paid = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index("ux_bill_occurrences_recurring_date", "recurring_id", "occurrence_date", unique=True),
+        Index("ix_bill_occurrences_user_occurrence", "user_id", "occurrence_date"),
+        Index("ix_bill_occurrences_user_due", "user_id", "due_date"),
+    )
+
+# Marca da conferência de saldo de cada balde (ver reconcile.py)
+class BucketCheckpoint(Base):
+    __tablename__ = "bucket_checkpoints"
+    bucket_id = Column(Integer, ForeignKey("buckets.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    last_movement_id = Column(Integer, nullable=False, default=0)  # movimentações até este id já conferidas
+    balance = Column(Float, nullable=False)             # saldo esperado na marca
+    net = Column(Float, nullable=False)                 # soma líquida do livro caixa do balde na marca
+    drift = Column(Float, nullable=False, default=0.0)  # saldo gravado - esperado (última conferência)
+    checked_at = Column(DateTime, nullable=True)
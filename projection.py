@@ -0,0 +1,185 @@
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import queries
+from logic import normalize_percents
+
+# ==========================================================
+# Projeção de caixa por Monte Carlo (NumPy, RNG com semente)
+# ==========================================================
+# Entradas e saídas mensais são sorteadas de uma normal truncada em zero,
+# estimada do histórico de Movement (ou do perfil declarado, se o histórico
+# for curto) e espalhadas pelos dias do mês; as saídas do dia ainda recebem
+# ruído lognormal. Contas em aberto (Bill) saem na data de vencimento; as já
+# vencidas, no primeiro dia. Transferências entre baldes não entram no histórico.
+
+DEFAULT_PATHS = 10_000
+HISTORY_MONTHS = 12
+MIN_HISTORY_MONTHS = 3
+DEFAULT_CV = 0.15        # variação (desvio/média) quando só há valores declarados
+DAILY_EXPENSE_SIGMA = 0.5
+PERCENTILES = (10, 50, 90)
+
+def estimate_flows(history: Sequence[Tuple[str, float, float]], declared_income: float,
+                   declared_expense: float) -> Tuple[float, float, float, float]:
+    # (média entrada, desvio entrada, média saída, desvio saída) por mês
+    if len(history) >= MIN_HISTORY_MONTHS:
+        inc = np.array([h[1] for h in history], dtype=np.float64)
+        out = np.array([h[2] for h in history], dtype=np.float64)
+        return float(inc.mean()), float(inc.std(ddof=1)), float(out.mean()), float(out.std(ddof=1))
+    return (declared_income, declared_income * DEFAULT_CV,
+            declared_expense, declared_expense * DEFAULT_CV)
+
+def _month_index(start: date, days: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Para cada dia do horizonte: índice do mês (0..) e nº de dias daquele mês
+    d = np.arange(days, dtype="timedelta64[D]") + np.datetime64(start, "D")
+    months = d.astype("datetime64[M]")
+    idx = (months - months[0]).astype(np.int64)
+    dim = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+    return idx, dim
+
+def _simulate_block(args) -> Dict:
+    # Um bloco de cenários (função de módulo: pode rodar em outro processo). Devolve só
+    # o que os percentis e as probabilidades precisam, por cenário, para juntar blocos sem erro
+    (start_balances, w_in, w_out, mu_in, sd_in, mu_out, sd_out, bills, start, days, n_paths, seed, cp) = args
+    rng = np.random.default_rng(seed)
+    m_idx, dim = _month_index(start, days)
+    n_months = int(m_idx[-1]) + 1 if days else 0
+
+    inc_m = np.maximum(rng.normal(mu_in, sd_in, (n_paths, n_months)), 0.0)
+    out_m = np.maximum(rng.normal(mu_out, sd_out, (n_paths, n_months)), 0.0)
+    inc_d = inc_m[:, m_idx] / dim
+    noise = rng.lognormal(-0.5 * DAILY_EXPENSE_SIGMA ** 2, DAILY_EXPENSE_SIGMA, (n_paths, days))
+    out_d = out_m[:, m_idx] / dim * noise
+
+    bill_d = np.zeros(days)
+    for day, amount, _crit, _bid in bills:
+        bill_d[day] += amount
+
+    cum_in = np.cumsum(inc_d, axis=1)
+    cum_out = np.cumsum(out_d, axis=1)
+    cum_bill = np.cumsum(bill_d)
+    total = start_balances.sum() + cum_in - cum_out - cum_bill[None, :]
+
+    # Contas críticas sem cobertura no vencimento
+    # (saldo antes da conta = saldo do dia + contas do mesmo dia a partir dela)
+    misses = []
+    same_day_after: Dict[int, float] = {}
+    for day, amount, crit, _bid in reversed(list(bills)):
+        same_day_after[day] = same_day_after.get(day, 0.0) + amount
+        if crit:
+            misses.append(int(np.count_nonzero(total[:, day] + same_day_after[day] < amount)))
+    misses.reverse()
+
+    # Baldes só nos checkpoints: saldo_k = inicial_k + w_in_k*entradas - w_out_k*(saídas + contas)
+    buckets = (start_balances[None, None, :]
+               + cum_in[:, cp, None] * w_in[None, None, :]
+               - (cum_out[:, cp, None] + cum_bill[None, cp, None]) * w_out[None, None, :])
+    return {"total_cp": total[:, cp], "buckets_cp": buckets, "misses": misses,
+            "negative_any": int(np.count_nonzero((total < 0).any(axis=1)))}
+
+def simulate_cash_flow(start_balances: Sequence[float], income_weights: Sequence[float],
+                       expense_weights: Sequence[float], mu_in: float, sd_in: float,
+                       mu_out: float, sd_out: float, bills: Sequence[Tuple[int, float, bool, int]],
+                       start: date, days: int = 365, n_paths: int = DEFAULT_PATHS,
+                       seed: int = 0, checkpoints: Optional[Sequence[int]] = None,
+                       map_fn: Callable = map, blocks: int = 1) -> Dict:
+    # bills: [(dia 0..days-1, valor, crítica, id)]; pesos somam 1 (ou 0)
+    # blocks > 1: cenários divididos em blocos independentes (sementes filhas de `seed`),
+    # executados por map_fn (ex.: jobs.cpu_map em vários processos)
+    start_balances = np.asarray(start_balances, dtype=np.float64)
+    w_in = np.asarray(income_weights, dtype=np.float64)
+    w_out = np.asarray(expense_weights, dtype=np.float64)
+    checkpoints = list(checkpoints) if checkpoints is not None else [days - 1]
+    cp = np.asarray(checkpoints, dtype=np.int64)
+    bills = list(bills)
+
+    blocks = max(1, min(int(blocks), n_paths))
+    seeds = [seed] if blocks == 1 else np.random.SeedSequence(seed).spawn(blocks)
+    sizes = [n_paths // blocks + (i < n_paths % blocks) for i in range(blocks)]
+    parts = list(map_fn(_simulate_block, [
+        (start_balances, w_in, w_out, mu_in, sd_in, mu_out, sd_out, bills, start, days, n, s, cp)
+        for n, s in zip(sizes, seeds)
+    ]))
+    total_cp = np.concatenate([p["total_cp"] for p in parts])
+    buckets = np.concatenate([p["buckets_cp"] for p in parts])
+    misses = np.sum([p["misses"] for p in parts], axis=0) if parts[0]["misses"] else []
+    critical = [(day, amount, bid) for day, amount, crit, bid in bills if crit]
+    return {
+        "days": days,
+        "paths": n_paths,
+        "checkpoints": checkpoints,
+        "total_pct": {p: np.percentile(total_cp, p, axis=0) for p in PERCENTILES},
+        "bucket_pct": {p: np.percentile(buckets, p, axis=0) for p in PERCENTILES},  # (C, K)
+        "p_negative": np.mean(total_cp < 0, axis=0),
+        "p_negative_any": sum(p["negative_any"] for p in parts) / n_paths,
+        "bill_risks": [{"bill_id": bid, "day": day, "amount": amount, "p_miss": float(m) / n_paths}
+                       for (day, amount, bid), m in zip(critical, misses)],
+    }
+
+def month_end_checkpoints(start: date, days: int) -> List[int]:
+    m_idx, _ = _month_index(start, days)
+    ends = list(np.flatnonzero(np.diff(m_idx))) + [days - 1]
+    return [int(x) for x in ends]
+
+def _add_months(d: date, n: int) -> date:
+    # 1º dia do mês `n` meses depois (ou antes) de `d`
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+def monthly_history(rows: Sequence[Tuple[str, float, float]], today: date) -> List[Tuple[str, float, float]]:
+    # Meses fechados do primeiro com movimentação até o anterior a `today`; mês sem movimentação = 0
+    if not rows:
+        return []
+    by_month = {m: (inc, out) for m, inc, out in rows}
+    first = date.fromisoformat(rows[0][0] + "-01")
+    out = []
+    d = first
+    while d < today.replace(day=1):
+        key = d.strftime("%Y-%m")
+        out.append((key, *by_month.get(key, (0.0, 0.0))))
+        d = _add_months(d, 1)
+    return out
+
+def project_user(db: Session, user_id: int, months: int = 6, n_paths: int = DEFAULT_PATHS,
+                 seed: int = 0, today: Optional[date] = None, map_fn: Callable = map, blocks: int = 1) -> Dict:
+    today = today or date.today()
+    end = _add_months(today, months) - timedelta(days=1)
+    days = (end - today).days + 1
+
+    since = _add_months(today, -HISTORY_MONTHS)
+    history = monthly_history(queries.monthly_cash_flow(db, user_id, since), today)
+    prof = queries.get_profile(db, user_id)
+    mu_in, sd_in, mu_out, sd_out = estimate_flows(history, prof.monthly_income, prof.monthly_expense)
+
+    upcoming = queries.upcoming_bills(db, user_id, today, end)
+    # As contas já estão no horizonte: tira a média mensal delas das saídas estimadas (evita contar 2x)
+    mu_out = max(mu_out - sum(b.amount for b in upcoming) / months, 0.0)
+    # Vencidas em aberto são atraso acumulado (não fazem parte da média): saem no primeiro dia
+    bills_rows = [*queries.overdue_bills(db, user_id, today), *upcoming]
+    bills = [(max((b.due_date - today).days, 0), b.amount, bool(b.is_critical), b.id) for b in bills_rows]
+
+    buckets = queries.load_buckets(db, user_id)
+    w_in = np.asarray(normalize_percents(buckets), dtype=np.float64) / 100.0
+    share = queries.expense_share_by_bucket(db, user_id, since)
+    w_out = np.array([share.get(b.id, 0.0) for b in buckets], dtype=np.float64)
+    w_out = w_out / w_out.sum() if w_out.sum() > 0 else w_in
+
+    cps = month_end_checkpoints(today, days)
+    res = simulate_cash_flow([b.balance for b in buckets], w_in, w_out, mu_in, sd_in, mu_out, sd_out,
+                             bills, today, days, n_paths, seed, cps, map_fn=map_fn, blocks=blocks)
+    titles = {b.id: b for b in bills_rows}
+    for r in res["bill_risks"]:
+        r["title"] = titles[r["bill_id"]].title
+        r["due_date"] = titles[r["bill_id"]].due_date
+    res.update({
+        "start": today,
+        "checkpoint_dates": [today + timedelta(days=c) for c in cps],
+        "buckets": [(b.id, b.name) for b in buckets],
+        "flows": {"mu_in": mu_in, "sd_in": sd_in, "mu_out": mu_out, "sd_out": sd_out,
+                  "history_months": len(history)},
+    })
+    return res
@@ -0,0 +1,274 @@
+from datetime import date, timedelta
+from hashlib import md5
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, case, and_, or_
+from sqlalchemy.orm import Session
+
+from models import Bucket, Giant, Movement, Bill, UserProfile, GiantPayment, MovementMonthlyRollup as Rollup
+import recurring
+
+# Tipos que contam como saída nas métricas (mesma regra do Dashboard)
+OUT_KINDS = ("expense", "transfer")
+
+def month_bounds(today: date):
+    start = today.replace(day=1)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+# ============
+# Data loaders
+# ============
+def load_buckets(db: Session, user_id: int):
+    return db.execute(select(Bucket).where(Bucket.user_id == user_id)).scalars().all()
+
+def load_giants(db: Session, user_id: int):
+    return db.execute(select(Giant).where(Giant.user_id == user_id)).scalars().all()
+
+def load_movements(db: Session, user_id: int):
+    return db.execute(
+        select(Movement).where(Movement.user_id == user_id).order_by(Movement.date.desc())
+    ).scalars().all()
+
+def load_bills(db: Session, user_id: int):
+    return db.execute(
+        select(Bill).where(Bill.user_id == user_id).order_by(Bill.due_date.asc())
+    ).scalars().all()
+
+def get_profile(db: Session, user_id: int) -> UserProfile:
+    prof = db.execute(select(UserProfile).where(UserProfile.user_id == user_id)).scalar_one_or_none()
+    if not prof:
+        prof = UserProfile(user_id=user_id, monthly_income=0.0, monthly_expense=0.0)
+        db.add(prof); db.commit(); db.refresh(prof)
+    return prof
+
+# Alertas: uma consulta no índice (user_id, paid, due_date), só contas em aberto até hoje + janela
+def check_due_alerts(db: Session, user_id: int, days: int = 3, today: Optional[date] = None):
+    today = today or date.today()
+    bills = db.execute(
+        select(Bill).where(
+            Bill.user_id == user_id, Bill.paid == False,  # noqa: E712
+            Bill.due_date <= today + timedelta(days=days),
+        ).order_by(Bill.due_date.asc(), Bill.id.asc())
+    ).scalars().all()
+    # Ocorrências de contas recorrentes: geradas só para a janela do alerta
+    bills = sorted([*bills, *recurring.open_occurrences(db, user_id, today, today + timedelta(days=days))],
+                   key=_due_order)
+    overdue = [b for b in bills if b.due_date < today]
+    due_soon = [b for b in bills if b.due_date >= today]
+    return overdue, due_soon
+
+def _due_order(b):
+    # Mesmo dia: contas avulsas (id inteiro) antes das ocorrências recorrentes (id "r<id>:<data>")
+    return (b.due_date, 1, 0, b.id) if isinstance(b.id, str) else (b.due_date, 0, b.id, "")
+
+def alerts_hash(overdue, due_soon) -> str:
+    key_str = "|".join([f"o:{b.id}:{b.due_date}" for b in overdue] + [f"s:{b.id}:{b.due_date}" for b in due_soon])
+    return md5(key_str.encode()).hexdigest()
+
+# =====================
+# Agregados do Dashboard
+# =====================
+def movement_totals(db: Session, user_id: int, today: Optional[date] = None) -> Dict[str, float]:
+    # Lido do rollup mensal (poucas linhas por usuário): total e mês corrente juntos
+    ym = (today or date.today()).strftime("%Y-%m")
+    rows = db.execute(
+        select(
+            Rollup.kind,
+            func.coalesce(func.sum(Rollup.total), 0.0),
+            func.coalesce(func.sum(case((Rollup.year_month == ym, Rollup.total), else_=0.0)), 0.0),
+        ).where(Rollup.user_id == user_id).group_by(Rollup.kind)
+    ).all()
+    out = {"total_income": 0.0, "total_expense": 0.0, "month_income": 0.0, "month_expense": 0.0}
+    for kind, total, month in rows:
+        if kind == "income":
+            out["total_income"] += total
+            out["month_income"] += month
+        elif kind in OUT_KINDS:
+            out["total_expense"] += total
+            out["month_expense"] += month
+    return out
+
+def bucket_giant_counts(db: Session, user_id: int) -> Dict[str, float]:
+    # Saldo dos baldes e contagem de gigantes em subconsultas escalares (1 ida ao banco)
+    total_balance = (
+        select(func.coalesce(func.sum(Bucket.balance), 0.0))
+        .where(Bucket.user_id == user_id).scalar_subquery()
+    )
+    active = (
+        select(func.count(Giant.id))
+        .where(Giant.user_id == user_id, Giant.status == "active").scalar_subquery()
+    )
+    defeated = (
+        select(func.count(Giant.id))
+        .where(Giant.user_id == user_id, Giant.status == "defeated").scalar_subquery()
+    )
+    total_balance, active, defeated = db.execute(select(total_balance, active, defeated)).one()
+    return {"total_balance": total_balance, "giants_active": active, "giants_defeated": defeated}
+
+def dashboard_summary(db: Session, user_id: int, today: Optional[date] = None) -> Dict[str, float]:
+    out = movement_totals(db, user_id, today)
+    out.update(bucket_giant_counts(db, user_id))
+    return out
+
+# =========================
+# Aportes dos gigantes (lote)
+# =========================
+def giant_totals(db: Session, user_id: int) -> Dict[int, float]:
+    # total_paid de todos os gigantes do usuário em um único GROUP BY
+    rows = db.execute(
+        select(GiantPayment.giant_id, func.coalesce(func.sum(GiantPayment.amount), 0.0))
+        .where(GiantPayment.user_id == user_id)
+        .group_by(GiantPayment.giant_id)
+    ).all()
+    return {gid: total for gid, total in rows}
+
+def payoff_inputs(db: Session, user_id: Optional[int] = None):
+    # Gigantes ativos, total pago por gigante e margem mensal (receita - despesa) de um usuário ou de todos
+    giants = select(Giant).where(Giant.status == "active")
+    payments = select(GiantPayment.giant_id, func.coalesce(func.sum(GiantPayment.amount), 0.0))
+    profiles = select(UserProfile.user_id, UserProfile.monthly_income, UserProfile.monthly_expense)
+    if user_id is not None:
+        giants = giants.where(Giant.user_id == user_id)
+        payments = payments.where(GiantPayment.user_id == user_id)
+        profiles = profiles.where(UserProfile.user_id == user_id)
+    paid = {gid: total for gid, total in db.execute(payments.group_by(GiantPayment.giant_id)).all()}
+    budgets = {uid: max((inc or 0.0) - (exp or 0.0), 0.0) for uid, inc, exp in db.execute(profiles).all()}
+    return db.execute(giants).scalars().all(), paid, budgets
+
+def recent_giant_payments(db: Session, user_id: int, limit: int = 5,
+                          giant_ids: Optional[List[int]] = None) -> Dict[int, list]:
+    # Últimos N aportes por gigante: ROW_NUMBER() OVER (PARTITION BY giant_id ...)
+    rn = func.row_number().over(
+        partition_by=GiantPayment.giant_id,
+        order_by=(GiantPayment.date.desc(), GiantPayment.id.desc()),
+    ).label("rn")
+    inner = select(
+        GiantPayment.id, GiantPayment.giant_id, GiantPayment.amount,
+        GiantPayment.date, GiantPayment.note, rn,
+    ).where(GiantPayment.user_id == user_id)
+    if giant_ids is not None:
+        inner = inner.where(GiantPayment.giant_id.in_(giant_ids))
+    ranked = inner.subquery()
+    rows = db.execute(
+        select(ranked.c.id, ranked.c.giant_id, ranked.c.amount, ranked.c.date, ranked.c.note)
+        .where(ranked.c.rn <= limit)
+        .order_by(ranked.c.giant_id, ranked.c.rn)
+    ).all()
+    out: Dict[int, list] = {}
+    for r in rows:
+        out.setdefault(r.giant_id, []).append(r)
+    return out
+
+# ======================================
+# Livro Caixa paginado (keyset date/id)
+# ======================================
+def ledger_filters(user_id: int, bucket_id: Optional[int] = None, kind: Optional[str] = None,
+                    date_from: Optional[date] = None, date_to: Optional[date] = None) -> list:
+    conds = [Movement.user_id == user_id]
+    if bucket_id is not None:
+        conds.append(Movement.bucket_id == bucket_id)
+    if kind:
+        conds.append(Movement.kind == kind)
+    if date_from is not None:
+        conds.append(Movement.date >= date_from)
+    if date_to is not None:
+        conds.append(Movement.date <= date_to)
+    return conds
+
+def ledger_page(db: Session, user_id: int, after: Optional[Tuple[date, int]] = None, limit: int = 50,
+                bucket_id: Optional[int] = None, kind: Optional[str] = None,
+                date_from: Optional[date] = None, date_to: Optional[date] = None):
+    # `after` = (date, id) da última linha da página anterior; ordem (date DESC, id DESC)
+    conds = ledger_filters(user_id, bucket_id, kind, date_from, date_to)
+    if after is not None:
+        d, mid = after
+        conds.append(or_(Movement.date < d, and_(Movement.date == d, Movement.id < mid)))
+    rows = db.execute(
+        select(Movement).where(*conds)
+        .order_by(Movement.date.desc(), Movement.id.desc())
+        .limit(limit + 1)
+    ).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (rows[-1].date, rows[-1].id) if (has_more and rows) else None
+    return rows, next_cursor
+
+def ledger_count(db: Session, user_id: int, bucket_id: Optional[int] = None, kind: Optional[str] = None,
+                 date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+    conds = ledger_filters(user_id, bucket_id, kind, date_from, date_to)
+    return db.execute(select(func.count()).select_from(Movement).where(*conds)).scalar_one()
+
+# ==========================================
+# Histórico mensal (insumo das projeções)
+# ==========================================
+def monthly_flow_history(db: Session, user_id: int, since: date) -> List[Tuple[str, float, float]]:
+    # [(AAAA-MM, entradas, saídas)] a partir do mês de `since`, lido do rollup mensal
+    rows = db.execute(
+        select(
+            Rollup.year_month,
+            func.coalesce(func.sum(case((Rollup.kind == "income", Rollup.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((Rollup.kind.in_(OUT_KINDS), Rollup.total), else_=0.0)), 0.0),
+        ).where(Rollup.user_id == user_id, Rollup.year_month >= since.strftime("%Y-%m"))
+        .group_by(Rollup.year_month).order_by(Rollup.year_month)
+    ).all()
+    return [(m, inc, out) for m, inc, out in rows]
+
+def monthly_cash_flow(db: Session, user_id: int, since: date) -> List[Tuple[str, float, float]]:
+    # Como monthly_flow_history, sem transferências entre baldes: a perna de saída (transfer)
+    # e a de entrada (income, mesmo dia) se anulam no caixa do usuário
+    rows = db.execute(
+        select(
+            Rollup.year_month,
+            func.coalesce(func.sum(case((Rollup.kind == "income", Rollup.total),
+                                        (Rollup.kind == "transfer", -Rollup.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((Rollup.kind == "expense", Rollup.total), else_=0.0)), 0.0),
+        ).where(Rollup.user_id == user_id, Rollup.year_month >= since.strftime("%Y-%m"))
+        .group_by(Rollup.year_month).order_by(Rollup.year_month)
+    ).all()
+    return [(m, inc, out) for m, inc, out in rows]
+
+def yearly_flow_history(db: Session, user_id: int) -> List[Tuple[str, float, float]]:
+    # [(AAAA, entradas, saídas)] de todo o histórico, somando os meses do rollup
+    year = func.substr(Rollup.year_month, 1, 4)
+    rows = db.execute(
+        select(
+            year,
+            func.coalesce(func.sum(case((Rollup.kind == "income", Rollup.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((Rollup.kind.in_(OUT_KINDS), Rollup.total), else_=0.0)), 0.0),
+        ).where(Rollup.user_id == user_id).group_by(year).order_by(year)
+    ).all()
+    return [(y, inc, out) for y, inc, out in rows]
+
+def expense_share_by_bucket(db: Session, user_id: int, since: date) -> Dict[int, float]:
+    # Soma de despesas por balde desde o mês de `since` (p/ ratear despesas projetadas; sem transferências)
+    rows = db.execute(
+        select(Rollup.bucket_id, func.sum(Rollup.total))
+        .where(Rollup.user_id == user_id, Rollup.kind == "expense",
+               Rollup.year_month >= since.strftime("%Y-%m"), Rollup.bucket_id != 0)
+        .group_by(Rollup.bucket_id)
+    ).all()
+    return {bid: total for bid, total in rows}
+
+def upcoming_bills(db: Session, user_id: int, start: date, end: date):
+    bills = db.execute(
+        select(Bill).where(
+            Bill.user_id == user_id, Bill.paid == False,  # noqa: E712
+            Bill.due_date >= start, Bill.due_date <= end,
+        ).order_by(Bill.due_date.asc(), Bill.id.asc())
+    ).scalars().all()
+    return sorted([*bills, *recurring.occurrences(db, user_id, start, end, unpaid_only=True)], key=_due_order)
+
+def overdue_bills(db: Session, user_id: int, today: date):
+    # Em aberto com vencimento antes de hoje (avulsas e ocorrências recorrentes)
+    bills = db.execute(
+        select(Bill).where(
+            Bill.user_id == user_id, Bill.paid == False,  # noqa: E712
+            Bill.due_date < today,
+        ).order_by(Bill.due_date.asc(), Bill.id.asc())
+    ).scalars().all()
+    return sorted([*bills, *recurring.open_occurrences(db, user_id, today, today - timedelta(days=1))],
+                  key=_due_order)
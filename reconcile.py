@@ -0,0 +1,145 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.engine import Connection
+
+# ==================================================
+# Conferência incremental de saldos (bucket_checkpoints)
+# ==================================================
+# Bucket.balance é um contador desnormalizado: cada serviço soma/subtrai na mão,
+# e nada garantia que ele batesse com o livro caixa. Refazer a soma de todas as
+# movimentações a cada escrita seria caro, então cada balde guarda uma marca:
+# até qual movimentação (id) já foi conferido, o saldo esperado nesse ponto e a
+# soma líquida do livro caixa do balde. Conferir = somar só as movimentações
+# com id acima da marca (um escritor por vez e AUTOINCREMENT: ids crescem na
+# ordem dos commits e nunca são reaproveitados), esperado = saldo da marca +
+# novas, e comparar com o saldo gravado.
+# O rollup mensal (rollup.py, mantido por triggers) dá a soma do livro caixa
+# inteiro do balde em poucas linhas: se ela não bate com marca + novas, alguém
+# alterou movimentações antigas (abaixo da marca) por fora dos serviços; isso
+# aparece no relatório (history_diff), mas não muda o esperado.
+# Na primeira conferência de um balde o saldo atual vira a base (saldo inicial
+# do seed/legado não tem movimentação). Roda dentro da transação dos lotes
+# (services.run_batch, importação) e como tarefa periódica; na linha de comando,
+# `python reconcile.py check|repair|accept [--user N]`.
+
+TOLERANCE = 0.005  # diferença aceita em R$ (somas em float)
+EVERY_MINUTES = float(os.getenv("DAVI_RECONCILE_EVERY_MINUTES", "60"))  # tarefa periódica; 0 = desligada
+
+_NET = "CASE WHEN {p}kind = 'income' THEN {p}{col} ELSE -{p}{col} END"  # transfer = saída do balde
+
+_UPSERT = """
+    INSERT INTO bucket_checkpoints (bucket_id, user_id, last_movement_id, balance, net, drift, checked_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (bucket_id) DO UPDATE SET
+        user_id = excluded.user_id, last_movement_id = excluded.last_movement_id, balance = excluded.balance,
+        net = excluded.net, drift = excluded.drift, checked_at = excluded.checked_at
+"""
+
+def _where(user_id: Optional[int], col: str = "user_id"):
+    return (f"WHERE {col} = ?", (user_id,)) if user_id is not None else ("", ())
+
+def _changed(a: float, b: float) -> bool:
+    return abs((a or 0.0) - (b or 0.0)) > 1e-9
+
+def run(con: Connection, user_id: Optional[int] = None, repair: bool = False, accept: bool = False) -> Dict:
+    # Confere os baldes (de um usuário ou de todos) na transação de `con`.
+    # repair: saldo gravado passa a ser o esperado; accept: o esperado passa a ser o saldo gravado.
+    # Só grava marcas que mudaram: sem movimentação nova, conferir não escreve nada.
+    where, params = _where(user_id, "b.user_id")
+    rows = con.exec_driver_sql(f"""
+        SELECT b.id, b.user_id, b.name, b.balance, c.last_movement_id, c.balance, c.net, c.drift
+        FROM buckets b LEFT JOIN bucket_checkpoints c ON c.bucket_id = b.id {where} ORDER BY b.id
+    """, params).all()
+    out = {"checked": len(rows), "adopted": 0, "folded": 0, "repaired": 0, "accepted": 0, "issues": []}
+    if not rows:
+        return out
+    hi = con.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM movements").scalar()
+
+    # Movimentações novas de cada balde: só a faixa de ids acima da menor marca
+    marks = [r[4] for r in rows if r[4] is not None]
+    folded = {}
+    if marks and min(marks) < hi:
+        # "+m.user_id": o filtro de usuário não pode usar índice, senão o SQLite troca a faixa
+        # de ids (só as novas) por todas as movimentações do usuário
+        user_filter = " AND +m.user_id = ?" if user_id is not None else ""
+        folded = {bid: (total, n) for bid, total, n in con.exec_driver_sql(f"""
+            SELECT m.bucket_id, SUM({_NET.format(p='m.', col='amount')}), COUNT(*)
+            FROM movements m JOIN bucket_checkpoints c ON c.bucket_id = m.bucket_id
+            WHERE m.id > ? AND m.id <= ? AND m.id > c.last_movement_id{user_filter}
+            GROUP BY m.bucket_id
+        """, (min(marks), hi, *params)).all()}
+    # Livro caixa inteiro de cada balde, pelo rollup (dezenas de linhas por balde)
+    rwhere, rparams = _where(user_id)
+    ledger = dict(con.exec_driver_sql(f"""
+        SELECT bucket_id, SUM({_NET.format(p='', col='total')}) FROM movement_monthly_rollup {rwhere}
+        GROUP BY bucket_id
+    """, rparams).all())
+
+    now = datetime.now().isoformat(sep=" ")
+    writes, fixes = [], []
+    for bid, uid, name, actual, last, cp_balance, cp_net, cp_drift in rows:
+        actual, net = actual or 0.0, ledger.get(bid, 0.0)
+        if last is None:
+            out["adopted"] += 1
+            writes.append((bid, uid, hi, actual, net, 0.0, now))
+            continue
+        new_total, new_count = folded.get(bid, (0.0, 0))
+        out["folded"] += new_count
+        expected = cp_balance + new_total
+        history = net - (cp_net + new_total)  # movimentações antigas alteradas/apagadas
+        drift = actual - expected
+        drift = round(drift, 2) if abs(drift) > TOLERANCE else 0.0
+        if drift or abs(history) > TOLERANCE:
+            out["issues"].append({"bucket_id": bid, "user_id": uid, "name": name, "balance": round(actual, 2),
+                                  "expected": round(expected, 2), "drift": drift, "history_diff": round(history, 2) or 0.0})
+        if drift and repair:
+            fixes.append((drift, bid))
+            out["repaired"] += 1
+            drift = 0.0
+        elif drift and accept:
+            expected = actual
+            out["accepted"] += 1
+            drift = 0.0
+        mark = max(last, hi)  # apagar as movimentações mais novas não faz a marca voltar
+        if mark != last or _changed(expected, cp_balance) or _changed(net, cp_net) or _changed(drift, cp_drift):
+            writes.append((bid, uid, mark, expected, net, drift, now))
+    if fixes:
+        # Atômico como em services._apply_delta: corrige pela diferença, sem regravar o saldo lido
+        con.exec_driver_sql("UPDATE buckets SET balance = balance - ? WHERE id = ?", fixes)
+    if writes:
+        con.exec_driver_sql(_UPSERT, writes)
+    return out
+
+def issues(con: Connection, user_id: Optional[int] = None) -> List[Dict]:
+    # Divergências da última conferência (só leitura; para telas)
+    where, params = _where(user_id, "c.user_id")
+    rows = con.exec_driver_sql(f"""
+        SELECT c.bucket_id, c.user_id, b.name, b.balance, c.drift, c.checked_at
+        FROM bucket_checkpoints c JOIN buckets b ON b.id = c.bucket_id
+        {where or 'WHERE 1'} AND c.drift != 0 ORDER BY c.bucket_id
+    """, params).all()
+    return [{"bucket_id": bid, "user_id": uid, "name": name, "balance": round(balance, 2), "drift": drift,
+             "checked_at": checked} for bid, uid, name, balance, drift, checked in rows]
+
+if __name__ == "__main__":
+    import argparse
+    from db import engine
+    from migrations import ensure_schema
+    ap = argparse.ArgumentParser(description="Conferência de saldos dos baldes")
+    ap.add_argument("cmd", choices=["check", "repair", "accept"])
+    ap.add_argument("--user", type=int, default=None)
+    args = ap.parse_args()
+    ensure_schema(engine)
+    with engine.begin() as con:
+        con.exec_driver_sql("BEGIN IMMEDIATE")
+        res = run(con, args.user, repair=args.cmd == "repair", accept=args.cmd == "accept")
+    print(f"{res['checked']} baldes conferidos ({res['adopted']} novos, {res['folded']} movimentações novas).")
+    for i in res["issues"]:
+        print(f"  balde {i['bucket_id']} ({i['name']}): saldo {i['balance']:.2f}, esperado {i['expected']:.2f}, "
+              f"diferença {i['drift']:+.2f}" + (f", livro caixa alterado em {i['history_diff']:+.2f}"
+                                                if i["history_diff"] else ""))
+    if res["repaired"] or res["accepted"]:
+        print(f"Corrigidos: {res['repaired']}; aceitos: {res['accepted']}.")
+    raise SystemExit(1 if res["issues"] and args.cmd == "check" else 0)
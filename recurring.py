@@ -0,0 +1,197 @@
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrulestr
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from models import RecurringBill, BillOccurrence
+
+# ====================================================
+# Contas recorrentes (RRULE) com ocorrências sob demanda
+# ====================================================
+# No banco fica só a regra (python-dateutil rrule) e as exceções: ocorrências
+# pagas ou editadas (bill_occurrences). As demais são geradas na hora, apenas
+# para a janela consultada (calendário, alertas, projeção). O DTSTART é
+# adiantado um número inteiro de períodos até a janela antes de expandir, então
+# uma conta de 10 anos custa o mesmo que uma de 1. `settled_through` marca até
+# onde tudo está pago: os alertas procuram atrasadas só depois dela e no máximo
+# LOOKBACK_DAYS para trás.
+
+LOOKBACK_DAYS = int(os.getenv("DAVI_RECURRING_LOOKBACK_DAYS", "366"))
+FREQS = {"MONTHLY": "Mensal", "WEEKLY": "Semanal", "YEARLY": "Anual"}
+_UNITS = {"MONTHLY": "meses", "WEEKLY": "semanas", "YEARLY": "anos"}
+_WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+_WEEKDAYS_BR = ("segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo")
+_ID = re.compile(r"r(\d+):(\d{4}-\d{2}-\d{2})")
+
+@dataclass(frozen=True)
+class Occurrence:
+    id: str                 # "r<id da recorrente>:<AAAA-MM-DD da regra>"
+    user_id: int
+    recurring_id: int
+    occurrence_date: date
+    title: str
+    amount: float
+    due_date: date          # vencimento efetivo (remarcável)
+    is_critical: bool
+    paid: bool
+
+def occurrence_id(recurring_id: int, occurrence_date: date) -> str:
+    return f"r{int(recurring_id)}:{occurrence_date.isoformat()}"
+
+def parse_occurrence_id(oid) -> Optional[Tuple[int, date]]:
+    m = _ID.fullmatch(oid) if isinstance(oid, str) else None
+    if not m:
+        return None
+    try:
+        return int(m.group(1)), date.fromisoformat(m.group(2))
+    except ValueError:
+        return None
+
+def is_occurrence_id(oid) -> bool:
+    return parse_occurrence_id(oid) is not None
+
+# ---------
+# Regras
+# ---------
+def make_rule(freq: str, first_due: date, interval: int = 1) -> str:
+    # BY* sempre explícitos: a regra não depende do DTSTART (que é adiantado na expansão)
+    if freq not in FREQS:
+        raise ValueError(f"Frequência inválida: {freq}")
+    parts = [f"FREQ={freq}", f"INTERVAL={max(int(interval), 1)}"]
+    if freq == "WEEKLY":
+        parts.append(f"BYDAY={_WEEKDAYS[first_due.weekday()]}")
+    else:
+        if freq == "YEARLY":
+            parts.append(f"BYMONTH={first_due.month}")
+        if first_due.day > 28:
+            # Dia 29–31: cai no último dia disponível nos meses mais curtos
+            parts.append("BYMONTHDAY=" + ",".join(str(d) for d in range(28, first_due.day + 1)))
+            parts.append("BYSETPOS=-1")
+        else:
+            parts.append(f"BYMONTHDAY={first_due.day}")
+    return ";".join(parts)
+
+def _parts(rule: str) -> Dict[str, str]:
+    return dict(p.split("=", 1) for p in rule.upper().split(";") if "=" in p)
+
+def describe(rule: str, start_date: date) -> str:
+    p = _parts(rule)
+    freq, every = p.get("FREQ", ""), int(p.get("INTERVAL", "1"))
+    base = FREQS.get(freq, freq.title()) if every == 1 else f"A cada {every} {_UNITS.get(freq, '')}"
+    if freq == "WEEKLY":
+        return f"{base}, {_WEEKDAYS_BR[start_date.weekday()]}"
+    day = "último dia" if "BYSETPOS" in p else f"dia {start_date.day}"
+    return f"{base}, {day}" + (f"/{start_date.month:02d}" if freq == "YEARLY" else "")
+
+def _anchor(start: date, freq: str, interval: int, target: date) -> date:
+    # Início do último período da série (múltiplo de `interval`) que começa até `target`
+    if target <= start:
+        return start
+    if freq == "YEARLY":
+        n = target.year - start.year
+    elif freq == "MONTHLY":
+        n = (target.year - start.year) * 12 + target.month - start.month
+    elif freq == "WEEKLY":
+        n = (target - (start - timedelta(days=start.weekday()))).days // 7
+    else:  # DAILY e outras: sem atalho seguro
+        return start
+    n -= n % interval
+    if n <= 0:
+        return start
+    if freq == "YEARLY":
+        return date(start.year + n, 1, 1)
+    if freq == "MONTHLY":
+        return start.replace(day=1) + relativedelta(months=n)
+    return start - timedelta(days=start.weekday()) + timedelta(weeks=n)
+
+def expand(rule: str, start_date: date, end_date: Optional[date], lo: date, hi: date) -> List[date]:
+    # Datas da regra em [lo, hi]; custo proporcional à janela, não ao tamanho da série
+    lo, hi = max(lo, start_date), min(hi, end_date) if end_date else hi
+    if lo > hi:
+        return []
+    p = _parts(rule)
+    anchor = _anchor(start_date, p.get("FREQ", ""), int(p.get("INTERVAL", "1")), lo)
+    rr = rrulestr(rule, dtstart=datetime.combine(anchor, time()))
+    return [d.date() for d in rr.between(datetime.combine(lo, time()), datetime.combine(hi, time()), inc=True)]
+
+def is_occurrence(rec: RecurringBill, day: date) -> bool:
+    return expand(rec.rule, rec.start_date, rec.end_date, day, day) == [day]
+
+def is_settled(rec: RecurringBill, day: date) -> bool:
+    return rec.settled_through is not None and day <= rec.settled_through
+
+# ------------------------
+# Ocorrências de uma janela
+# ------------------------
+def generated(rec: RecurringBill, day: date) -> Occurrence:
+    return Occurrence(occurrence_id(rec.id, day), rec.user_id, rec.id, day, rec.title, rec.amount, day,
+                      bool(rec.is_critical), is_settled(rec, day))
+
+def from_override(o: BillOccurrence) -> Occurrence:
+    return Occurrence(occurrence_id(o.recurring_id, o.occurrence_date), o.user_id, o.recurring_id,
+                      o.occurrence_date, o.title, o.amount, o.due_date, bool(o.is_critical), bool(o.paid))
+
+def load_recurring(db: Session, user_id: int):
+    return db.execute(
+        select(RecurringBill).where(RecurringBill.user_id == user_id).order_by(RecurringBill.id.asc())
+    ).scalars().all()
+
+def occurrences(db: Session, user_id: int, lo: date, hi: date, unpaid_only: bool = False) -> List[Occurrence]:
+    recs = load_recurring(db, user_id)
+    if not recs:
+        return []
+    found: Dict[Tuple[int, date], Occurrence] = {}
+    first = hi
+    for r in recs:
+        start = lo
+        if unpaid_only and r.settled_through is not None:
+            start = max(lo, r.settled_through + timedelta(days=1))
+        first = min(first, start)
+        for d in expand(r.rule, r.start_date, r.end_date, start, hi):
+            found[(r.id, d)] = generated(r, d)
+    # Exceções da janela: pela data da regra ou pelo vencimento remarcado para dentro dela.
+    # Só não pagas: as pagas antes da marca de cada série não mudam nada (não foram geradas)
+    in_window = or_(BillOccurrence.occurrence_date.between(lo, hi), BillOccurrence.due_date.between(lo, hi))
+    if unpaid_only:
+        in_window = or_(and_(BillOccurrence.paid == False, in_window),  # noqa: E712
+                        BillOccurrence.occurrence_date.between(first, hi))
+    overrides = db.execute(
+        select(BillOccurrence).where(BillOccurrence.user_id == user_id, in_window)
+    ).scalars()
+    for o in overrides:
+        found[(o.recurring_id, o.occurrence_date)] = from_override(o)
+    out = [o for o in found.values() if lo <= o.due_date <= hi and not (unpaid_only and o.paid)]
+    return sorted(out, key=lambda o: (o.due_date, o.recurring_id, o.occurrence_date))
+
+def open_occurrences(db: Session, user_id: int, today: date, until: date) -> List[Occurrence]:
+    # Não pagas vencidas (até LOOKBACK_DAYS atrás) ou vencendo até `until`
+    return occurrences(db, user_id, today - timedelta(days=LOOKBACK_DAYS), until, unpaid_only=True)
+
+# -------------------------
+# Marca "pago até" (escrita)
+# -------------------------
+def settle(db: Session, rec: RecurringBill, today: date) -> Optional[date]:
+    # Avança a marca enquanto as ocorrências seguintes (até hoje) estiverem pagas.
+    # Nunca recua: uma ocorrência desmarcada abaixo dela vira exceção não paga,
+    # que a consulta da janela já enxerga.
+    mark = rec.settled_through
+    lo = mark + timedelta(days=1) if mark is not None else rec.start_date
+    if lo <= today:
+        paid = set(db.execute(
+            select(BillOccurrence.occurrence_date).where(
+                BillOccurrence.recurring_id == rec.id, BillOccurrence.paid == True,  # noqa: E712
+                BillOccurrence.occurrence_date.between(lo, today),
+            )
+        ).scalars())
+        for d in expand(rec.rule, rec.start_date, rec.end_date, lo, today):
+            if d not in paid:
+                break
+            mark = d
+    rec.settled_through = mark
+    return mark
@@ -0,0 +1,98 @@
+import argparse
+from typing import Dict, List, Optional
+
+from sqlalchemy.engine import Connection
+
+# ===================================================
+# Rollup mensal do livro caixa (movement_monthly_rollup)
+# ===================================================
+# Uma linha por (usuário, balde, AAAA-MM, tipo) com soma e contagem. Triggers
+# do SQLite atualizam o rollup na mesma transação de qualquer INSERT/UPDATE/
+# DELETE em movements — inclusive inserts em massa (seed, importação) e
+# cascatas de FK. Relatórios mensais/anuais leem dezenas de linhas daqui em
+# vez do histórico inteiro. `python rollup.py check|rebuild` para conferir.
+
+TOLERANCE = 0.005  # diferença aceita em R$ (somas em float)
+
+_ADD = """
+    INSERT INTO movement_monthly_rollup (user_id, bucket_id, year_month, kind, total, count)
+    VALUES (NEW.user_id, COALESCE(NEW.bucket_id, 0), strftime('%Y-%m', NEW.date), NEW.kind, NEW.amount, 1)
+    ON CONFLICT (user_id, bucket_id, year_month, kind)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+"""
+_SUB = """
+    UPDATE movement_monthly_rollup SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id AND bucket_id = COALESCE(OLD.bucket_id, 0)
+      AND year_month = strftime('%Y-%m', OLD.date) AND kind = OLD.kind;
+    DELETE FROM movement_monthly_rollup
+    WHERE user_id = OLD.user_id AND bucket_id = COALESCE(OLD.bucket_id, 0)
+      AND year_month = strftime('%Y-%m', OLD.date) AND kind = OLD.kind AND count <= 0;
+"""
+TRIGGERS = {
+    "trg_movements_rollup_ins": f"AFTER INSERT ON movements BEGIN {_ADD} END",
+    "trg_movements_rollup_del": f"AFTER DELETE ON movements BEGIN {_SUB} END",
+    "trg_movements_rollup_upd": (
+        f"AFTER UPDATE OF user_id, bucket_id, kind, amount, date ON movements BEGIN {_SUB} {_ADD} END"
+    ),
+}
+
+_AGGREGATE = """
+    SELECT user_id, COALESCE(bucket_id, 0) AS bucket_id, strftime('%Y-%m', date) AS year_month, kind,
+           SUM(amount) AS total, COUNT(*) AS count
+    FROM movements {where}
+    GROUP BY user_id, COALESCE(bucket_id, 0), strftime('%Y-%m', date), kind
+"""
+
+def install_triggers(con: Connection):
+    for name, body in TRIGGERS.items():
+        con.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+def drop_triggers(con: Connection):
+    for name in TRIGGERS:
+        con.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+def _where(user_id: Optional[int]):
+    return ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+
+def rebuild(con: Connection, user_id: Optional[int] = None) -> int:
+    # Recalcula do zero a partir de movements (todos os usuários ou um só)
+    where, params = _where(user_id)
+    con.exec_driver_sql(f"DELETE FROM movement_monthly_rollup {where}", params)
+    con.exec_driver_sql(
+        "INSERT INTO movement_monthly_rollup (user_id, bucket_id, year_month, kind, total, count) "
+        + _AGGREGATE.format(where=where), params
+    )
+    return con.exec_driver_sql(f"SELECT COUNT(*) FROM movement_monthly_rollup {where}", params).scalar()
+
+def check(con: Connection, user_id: Optional[int] = None) -> List[Dict]:
+    # Rollup - agregado real por chave; devolve só as chaves divergentes
+    where, params = _where(user_id)
+    rows = con.exec_driver_sql(f"""
+        SELECT user_id, bucket_id, year_month, kind, SUM(total), SUM(count) FROM (
+            SELECT user_id, bucket_id, year_month, kind, total, count FROM movement_monthly_rollup {where}
+            UNION ALL
+            SELECT user_id, bucket_id, year_month, kind, -total, -count FROM ({_AGGREGATE.format(where=where)})
+        )
+        GROUP BY user_id, bucket_id, year_month, kind
+        HAVING ABS(SUM(total)) > {TOLERANCE} OR SUM(count) != 0
+    """, params + params).all()
+    return [{"user_id": u, "bucket_id": b, "year_month": ym, "kind": k,
+             "total_diff": round(t, 2), "count_diff": c} for u, b, ym, k, t, c in rows]
+
+if __name__ == "__main__":
+    from db import engine
+    from migrations import ensure_schema
+    ap = argparse.ArgumentParser(description="Rollup mensal do livro caixa")
+    ap.add_argument("cmd", choices=["check", "rebuild"])
+    ap.add_argument("--user", type=int, help="só este usuário")
+    args = ap.parse_args()
+    ensure_schema(engine)
+    with engine.begin() as con:
+        if args.cmd == "rebuild":
+            print(f"Rollup reconstruído: {rebuild(con, args.user)} linhas")
+        else:
+            diffs = check(con, args.user)
+            for d in diffs:
+                print(d)
+            print("Rollup consistente." if not diffs else f"{len(diffs)} chave(s) divergente(s).")
+            raise SystemExit(1 if diffs else 0)
@@ -0,0 +1,183 @@
+import os
+import re
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Movement, Bill
+
+# ================================================
+# Busca textual (SQLite FTS5) em movimentações e contas
+# ================================================
+# Índices FTS5 "external content" sobre movements.description e bills.title,
+# sincronizados por triggers na mesma transação das escritas (inclui inserts
+# em massa do seed/importação). Tokenizer unicode61 com remove_diacritics 2:
+# "farmacia" encontra "Farmácia". Cada termo digitado vira prefixo ("ifo" ->
+# iFood) e todos precisam aparecer; resultados por relevância (bm25) e data,
+# pontuando os MAX_CANDIDATES acertos mais recentes.
+# Sem FTS5 no SQLite, cai num LIKE simples (sem acento/ranking).
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+MAX_TERMS = 8
+MAX_CANDIDATES = int(os.getenv("DAVI_SEARCH_CANDIDATES", "1000"))
+
+_INDEXES = {
+    # tabela FTS: (tabela, coluna)
+    "movements_fts": ("movements", "description"),
+    "bills_fts": ("bills", "title"),
+}
+
+def fts5_available(con: Connection) -> bool:
+    try:
+        con.exec_driver_sql("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)")
+        con.exec_driver_sql("DROP TABLE IF EXISTS temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+def install(con: Connection) -> bool:
+    # Cria índices + triggers e indexa o que já existe; False se não houver FTS5
+    if not fts5_available(con):
+        return False
+    for fts, (table, col) in _INDEXES.items():
+        # user_id também é indexado: o MATCH já restringe ao dono (listas menores)
+        con.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{col}, user_id, content='{table}', content_rowid='id', tokenize='{TOKENIZER}', prefix='2 3')"
+        )
+        con.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_ins AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {col}, user_id) VALUES (NEW.id, NEW.{col}, NEW.user_id); END"
+        )
+        con.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_del AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {col}, user_id) VALUES ('delete', OLD.id, OLD.{col}, OLD.user_id); END"
+        )
+        con.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_upd AFTER UPDATE OF {col}, user_id ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {col}, user_id) VALUES ('delete', OLD.id, OLD.{col}, OLD.user_id); "
+            f"INSERT INTO {fts}(rowid, {col}, user_id) VALUES (NEW.id, NEW.{col}, NEW.user_id); END"
+        )
+        rebuild(con, fts)
+    return True
+
+def rebuild(con: Connection, fts: Optional[str] = None):
+    for name in ([fts] if fts else _INDEXES):
+        con.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+def installed(con) -> bool:
+    return con.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movements_fts'"
+    ).first() is not None
+
+@contextmanager
+def deferred(con: Connection):
+    # Cargas em massa (seed): sem os triggers por linha; reindexa tudo de uma vez no fim
+    if not installed(con):
+        yield con
+        return
+    for fts in _INDEXES:
+        for op in ("ins", "del", "upd"):
+            con.exec_driver_sql(f"DROP TRIGGER IF EXISTS trg_{fts}_{op}")
+    yield con
+    install(con)
+
+def check(con: Connection) -> List[str]:
+    # 'integrity-check' do FTS5 compara o índice com a tabela de conteúdo
+    bad = []
+    for name in _INDEXES:
+        try:
+            con.exec_driver_sql(f"INSERT INTO {name}({name}, rank) VALUES ('integrity-check', 1)")
+        except Exception:
+            bad.append(name)
+    return bad
+
+def _has_index(db: Session, fts: str) -> bool:
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": fts}
+    ).first() is not None
+
+# --------------------
+# Consulta do usuário
+# --------------------
+def terms(query: str) -> List[str]:
+    # Palavras (letras/dígitos, com acento); o resto vira separador
+    return re.findall(r"\w+", query or "")[:MAX_TERMS]
+
+def match_expr(query: str, column: str, user_id: int) -> Optional[str]:
+    # "ifood 2025" -> 'user_id : "7" AND description : ("ifood"* "2025"*)' (todos os termos, como prefixo)
+    words = terms(query)
+    if not words:
+        return None
+    return f'user_id : "{int(user_id)}" AND {column} : (' + " ".join(f'"{w}"*' for w in words) + ")"
+
+def like_escape(word: str) -> str:
+    # Curingas do LIKE viram literais (ESCAPE '\'): "_" aparece em \w; "%" e "\" por garantia
+    return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _iso(d: Optional[date]) -> Optional[str]:
+    return d.isoformat() if d is not None else None
+
+def _search_ids(db: Session, fts: str, table: str, col: str, date_col: str, user_id: int, query: str,
+                conds: Dict[str, object], limit: int) -> List[int]:
+    words = terms(query)
+    if not words:
+        return []
+    params = {"u": user_id, "lim": limit, "cand": MAX_CANDIDATES, **{k: v for k, v in conds.values()}}
+    where = "".join(f" AND t.{sql}" for sql, (_k, v) in conds.items() if v is not None)
+    if _has_index(db, fts):
+        # bm25 só para os MAX_CANDIDATES acertos mais recentes (já filtrados): o FTS
+        # percorre em rowid decrescente e para cedo, em vez de pontuar milhares de linhas
+        params["q"] = match_expr(query, col, user_id)
+        sql = (f"SELECT id FROM (SELECT t.id, t.{date_col} AS d, f.rank AS r FROM {fts} f "
+               f"JOIN {table} t ON t.id = f.rowid WHERE {fts} MATCH :q AND t.user_id = :u{where} "
+               f"ORDER BY f.rowid DESC LIMIT :cand) ORDER BY r, d DESC, id DESC LIMIT :lim")
+    else:
+        params.update({f"w{i}": f"%{like_escape(w)}%" for i, w in enumerate(words)})
+        likes = "".join(f" AND t.{col} LIKE :w{i} ESCAPE '\\'" for i in range(len(words)))
+        sql = (f"SELECT t.id FROM {table} t WHERE t.user_id = :u{likes}{where} "
+               f"ORDER BY t.{date_col} DESC, t.id DESC LIMIT :lim")
+    return [r[0] for r in db.execute(text(sql), params)]
+
+def search_movements(db: Session, user_id: int, query: str, bucket_id: Optional[int] = None,
+                     kind: Optional[str] = None, date_from: Optional[date] = None,
+                     date_to: Optional[date] = None, limit: int = 100) -> List[Movement]:
+    conds = {"bucket_id = :b": ("b", bucket_id), "kind = :k": ("k", kind),
+             "date >= :df": ("df", _iso(date_from)), "date <= :dt": ("dt", _iso(date_to))}
+    ids = _search_ids(db, "movements_fts", "movements", "description", "date", user_id, query, conds, limit)
+    return _load_in_order(db, Movement, ids)
+
+def search_bills(db: Session, user_id: int, query: str, paid: Optional[bool] = None,
+                 date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 limit: int = 100) -> List[Bill]:
+    conds = {"paid = :p": ("p", paid), "due_date >= :df": ("df", _iso(date_from)),
+             "due_date <= :dt": ("dt", _iso(date_to))}
+    ids = _search_ids(db, "bills_fts", "bills", "title", "due_date", user_id, query, conds, limit)
+    return _load_in_order(db, Bill, ids)
+
+def _load_in_order(db: Session, model, ids: List[int]):
+    if not ids:
+        return []
+    rows = {r.id: r for r in db.query(model).filter(model.id.in_(ids))}
+    return [rows[i] for i in ids if i in rows]
+
+if __name__ == "__main__":
+    import argparse
+    from db import engine
+    from migrations import ensure_schema
+    ap = argparse.ArgumentParser(description="Índice de busca (FTS5)")
+    ap.add_argument("cmd", choices=["check", "rebuild"])
+    args = ap.parse_args()
+    ensure_schema(engine)
+    with engine.begin() as con:
+        if args.cmd == "rebuild":
+            rebuild(con)
+            print("Índices de busca reconstruídos.")
+        else:
+            bad = check(con)
+            print("Índices de busca íntegros." if not bad else f"Índices corrompidos: {', '.join(bad)}")
+            raise SystemExit(1 if bad else 0)
@@ -0,0 +1,165 @@
+import argparse
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from models import User, Bucket, Giant, Movement, Bill, UserProfile, GiantPayment
+
+# ============================================
+# Gerador de dados sintéticos (benchmarks)
+# ============================================
+# Datas com distribuição "de verdade": salário nos dias 5 e 20, gastos mais
+# frequentes na sexta/sábado e mais densos nos meses recentes; contas mensais
+# (passadas quase todas pagas, algumas vencidas em aberto); aportes mensais
+# nos gigantes com alguns meses pulados. Mesma semente -> mesmo banco.
+
+DEFAULT_SIZES = {
+    "users": 5,
+    "buckets": 6,        # por usuário
+    "giants": 4,         # por usuário
+    "movements": 20_000, # por usuário
+    "bills": 8,          # títulos mensais por usuário
+    "payments": 24,      # aportes por gigante (no máximo 1 por mês)
+    "months": 24,        # histórico
+}
+CHUNK = 50_000
+
+BUCKET_NAMES = ["Essenciais", "Lazer", "Reserva", "Investimentos", "Educação", "Doações", "Casa", "Saúde"]
+EXPENSE_DESCS = ["Mercado", "iFood", "Uber", "Farmácia", "Padaria", "Posto", "Cinema", "Academia",
+                 "Conta de luz", "Internet", "Restaurante", "Pix enviado"]
+BILL_TITLES = ["Aluguel", "Condomínio", "Energia", "Água", "Internet", "Celular", "Escola", "Plano de saúde",
+               "Cartão", "Seguro", "Streaming", "Academia"]
+WEEKDAY_WEIGHTS = np.array([0.9, 0.9, 1.0, 1.0, 1.4, 1.6, 0.8])  # seg..dom
+
+def _day_weights(start: date, days: int) -> np.ndarray:
+    # Peso por dia: dia da semana x crescimento linear (meses recentes mais cheios)
+    wd = np.array([(start + timedelta(days=i)).weekday() for i in range(days)])
+    w = WEEKDAY_WEIGHTS[wd] * np.linspace(0.6, 1.4, days)
+    return w / w.sum()
+
+def _add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+def _insert(con, table, rows: List[Dict]):
+    for i in range(0, len(rows), CHUNK):
+        con.execute(table.insert(), rows[i:i + CHUNK])
+
+def seed_user(con, rng: np.random.Generator, user_id: int, sizes: Dict, today: date):
+    months, n_mov = sizes["months"], sizes["movements"]
+    start = _add_months(today, -months)
+    days = (today - start).days + 1
+    income = float(np.round(rng.uniform(3000, 15000), 2))
+
+    con.execute(UserProfile.__table__.insert(), [{
+        "user_id": user_id, "monthly_income": income, "monthly_expense": round(income * rng.uniform(0.6, 0.95), 2),
+    }])
+
+    k = sizes["buckets"]
+    pct = np.round(rng.dirichlet(np.ones(k)) * 100, 2)
+    _insert(con, Bucket.__table__, [{
+        "user_id": user_id, "name": BUCKET_NAMES[i % len(BUCKET_NAMES)] + ("" if i < len(BUCKET_NAMES) else f" {i}"),
+        "description": "", "percent": float(pct[i]), "type": "generic",
+        "balance": float(np.round(rng.uniform(0, 5000), 2)),
+    } for i in range(k)])
+    bucket_ids = list(con.execute(select(Bucket.id).where(Bucket.user_id == user_id)).scalars())
+
+    _insert(con, Giant.__table__, [{
+        "user_id": user_id, "name": f"Gigante {i + 1}", "total_to_pay": float(np.round(rng.lognormal(8.5, 0.8), 2)),
+        "parcels": int(rng.integers(0, 48)), "months_left": int(rng.integers(0, 48)),
+        "priority": int(rng.integers(1, 4)), "status": "defeated" if rng.random() < 0.15 else "active",
+    } for i in range(sizes["giants"])])
+    giant_ids = list(con.execute(select(Giant.id).where(Giant.user_id == user_id)).scalars())
+
+    # Movimentações: ~8% entradas (dias 5/20 +-2), resto gastos/transferências pelos pesos do dia
+    n_inc = int(n_mov * 0.08)
+    n_out = n_mov - n_inc
+    day_idx = rng.choice(days, size=n_out, p=_day_weights(start, days))
+    month_idx = rng.integers(0, months + 1, size=n_inc)
+    payday = np.where(rng.random(n_inc) < 0.6, 5, 20) + rng.integers(-2, 3, size=n_inc)
+    inc_dates = [min(_add_months(start, int(m)) + timedelta(days=int(p) - 1), today) for m, p in zip(month_idx, payday)]
+    out_dates = [start + timedelta(days=int(d)) for d in day_idx]
+    out_amount = np.round(rng.lognormal(4.0, 1.0, size=n_out), 2) + 0.01
+    inc_amount = np.round(rng.normal(income / 2, income * 0.05, size=n_inc).clip(min=1), 2)
+    is_transfer = rng.random(n_out) < 0.07
+    descs = rng.integers(0, len(EXPENSE_DESCS), size=n_out)
+    mov_bucket = rng.choice(bucket_ids, size=n_mov)
+    rows = [{
+        "user_id": user_id, "bucket_id": int(mov_bucket[i]), "kind": "income", "amount": float(inc_amount[i]),
+        "description": "Salário", "date": d,
+    } for i, d in enumerate(inc_dates)]
+    rows += [{
+        "user_id": user_id, "bucket_id": int(mov_bucket[n_inc + i]),
+        "kind": "transfer" if is_transfer[i] else "expense", "amount": float(out_amount[i]),
+        "description": EXPENSE_DESCS[descs[i]], "date": d,
+    } for i, d in enumerate(out_dates)]
+    _insert(con, Movement.__table__, rows)
+
+    # Contas mensais: passado 95% pago, próximos 2 meses em aberto
+    bills = []
+    for t in range(sizes["bills"]):
+        due_day = int(rng.integers(1, 29))
+        amount = float(np.round(rng.lognormal(5.5, 0.7), 2))
+        critical = bool(t < 3)
+        for m in range(months + 3):
+            due = _add_months(start, m) + timedelta(days=due_day - 1)
+            paid = due < today - timedelta(days=2) and rng.random() < 0.95
+            bills.append({"user_id": user_id, "title": BILL_TITLES[t % len(BILL_TITLES)], "amount": amount,
+                          "due_date": due, "is_critical": critical, "paid": bool(paid)})
+    _insert(con, Bill.__table__, bills)
+
+    pays = []
+    for gid in giant_ids:
+        for m in range(min(sizes["payments"], months)):
+            if rng.random() < 0.15:
+                continue  # mês sem aporte
+            d = min(_add_months(today, -m).replace(day=int(rng.integers(1, 29))), today)
+            pays.append({"user_id": user_id, "giant_id": gid, "amount": float(np.round(rng.uniform(100, 1500), 2)),
+                         "date": d, "note": ""})
+    _insert(con, GiantPayment.__table__, pays)
+
+def seed(engine: Engine, sizes: Optional[Dict] = None, seed_value: int = 0,
+         today: Optional[date] = None) -> Dict[str, int]:
+    from migrations import ensure_schema
+    sizes = {**DEFAULT_SIZES, **(sizes or {})}
+    today = today or date.today()
+    ensure_schema(engine)
+    rng = np.random.default_rng(seed_value)
+    import search
+    with engine.begin() as con, search.deferred(con):
+        first = con.execute(select(User.id).order_by(User.id.desc()).limit(1)).scalar() or 0
+        for i in range(sizes["users"]):
+            con.execute(User.__table__.insert(), [{"name": f"bench_{first + i + 1}"}])
+            uid = con.execute(select(User.id).where(User.name == f"bench_{first + i + 1}")).scalar_one()
+            seed_user(con, rng, uid, sizes, today)
+    return counts(engine)
+
+def counts(engine: Engine) -> Dict[str, int]:
+    with engine.connect() as con:
+        return {t.__tablename__: con.exec_driver_sql(f"SELECT COUNT(*) FROM {t.__tablename__}").scalar()
+                for t in (User, Bucket, Giant, Movement, Bill, GiantPayment)}
+
+def add_size_args(ap: argparse.ArgumentParser):
+    for k, v in DEFAULT_SIZES.items():
+        ap.add_argument(f"--{k}", type=int, default=v)
+    ap.add_argument("--seed", type=int, default=0)
+
+def sizes_from_args(args) -> Dict[str, int]:
+    return {k: getattr(args, k) for k in DEFAULT_SIZES}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Popula um SQLite com dados sintéticos")
+    ap.add_argument("--db", default="bench.db", help="arquivo SQLite de destino")
+    ap.add_argument("--reset", action="store_true", help="apaga o arquivo antes")
+    add_size_args(ap)
+    args = ap.parse_args()
+    if args.reset:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    from db import make_engine
+    print(seed(make_engine(f"sqlite:///{args.db}"), sizes_from_args(args), args.seed))
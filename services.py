@@ -0,0 +1,372 @@
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import (User, Bucket, Giant, Movement, Bill, UserProfile, GiantPayment, RecurringBill, BillOccurrence,
+                    BucketCheckpoint)
+import cache
+import queries
+import reconcile
+import recurring
+
+# ==============================================
+# Camada de serviço (sem Streamlit)
+# ==============================================
+# Toda escrita do app passa por aqui: app.py, api.py e scripts chamam as
+# mesmas funções. Cada função abre (ou reaproveita) uma transação explícita;
+# saldos mudam com UPDATE atômico (balance = balance + x), nunca lendo e
+# regravando o valor, para aguentar escritas concorrentes.
+
+KINDS = ("income", "expense", "transfer")
+
+class ServiceError(ValueError):
+    pass
+
+class NotFound(ServiceError):
+    pass
+
+class InsufficientFunds(ServiceError):
+    pass
+
+@contextmanager
+def transaction(db: Session):
+    # Reentrante: funções chamadas dentro de outra (ou de run_batch) entram na mesma transação
+    if db.info.get("service_tx"):
+        yield db
+        return
+    con = None
+    if db.get_bind().dialect.name == "sqlite":
+        con = db.connection()
+        # Trava de escrita já no início (espera busy_timeout) em vez de falhar no meio da transação
+        if not con.connection.dbapi_connection.in_transaction:
+            con.exec_driver_sql("BEGIN IMMEDIATE")
+    db.info["service_tx"] = True
+    try:
+        yield db
+        if con is not None:
+            # COMMIT com a trava na mão: o cache distingue esta escrita das de outros processos
+            db.flush()
+            con = db.connection()
+            if con.connection.dbapi_connection.in_transaction:
+                cache.commit_own_write(con)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop("service_tx", None)
+
+def as_dict(obj, *names) -> Dict:
+    return {n: getattr(obj, n) for n in names}
+
+BUCKET_FIELDS = ("id", "name", "description", "percent", "type", "balance")
+MOVEMENT_FIELDS = ("id", "bucket_id", "kind", "amount", "description", "date")
+GIANT_FIELDS = ("id", "name", "total_to_pay", "parcels", "months_left", "priority", "status")
+BILL_FIELDS = ("id", "title", "amount", "due_date", "is_critical", "paid")
+RECURRING_FIELDS = ("id", "title", "amount", "is_critical", "rule", "start_date", "end_date", "settled_through")
+OCCURRENCE_FIELDS = ("id", "recurring_id", "occurrence_date", "title", "amount", "due_date", "is_critical", "paid")
+
+def _positive(amount: float, what: str = "Valor") -> float:
+    amount = float(amount)
+    if not amount > 0:
+        raise ServiceError(f"{what} deve ser maior que zero.")
+    return amount
+
+def _owned(db: Session, model, obj_id: int, user_id: int, label: str):
+    obj = db.get(model, obj_id)
+    if obj is None or obj.user_id != user_id:
+        raise NotFound(f"{label} {obj_id} não encontrado.")
+    return obj
+
+# =================
+# Usuário e perfil
+# =================
+def get_or_create_user(db: Session, name: str) -> Dict:
+    name = (name or "").strip() or "Usuário"
+    with transaction(db):
+        u = db.execute(select(User).where(User.name == name)).scalar_one_or_none()
+        if u is None:
+            u = User(name=name)
+            db.add(u)
+            db.flush()
+        return {"id": u.id, "name": u.name}
+
+def update_profile(db: Session, user_id: int, monthly_income: float, monthly_expense: float) -> Dict:
+    with transaction(db):
+        prof = queries.get_profile(db, user_id)
+        prof.monthly_income = float(monthly_income)
+        prof.monthly_expense = float(monthly_expense)
+        return {"monthly_income": prof.monthly_income, "monthly_expense": prof.monthly_expense}
+
+# ======
+# Baldes
+# ======
+def create_bucket(db: Session, user_id: int, name: str, percent: float, description: str = "",
+                  type: str = "generic") -> Dict:
+    if not (name or "").strip():
+        raise ServiceError("Informe o nome do balde.")
+    with transaction(db):
+        b = Bucket(user_id=user_id, name=name.strip(), description=(description or "").strip(),
+                   percent=float(percent), type=type or "generic", balance=0.0)
+        db.add(b)
+        db.flush()
+        return as_dict(b, *BUCKET_FIELDS)
+
+def update_bucket(db: Session, user_id: int, bucket_id: int, **fields) -> Dict:
+    with transaction(db):
+        b = _owned(db, Bucket, bucket_id, user_id, "Balde")
+        for k in ("name", "description", "percent", "type"):
+            if k in fields:
+                setattr(b, k, fields[k])
+        return as_dict(b, *BUCKET_FIELDS)
+
+def delete_bucket(db: Session, user_id: int, bucket_id: int, force: bool = False) -> None:
+    with transaction(db):
+        b = _owned(db, Bucket, bucket_id, user_id, "Balde")
+        if b.balance != 0 and not force:
+            raise ServiceError("Este balde possui saldo. Confirme para apagar mesmo assim.")
+        db.delete(b)
+
+def normalize_bucket_percents(db: Session, user_id: int) -> List[float]:
+    with transaction(db):
+        buckets = queries.load_buckets(db, user_id)
+        total = sum(b.percent for b in buckets)
+        if total <= 0:
+            raise ServiceError("Não é possível normalizar: soma é 0%.")
+        for b in buckets:
+            b.percent = round(b.percent * 100.0 / total, 2)
+        return [b.percent for b in buckets]
+
+# ===========
+# Livro Caixa
+# ===========
+# Instruções prontas (compiladas uma vez): no lote, cada operação custa só a execução
+_BUCKETS = Bucket.__table__
+_DELTA = (update(_BUCKETS)
+          .where(_BUCKETS.c.id == bindparam("b_id"), _BUCKETS.c.user_id == bindparam("u_id"))
+          .values(balance=_BUCKETS.c.balance + bindparam("delta")))
+_DEBIT = _DELTA.where(_BUCKETS.c.balance + bindparam("delta") >= 0)  # checagem e débito no mesmo UPDATE
+_INSERT_MOVEMENT = insert(Movement.__table__)
+
+def _apply_delta(db: Session, user_id: int, bucket_id: int, delta: float, allow_negative: bool = True):
+    stmt = _DEBIT if delta < 0 and not allow_negative else _DELTA
+    if db.connection().execute(stmt, {"b_id": bucket_id, "u_id": user_id, "delta": delta}).rowcount == 0:
+        _owned(db, Bucket, bucket_id, user_id, "Balde")
+        raise InsufficientFunds("Saldo insuficiente no balde selecionado.")
+
+def _insert_movement(db: Session, user_id: int, bucket_id: int, kind: str, amount: float,
+                     description: str, day: date) -> Dict:
+    row = {"bucket_id": bucket_id, "kind": kind, "amount": amount, "description": description, "date": day}
+    res = db.connection().execute(_INSERT_MOVEMENT, {"user_id": user_id, **row})
+    return {"id": res.inserted_primary_key[0], **row}
+
+def add_movement(db: Session, user_id: int, bucket_id: int, kind: str, amount: float,
+                 description: str = "", day: Optional[date] = None, allow_negative: bool = False) -> Dict:
+    if kind not in KINDS:
+        raise ServiceError(f"Tipo inválido: {kind}")
+    amount = _positive(amount)
+    with transaction(db):
+        _apply_delta(db, user_id, bucket_id, amount if kind == "income" else -amount, allow_negative)
+        return _insert_movement(db, user_id, bucket_id, kind, amount, description or "", day or date.today())
+
+def transfer(db: Session, user_id: int, from_bucket: int, to_bucket: int, amount: float,
+             description: str = "Transferência entre baldes", day: Optional[date] = None,
+             allow_negative: bool = False) -> Dict:
+    amount = _positive(amount)
+    if from_bucket == to_bucket:
+        raise ServiceError("Selecione baldes diferentes.")
+    day = day or date.today()
+    with transaction(db):
+        _apply_delta(db, user_id, from_bucket, -amount, allow_negative)
+        _apply_delta(db, user_id, to_bucket, amount)
+        return {"out": _insert_movement(db, user_id, from_bucket, "transfer", amount, description + " (saída)", day),
+                "in": _insert_movement(db, user_id, to_bucket, "income", amount, description + " (entrada)", day)}
+
+def daily_income(db: Session, user_id: int, amount: float, day: Optional[date] = None,
+                 description: str = "Entrada diária") -> List[Dict]:
+    from logic import compute_bucket_splits
+    amount = _positive(amount)
+    with transaction(db):
+        buckets = queries.load_buckets(db, user_id)
+        if not buckets:
+            raise ServiceError("Crie baldes primeiro.")
+        splits = compute_bucket_splits(buckets, amount)
+        for s in splits:
+            _apply_delta(db, user_id, s["bucket_id"], s["value"])
+            _insert_movement(db, user_id, s["bucket_id"], "income", s["value"], description, day or date.today())
+        return splits
+
+# ========
+# Gigantes
+# ========
+def create_giant(db: Session, user_id: int, name: str, total_to_pay: float, parcels: int = 0,
+                 months_left: int = 0, priority: int = 1) -> Dict:
+    if not (name or "").strip():
+        raise ServiceError("Informe o nome do gigante.")
+    with transaction(db):
+        g = Giant(user_id=user_id, name=name.strip(), total_to_pay=float(total_to_pay), parcels=int(parcels),
+                  months_left=int(months_left), priority=int(priority), status="active")
+        db.add(g)
+        db.flush()
+        return as_dict(g, *GIANT_FIELDS)
+
+def add_giant_payment(db: Session, user_id: int, giant_id: int, amount: float,
+                      day: Optional[date] = None, note: str = "") -> Dict:
+    amount = _positive(amount, "Aporte")
+    with transaction(db):
+        g = _owned(db, Giant, giant_id, user_id, "Gigante")
+        p = GiantPayment(user_id=user_id, giant_id=giant_id, amount=amount, date=day or date.today(), note=note or "")
+        db.add(p)
+        db.flush()
+        total_paid = db.execute(
+            select(func.coalesce(func.sum(GiantPayment.amount), 0.0))
+            .where(GiantPayment.user_id == user_id, GiantPayment.giant_id == giant_id)
+        ).scalar()
+        defeated_now = total_paid >= g.total_to_pay and g.status != "defeated"
+        if defeated_now:
+            g.status = "defeated"
+        return {"payment_id": p.id, "total_paid": total_paid, "remaining": max(g.total_to_pay - total_paid, 0.0),
+                "defeated": defeated_now}
+
+# ======
+# Contas
+# ======
+def create_bill(db: Session, user_id: int, title: str, amount: float, due_date: date,
+                is_critical: bool = False) -> Dict:
+    if not (title or "").strip():
+        raise ServiceError("Informe o título da conta.")
+    with transaction(db):
+        b = Bill(user_id=user_id, title=title.strip(), amount=float(amount), due_date=due_date,
+                 is_critical=bool(is_critical), paid=False)
+        db.add(b)
+        db.flush()
+        return as_dict(b, *BILL_FIELDS)
+
+def update_bill(db: Session, user_id: int, bill_id, **fields) -> Dict:
+    # Ocorrência de conta recorrente ("r<id>:<data>") vira exceção; conta avulsa altera a linha
+    if recurring.is_occurrence_id(bill_id):
+        return update_occurrence(db, user_id, bill_id, **fields)
+    with transaction(db):
+        b = _owned(db, Bill, bill_id, user_id, "Conta")
+        for k in ("title", "amount", "due_date", "is_critical", "paid"):
+            if k in fields:
+                setattr(b, k, fields[k])
+        return as_dict(b, *BILL_FIELDS)
+
+# =================
+# Contas recorrentes
+# =================
+def create_recurring_bill(db: Session, user_id: int, title: str, amount: float, first_due: date,
+                          freq: str = "MONTHLY", interval: int = 1, end_date: Optional[date] = None,
+                          is_critical: bool = False, settled_through: Optional[date] = None) -> Dict:
+    # settled_through: vencimentos até essa data já estavam pagos (não geram alerta)
+    if not (title or "").strip():
+        raise ServiceError("Informe o título da conta.")
+    if end_date is not None and end_date < first_due:
+        raise ServiceError("A data final não pode ser anterior ao primeiro vencimento.")
+    try:
+        rule = recurring.make_rule(freq, first_due, int(interval))
+    except ValueError as e:
+        raise ServiceError(str(e)) from e
+    with transaction(db):
+        r = RecurringBill(user_id=user_id, title=title.strip(), amount=float(amount), is_critical=bool(is_critical),
+                          rule=rule, start_date=first_due, end_date=end_date, settled_through=settled_through)
+        db.add(r)
+        db.flush()
+        return as_dict(r, *RECURRING_FIELDS)
+
+def update_recurring_bill(db: Session, user_id: int, recurring_id: int, **fields) -> Dict:
+    # Vale para as ocorrências ainda não editadas; exceções guardam os próprios valores
+    with transaction(db):
+        r = _owned(db, RecurringBill, recurring_id, user_id, "Conta recorrente")
+        for k in ("title", "amount", "is_critical", "end_date"):
+            if k in fields:
+                setattr(r, k, fields[k])
+        return as_dict(r, *RECURRING_FIELDS)
+
+def delete_recurring_bill(db: Session, user_id: int, recurring_id: int) -> None:
+    with transaction(db):
+        r = _owned(db, RecurringBill, recurring_id, user_id, "Conta recorrente")
+        db.execute(delete(BillOccurrence).where(BillOccurrence.recurring_id == r.id))
+        db.delete(r)
+
+def update_occurrence(db: Session, user_id: int, occurrence_id: str, **fields) -> Dict:
+    parsed = recurring.parse_occurrence_id(occurrence_id)
+    if parsed is None:
+        raise NotFound(f"Ocorrência {occurrence_id} não encontrada.")
+    recurring_id, day = parsed
+    with transaction(db):
+        r = _owned(db, RecurringBill, recurring_id, user_id, "Conta recorrente")
+        o = db.execute(
+            select(BillOccurrence).where(BillOccurrence.recurring_id == r.id, BillOccurrence.occurrence_date == day)
+        ).scalar_one_or_none()
+        if o is None:
+            if not recurring.is_occurrence(r, day):
+                raise NotFound(f"Ocorrência {occurrence_id} não encontrada.")
+            # Primeira edição: copia os valores atuais da regra para a exceção
+            o = BillOccurrence(user_id=user_id, recurring_id=r.id, occurrence_date=day, title=r.title,
+                               amount=r.amount, due_date=day, is_critical=r.is_critical,
+                               paid=recurring.is_settled(r, day))
+            db.add(o)
+        for k in ("title", "amount", "due_date", "is_critical", "paid"):
+            if k in fields:
+                setattr(o, k, fields[k])
+        db.flush()
+        recurring.settle(db, r, date.today())
+        return as_dict(recurring.from_override(o), *OCCURRENCE_FIELDS)
+
+# =====
+# Reset
+# =====
+def reset_all(db: Session) -> None:
+    with transaction(db):
+        for model in (BillOccurrence, RecurringBill, Bill, Movement, GiantPayment, Giant, BucketCheckpoint, Bucket,
+                      UserProfile, User):
+            db.execute(delete(model))
+
+# ==========================
+# Lote (uma única transação)
+# ==========================
+BATCH_OPS = {
+    "movement": add_movement,
+    "transfer": transfer,
+    "income": daily_income,
+    "giant_payment": add_giant_payment,
+    "bill": create_bill,
+    "bill_update": update_bill,
+    "recurring_bill": create_recurring_bill,
+    "bucket": create_bucket,
+    "giant": create_giant,
+}
+
+def run_batch(db: Session, user_id: int, ops: Iterable[Dict]) -> List:
+    # Tudo ou nada: o primeiro erro desfaz o lote inteiro (ServiceError cita a posição)
+    results = []
+    with transaction(db):
+        for i, op in enumerate(ops):
+            op = dict(op)
+            fn = BATCH_OPS.get(op.pop("op", None))
+            if fn is None:
+                raise ServiceError(f"Operação {i}: tipo desconhecido.")
+            try:
+                results.append(fn(db, user_id, **op))
+            except ServiceError as e:
+                raise type(e)(f"Operação {i}: {e}") from e
+            except TypeError as e:
+                raise ServiceError(f"Operação {i}: parâmetros inválidos ({e}).") from e
+        # Confere os saldos ainda na transação do lote (só as movimentações novas)
+        reconcile.run(db.connection(), user_id)
+        return results
+
+# ===================
+# Conferência de saldos
+# ===================
+def reconcile_balances(db: Session, user_id: Optional[int], repair: bool = False, accept: bool = False) -> Dict:
+    # user_id None = todos os usuários (tarefa periódica)
+    if repair and accept:
+        raise ServiceError("Escolha corrigir ou aceitar os saldos, não os dois.")
+    with transaction(db):
+        return reconcile.run(db.connection(), user_id, repair=repair, accept=accept)
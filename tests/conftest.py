@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Testes importam os módulos da raiz (estrutura plana) e nunca tocam ./davi.db
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DAVI_DB_URL", "sqlite://")
+os.environ.setdefault("DAVI_JOBS_DB_URL", "sqlite://")
@@ -0,0 +1,14 @@
+import api
+
+def test_malformed_query_values_are_400():
+    status, payload = api._call(api.list_movements, {"user_id": 1}, {},
+                                {"after_date": ["ontem"], "after_id": ["1"]})
+    assert status == 400
+    assert payload["error"].startswith("Parâmetros inválidos")
+    status, _ = api._call(api.list_movements, {"user_id": 1}, {}, {"limit": ["dez"]})
+    assert status == 400
+
+def test_missing_body_fields_are_400():
+    status, payload = api._call(lambda db, p, body, qs: (lambda name: name)(**body), {}, {}, {})
+    assert status == 400
+    assert payload["error"].startswith("Parâmetros inválidos")
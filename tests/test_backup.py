@@ -0,0 +1,130 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+import backup
+import reconcile
+import rollup
+import search
+import services
+from db import make_engine
+from migrations import ensure_schema
+from services import NotFound
+
+DAY = date(2026, 3, 10)
+
+@pytest.fixture
+def eng(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    e = make_engine(f"sqlite:///{tmp_path / 'bk.db'}")
+    ensure_schema(e)
+    yield e
+    e.dispose()
+
+def _populate(db, name):
+    uid = services.get_or_create_user(db, name)["id"]
+    services.update_profile(db, uid, 5000.0, 3000.0)
+    casa = services.create_bucket(db, uid, "Casa", 60.0)["id"]
+    lazer = services.create_bucket(db, uid, "Lazer", 40.0)["id"]
+    services.add_movement(db, uid, casa, "income", 1000.0, f"salario {name}", DAY)
+    services.transfer(db, uid, casa, lazer, 200.0, day=DAY)
+    g = services.create_giant(db, uid, "Cartao", 3000.0)["id"]
+    services.add_giant_payment(db, uid, g, 150.0, DAY, "parcela")
+    services.create_bill(db, uid, f"Luz {name}", 120.0, date(2026, 4, 5))
+    rec = services.create_recurring_bill(db, uid, "Aluguel", 900.0, date(2026, 1, 5))["id"]
+    services.update_occurrence(db, uid, f"r{rec}:2026-02-05", paid=True)
+    return uid
+
+def _content(con, uid):
+    # Linhas do usuário sem ids, com as referências trocadas pelo nome do pai
+    q = {
+        "buckets": "SELECT name, percent, balance FROM buckets WHERE user_id = ?",
+        "movements": "SELECT b.name, m.kind, m.amount, m.description, m.date FROM movements m "
+                     "JOIN buckets b ON b.id = m.bucket_id AND b.user_id = m.user_id WHERE m.user_id = ?",
+        "giant_payments": "SELECT g.name, p.amount, p.date, p.note FROM giant_payments p "
+                          "JOIN giants g ON g.id = p.giant_id AND g.user_id = p.user_id WHERE p.user_id = ?",
+        "bills": "SELECT title, amount, due_date, paid FROM bills WHERE user_id = ?",
+        "bill_occurrences": "SELECT r.title, o.occurrence_date, o.paid FROM bill_occurrences o "
+                            "JOIN recurring_bills r ON r.id = o.recurring_id AND r.user_id = o.user_id "
+                            "WHERE o.user_id = ?",
+        "user_profiles": "SELECT monthly_income, monthly_expense FROM user_profiles WHERE user_id = ?",
+    }
+    return {t: sorted(con.exec_driver_sql(sql, (uid,)).all()) for t, sql in q.items()}
+
+def _count(con, table, uid):
+    return con.exec_driver_sql(f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (uid,)).scalar()
+
+def test_restore_user_brings_back_rows_and_leaves_others_alone(eng):
+    with Session(eng) as db:
+        a = _populate(db, "ana")
+        b = _populate(db, "bia")
+    with eng.connect() as con:
+        before_a = _content(con, a)
+    snap = backup.snapshot(eng)["name"]
+
+    with Session(eng) as db:  # muda os dois usuários depois do snapshot
+        casa = db.connection().exec_driver_sql("SELECT id FROM buckets WHERE user_id = ? AND name = 'Casa'",
+                                               (a,)).scalar()
+        services.add_movement(db, a, casa, "expense", 77.0, "depois do snapshot", DAY)
+        services.create_bucket(db, a, "Novo", 0.0)
+        services.create_giant(db, a, "Outro", 10.0)
+        b_casa = db.connection().exec_driver_sql("SELECT id FROM buckets WHERE user_id = ? AND name = 'Casa'",
+                                                 (b,)).scalar()
+        services.add_movement(db, b, b_casa, "expense", 33.0, "bia depois", DAY)
+    with eng.connect() as con:
+        before_b = _content(con, b)
+        b_ids = con.exec_driver_sql("SELECT id FROM movements WHERE user_id = ? ORDER BY id", (b,)).scalars().all()
+
+    res = backup.restore_user(snap, a, engine=eng)
+    assert res["rows"]["movements"] == 3 and res["rows"]["buckets"] == 2
+
+    with eng.begin() as con:
+        assert _content(con, a) == before_a
+        assert _content(con, b) == before_b
+        assert con.exec_driver_sql("SELECT id FROM movements WHERE user_id = ? ORDER BY id",
+                                   (b,)).scalars().all() == b_ids
+        # Todas as referências apontam para linhas do próprio usuário
+        for table in ("movements", "giant_payments", "bill_occurrences", "bills", "giants", "recurring_bills"):
+            assert _count(con, table, a) > 0
+        assert con.exec_driver_sql("SELECT COUNT(*) FROM movements m LEFT JOIN buckets k ON k.id = m.bucket_id "
+                                   "WHERE m.user_id = ? AND (k.id IS NULL OR k.user_id != m.user_id)",
+                                   (a,)).scalar() == 0
+        assert rollup.check(con) == []
+        if search.installed(con):
+            assert search.check(con) == []
+            assert con.exec_driver_sql("SELECT COUNT(*) FROM movements_fts WHERE movements_fts MATCH ?",
+                                       ('"depois"',)).scalar() == 1  # só o de "bia"
+        # Marcas da conferência rebaseadas nos baldes restaurados
+        marks = con.exec_driver_sql("SELECT b.name FROM bucket_checkpoints c JOIN buckets b ON b.id = c.bucket_id "
+                                    "WHERE c.user_id = ? ORDER BY b.name", (a,)).scalars().all()
+        assert marks == ["Casa", "Lazer"]
+        assert reconcile.run(con)["issues"] == []
+
+def test_restore_unknown_user_rolls_back(eng):
+    with Session(eng) as db:
+        a = _populate(db, "ana")
+    snap = backup.snapshot(eng)["name"]
+    with Session(eng) as db:
+        services.get_or_create_user(db, "carla")
+    with eng.connect() as con:
+        carla = con.exec_driver_sql("SELECT id FROM users WHERE name = 'carla'").scalar()
+    with pytest.raises(NotFound):
+        backup.restore_user(snap, carla, engine=eng)  # "carla" não existe no snapshot
+    with pytest.raises(NotFound):
+        backup.restore_user(snap, 999, engine=eng)
+    with eng.connect() as con:
+        assert _count(con, "movements", a) == 3
+
+@pytest.mark.parametrize("name", [
+    "../bk.db", "/etc/passwd", "davi-20260101-000000.db.gz/../../bk.db", "..%2Fbk.db",
+    "davi-20260101-000000-../x.db.gz", "", None,
+])
+def test_snapshot_path_rejects_traversal(eng, name):
+    backup.snapshot(eng)
+    with pytest.raises(NotFound):
+        backup.snapshot_path(name)
+
+def test_snapshot_path_accepts_generated_name(eng):
+    name = backup.snapshot(eng, label="manual")["name"]
+    assert backup.snapshot_path(name).endswith(name)
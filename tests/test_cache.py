@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.orm import Session
+
+import cache
+import services
+from db import make_engine
+from migrations import ensure_schema
+
+@pytest.fixture
+def watched(tmp_path, monkeypatch):
+    path = tmp_path / "cache.db"
+    eng = make_engine(f"sqlite:///{path}")
+    ensure_schema(eng)
+    monkeypatch.setattr(cache, "_watch", {"engine": None, "con": None, "seen": None})
+    with Session(eng) as db:
+        uid = services.get_or_create_user(db, "cache")["id"]
+    cache.sync_external_writes(eng)
+    cache.bump_version(uid)
+
+    def external_write():
+        con = sqlite3.connect(path)
+        con.execute("UPDATE users SET name = name")
+        con.commit()
+        con.close()
+
+    yield eng, uid, external_write
+    cache._watch["con"].close()
+    eng.dispose()
+
+def _own_write(eng, uid):
+    with Session(eng) as db:
+        services.create_bucket(db, uid, "Balde", 10.0)
+
+def test_own_write_is_absorbed(watched):
+    eng, uid, _ = watched
+    v = cache.data_version(uid)
+    _own_write(eng, uid)
+    assert cache.data_version(uid) == v
+    assert cache.sync_external_writes(eng) is False
+
+def test_external_write_before_own_commit_invalidates(watched):
+    eng, uid, external_write = watched
+    v = cache.data_version(uid)
+    external_write()
+    _own_write(eng, uid)
+    assert cache.data_version(uid) > v
+
+def test_external_write_right_after_own_commit_invalidates(watched, monkeypatch):
+    # Outro processo grava entre o COMMIT e a leitura seguinte de data_version
+    eng, uid, external_write = watched
+    v = cache.data_version(uid)
+    read, calls = cache._read_data_version, []
+
+    def read_after_external():
+        calls.append(1)
+        if len(calls) == 2:
+            external_write()
+        return read()
+
+    monkeypatch.setattr(cache, "_read_data_version", read_after_external)
+    _own_write(eng, uid)
+    assert len(calls) == 2
+    assert cache.data_version(uid) > v
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from formatting import date_br, date_br_many, format_columns, money_br, money_br_many
+
+EDGE_VALUES = [
+    0.0, -0.0, 0.01, -0.01, 0.004, 0.005, -0.005, 0.015, 0.025, 1.005, 2.675, -2.675, 1234.565, -1234.565,
+    999.995, 1_000.0, -1_000_000.125, 123456789.995, 9_999_999_999_999.99, 1e13, 1e13 + 0.005, 1e15, -1e18,
+    float("nan"), float("inf"), float("-inf"), None,
+]
+
+def test_money_br_many_matches_money_br_on_edges():
+    assert money_br_many(EDGE_VALUES) == [money_br(v) for v in EDGE_VALUES]
+    assert money_br_many(iter(EDGE_VALUES)) == [money_br(v) for v in EDGE_VALUES]  # gerador, não só lista
+    assert money_br_many(np.array(EDGE_VALUES, dtype=float)) == [money_br(v) for v in EDGE_VALUES]
+
+def test_money_br_many_matches_money_br_on_random_half_cents():
+    rng = np.random.default_rng(0)
+    cents = rng.integers(-10**9, 10**9, size=5_000)
+    # x.xx5 exatos no texto decimal (arredondamento HALF_EVEN do Babel) + valores quaisquer
+    values = np.concatenate([np.round(cents / 100.0, 2) + 0.005, np.round(rng.normal(0, 5000, 5_000), 3),
+                             rng.uniform(-1e12, 1e12, 2_000)]).tolist()
+    assert money_br_many(values) == [money_br(v) for v in values]
+
+def test_money_br_missing_and_signs():
+    assert money_br(None) == money_br(float("nan")) == ""
+    assert money_br_many([]) == []
+    assert money_br(-0.004) == money_br_many([-0.004])[0]
+    assert money_br_many([1234.5])[0].endswith("1.234,50")
+
+def test_date_br_many_matches_date_br():
+    start = date(2020, 1, 1)
+    days = [start + timedelta(days=n) for n in range(0, 3000, 7)]
+    values = days + [date(1, 1, 1), date(999, 12, 31), date(1000, 1, 1), date(9999, 12, 31), None]
+    assert date_br_many(values) == [date_br(d) for d in values]
+    assert date_br(None) == ""  # não vira a data de hoje
+
+def test_format_columns_uses_batch_output():
+    pd = pytest.importorskip("pandas")
+    df = format_columns(pd.DataFrame({"Valor": [1.5, None, -2.675], "Data": [date(2026, 3, 1), None, date(2026, 3, 3)]}),
+                        money=["Valor"], dates=["Data"])
+    assert df["Valor"].tolist() == [money_br(1.5), "", money_br(-2.675)]
+    assert df["Data"].tolist() == [date_br(date(2026, 3, 1)), "", date_br(date(2026, 3, 3))]
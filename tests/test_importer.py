@@ -0,0 +1,19 @@
+import pytest
+
+from importer import parse_amount
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1.234,56", 1234.56),
+    ("1,234.56", 1234.56),
+    ("-1.234.567,89", -1234567.89),
+    ("1,234,567.89", 1234567.89),
+    ("-12,30", -12.30),
+    ("1234.56", 1234.56),
+    ("R$ 10,00", 10.0),
+    ("R$\xa01.000,00", 1000.0),
+    ("", 0.0),
+    (None, 0.0),
+    (12, 12.0),
+])
+def test_parse_amount_separators(raw, expected):
+    assert parse_amount(raw) == pytest.approx(expected)
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+from sqlalchemy import update
+
+import jobs
+
+def _square(x):
+    return x * x
+
+def _wait(job_id):
+    for _ in range(200):
+        if jobs.get(job_id)["status"] in jobs.FINISHED:
+            break
+        time.sleep(0.05)
+    return jobs.get(job_id)
+
+def test_cancel_flag_from_another_process_stops_cpu_map(tmp_path, monkeypatch):
+    # cancel_requested gravado direto na tabela (outro processo): o evento local não é acionado
+    monkeypatch.setattr(jobs, "JOBS_DB_URL", f"sqlite:///{tmp_path / 'jobs.db'}")
+    monkeypatch.setitem(jobs._state, "engine", None)
+    started, flagged, chunks = threading.Event(), threading.Event(), []
+
+    def slow_job(ctx):
+        started.set()
+        flagged.wait(10)
+        return jobs.cpu_map(lambda x: chunks.append(x) or _square(x), range(4))
+
+    monkeypatch.setitem(jobs.HANDLERS, "slow", slow_job)
+    job_id = jobs.submit("slow")
+    assert started.wait(10)
+    with jobs._engine().begin() as con:
+        con.execute(update(jobs._JOBS).where(jobs._JOBS.c.id == job_id).values(cancel_requested=True))
+    flagged.set()
+    for _ in range(100):
+        if jobs.get(job_id)["status"] in jobs.FINISHED:
+            break
+        time.sleep(0.05)
+    assert jobs.get(job_id)["status"] == "cancelled"
+    assert chunks == []
+    jobs._state["engine"].dispose()
+
+def test_cpu_map_outside_jobs():
+    assert jobs.cpu_map(_square, range(5)) == [0, 1, 4, 9, 16]
+
+def test_payoff_job_compares_strategies_for_every_user(tmp_path, monkeypatch):
+    import db as dbmod
+    import services
+    from db import make_engine
+    from migrations import ensure_schema
+    from sqlalchemy.orm import Session
+
+    eng = make_engine(f"sqlite:///{tmp_path / 'payoff.db'}")
+    ensure_schema(eng)
+    dbmod.SessionLocal.configure(bind=eng)
+    monkeypatch.setattr(jobs, "JOBS_DB_URL", f"sqlite:///{tmp_path / 'jobs.db'}")
+    monkeypatch.setitem(jobs._state, "engine", None)
+    try:
+        with Session(eng) as db:
+            a = services.get_or_create_user(db, "a")["id"]
+            services.update_profile(db, a, 500.0, 400.0)
+            g = services.create_giant(db, a, "Cartao", 300.0)["id"]
+            services.create_giant(db, a, "Carro", 200.0, priority=2)
+            services.add_giant_payment(db, a, g, 100.0, None, "")
+            b = services.get_or_create_user(db, "b")["id"]
+            services.create_giant(db, b, "Casa", 1000.0)
+        job = _wait(jobs.submit("payoff"))
+        assert job["status"] == "done", job["message"]
+        months = job["result"]["months"]
+        assert months[str(a)] == {"priority": 4, "avalanche": 4, "snowball": 4}
+        assert months[str(b)] == {"priority": None, "avalanche": None, "snowball": None}  # sem perfil/margem
+        # Um usuário só, com aporte informado
+        assert _wait(jobs.submit("payoff", b, budget=250.0))["result"]["months"] == {str(b): {"priority": 4, "avalanche": 4, "snowball": 4}}
+    finally:
+        jobs._state["engine"].dispose()
+        dbmod.SessionLocal.configure(bind=None)
+        eng.dispose()
+
+def test_new_export_discards_previous_file_and_ttl_sweeps(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DB_URL", f"sqlite:///{tmp_path / 'jobs.db'}")
+    monkeypatch.setitem(jobs._state, "engine", None)
+
+    def fake_export(ctx, name="x", **filters):
+        path = tmp_path / f"{ctx.user_id}_{name}.csv"
+        path.write_text("id\n")
+        return {"path": str(path), "filters": filters}
+
+    monkeypatch.setitem(jobs.HANDLERS, "export", fake_export)
+    try:
+        # Filtro "kind" do livro caixa não colide com o tipo da tarefa
+        res = _wait(jobs.submit("export", 1, name="a", kind="expense", bucket_id=None))["result"]
+        assert res["filters"] == {"kind": "expense", "bucket_id": None}
+        first = res["path"]
+        other = _wait(jobs.submit("export", 2, name="a"))["result"]["path"]
+        second = _wait(jobs.submit("export", 1, name="b"))["result"]["path"]
+        # Nova exportação do usuário 1 descarta só o arquivo anterior dele
+        assert not os.path.exists(first)
+        assert os.path.exists(second) and os.path.exists(other)
+        # Vencido o prazo, qualquer envio varre as exportações prontas de todos
+        monkeypatch.setattr(jobs, "EXPORT_TTL_HOURS", 0)
+        monkeypatch.setitem(jobs.HANDLERS, "noop", lambda ctx: {})
+        _wait(jobs.submit("noop", 3))
+        assert not os.path.exists(second) and not os.path.exists(other)
+    finally:
+        jobs._state["engine"].dispose()
@@ -0,0 +1,146 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from logic import (MAX_PAYOFF_MONTHS, _simulate_cached, compare_strategies, compute_bucket_splits,
+                   defeat_months, defeat_months_batch, normalize_percents, payoff_order, simulate_payoff,
+                   simulate_payoff_batch, split_cents, to_cents)
+
+def _random_case(rng):
+    n, k = int(rng.integers(1, 50)), int(rng.integers(1, 12))
+    incomes = np.round(rng.uniform(0, 50_000, size=n), 2)
+    percents = np.round(rng.uniform(0, 100, size=k), 2)
+    return incomes, percents
+
+def _legacy_splits(buckets, total_income):
+    # Versão anterior (arredonda cada cota separadamente)
+    return [{"bucket_id": b.id, "name": b.name, "percent_effective": p, "value": round(total_income * (p / 100.0), 2)}
+            for b, p in zip(buckets, normalize_percents(buckets))]
+
+def test_split_cents_rows_sum_to_income():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        incomes, percents = _random_case(rng)
+        alloc = split_cents(incomes, percents)
+        assert alloc.shape == (len(incomes), len(percents))
+        assert (alloc.sum(axis=1) == np.round(incomes * 100)).all()
+        assert (alloc >= 0).all()
+
+def test_split_cents_negative_and_degenerate():
+    assert (split_cents([-123.45], [30, 70]).sum(axis=1) == [-12345]).all()
+    assert split_cents([100.0], [0, 0]).tolist() == [[0, 0]]
+    assert split_cents([], [50, 50]).shape == (0, 2)
+
+def test_split_cents_shares_within_one_cent_of_exact():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        incomes, percents = _random_case(rng)
+        if percents.sum() <= 0:
+            continue
+        exact = to_cents(incomes)[:, None] * (percents / percents.sum())[None, :]
+        assert (np.abs(split_cents(incomes, percents) - exact) < 1).all()
+
+def test_compute_bucket_splits_matches_previous_wrapper():
+    rng = np.random.default_rng(2)
+    for _ in range(300):
+        # Percentuais já normalizados (somam 100, como após normalize_bucket_percents)
+        k = int(rng.integers(1, 10))
+        percents = np.round(rng.dirichlet(np.ones(k)) * 100, 2)
+        percents[-1] = round(100 - percents[:-1].sum(), 2)
+        buckets = [SimpleNamespace(id=i + 1, name=f"B{i}", percent=float(p)) for i, p in enumerate(percents)]
+        income = float(np.round(rng.uniform(0.01, 20_000), 2))
+        new, old = compute_bucket_splits(buckets, income), _legacy_splits(buckets, income)
+        # Mesmas chaves, baldes e percentuais; valor difere no máximo 1 centavo por balde
+        assert [{k: v for k, v in r.items() if k != "value"} for r in new] == \
+               [{k: v for k, v in r.items() if k != "value"} for r in old]
+        assert all(abs(a["value"] - b["value"]) <= 0.01 + 1e-9 for a, b in zip(new, old))
+        assert round(sum(r["value"] for r in new) * 100) == round(income * 100)
+
+# ==============================================================
+# Simulador de quitação
+# ==============================================================
+def _giant(gid, total, priority=1, user_id=1, status="active"):
+    return SimpleNamespace(id=gid, user_id=user_id, name=f"G{gid}", total_to_pay=total, priority=priority, status=status)
+
+GIANTS = [_giant(1, 500.0, priority=2), _giant(2, 300.0, priority=1), _giant(3, 900.0, priority=1)]
+RATES = {1: 0.01, 2: 0.0, 3: 0.03}
+
+@pytest.mark.parametrize("strategy, kwargs, order", [
+    ("priority", {}, [3, 2, 1]),                       # prioridade; empate: maior total primeiro
+    ("avalanche", {"rates": RATES}, [3, 1, 2]),         # maior juros primeiro
+    ("snowball", {"paid": {1: 350.0}}, [1, 2, 3]),      # menor saldo (já descontado o pago) primeiro
+    ("custom", {"custom_order": [2, 1]}, [2, 1, 3]),    # fora da lista vai para o fim
+])
+def test_payoff_orderings(strategy, kwargs, order):
+    assert simulate_payoff(GIANTS, 100.0, strategy, **kwargs)["order"] == order
+
+def test_payoff_order_unknown_strategy():
+    with pytest.raises(ValueError):
+        payoff_order(GIANTS, [1.0, 1.0, 1.0], "random")
+
+def test_payoff_rolls_freed_budget_into_next_giant():
+    sim = simulate_payoff([_giant(1, 100.0), _giant(2, 300.0, priority=2)], 100.0)
+    assert [d["month"] for d in sim["defeat"]] == [1, 4]
+    assert sim["months"] == 4 and sim["total_paid"] == 400.0
+    # Sobra do mês em que um gigante é vencido passa para o próximo
+    sim = simulate_payoff([_giant(1, 150.0), _giant(2, 150.0, priority=2)], 100.0)
+    assert sim["payments"].tolist() == [[100.0, 0.0], [50.0, 50.0], [0.0, 100.0]]
+    assert [d["month"] for d in sim["defeat"]] == [2, 3]
+
+def test_payoff_with_interest():
+    sim = simulate_payoff([_giant(1, 1000.0)], 100.0, rates={1: 0.02})
+    # Juros sobre o saldo antes do aporte de cada mês
+    bal, months = 1000.0, 0
+    while bal > 1e-6:
+        bal = bal * 1.02 - min(100.0, bal * 1.02)
+        months += 1
+    assert sim["months"] == months
+    assert sim["total_paid"] > 1000.0
+    assert simulate_payoff([_giant(1, 1000.0)], 100.0)["months"] == 10
+
+def test_payoff_budget_too_small_is_capped():
+    # Juros de 10% a.m. sobre 1000 = 100 > aporte de 50: nunca quita
+    sim = simulate_payoff([_giant(1, 1000.0)], 50.0, rates={1: 0.10})
+    assert sim["months"] is None and sim["defeat"][0]["month"] is None
+    assert sim["balances"].shape == (MAX_PAYOFF_MONTHS, 1)
+    # Sem juros, mas além do horizonte
+    sim = simulate_payoff([_giant(1, 1000.0)], 1.0, max_months=12)
+    assert sim["months"] is None and sim["balances"].shape == (12, 1)
+    assert simulate_payoff([_giant(1, 1000.0)], 0.0)["months"] is None
+
+def test_simulate_cached_returns_read_only_arrays():
+    _simulate_cached.cache_clear()
+    a = simulate_payoff(GIANTS, 100.0, "priority", rates=RATES)
+    b = simulate_payoff(GIANTS, 100.0, "priority", rates=RATES)
+    assert a["payments"] is b["payments"] and _simulate_cached.cache_info().hits == 1
+    for arr in (a["payments"], a["balances"]):
+        with pytest.raises(ValueError):
+            arr[0, 0] = 0.0
+
+def test_batch_matches_single_user_simulation():
+    rng = np.random.default_rng(3)
+    bal = np.round(rng.uniform(0, 5000, size=(40, 5)), 2)
+    bal[rng.random(bal.shape) < 0.2] = 0.0
+    budgets = np.round(rng.uniform(0, 800, size=40), 2)
+    for rates in (None, np.round(rng.uniform(0, 0.05, size=(40, 5)), 4)):
+        pays, bals = simulate_payoff_batch(bal, budgets, rates)
+        expected = defeat_months(bals, bal)
+        assert (defeat_months_batch(bal, budgets, rates) == expected).all()
+        for u in range(0, 40, 7):
+            single = simulate_payoff([_giant(k, bal[u, k], priority=k) for k in range(5)], budgets[u],
+                                     rates=None if rates is None else dict(enumerate(rates[u])))
+            got = [d["month"] if d["month"] is not None else -1 for d in single["defeat"]]
+            assert got == expected[u].tolist()
+
+def test_compare_strategies_matches_simulate_payoff():
+    giants = GIANTS + [_giant(4, 200.0, user_id=2), _giant(5, 800.0, priority=0, user_id=2),
+                       _giant(6, 100.0, user_id=2, status="defeated"), _giant(7, 50.0, user_id=3)]
+    budgets, paid = {1: 150.0, 2: 90.0}, {5: 100.0}
+    out = compare_strategies(giants, budgets, paid, RATES)
+    assert sorted(out) == [1, 2, 3]
+    for uid, res in out.items():
+        mine = [g for g in giants if g.user_id == uid]
+        for strategy, months in res.items():
+            assert months == simulate_payoff(mine, budgets.get(uid, 0.0), strategy, paid=paid, rates=RATES)["months"]
+    assert out[3] == {"priority": None, "avalanche": None, "snowball": None}  # sem margem
@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+import queries
+import services
+from db import make_engine
+from migrations import ensure_schema
+from projection import monthly_history, project_user
+
+TODAY = date(2026, 6, 15)
+
+def test_monthly_history_fills_missing_months_with_zero():
+    rows = [("2026-01", 100.0, 80.0), ("2026-03", 50.0, 20.0), ("2026-06", 999.0, 999.0)]
+    assert monthly_history(rows, TODAY) == [
+        ("2026-01", 100.0, 80.0), ("2026-02", 0.0, 0.0), ("2026-03", 50.0, 20.0),
+        ("2026-04", 0.0, 0.0), ("2026-05", 0.0, 0.0),
+    ]
+    assert monthly_history([], TODAY) == []
+
+@pytest.fixture
+def db(tmp_path):
+    eng = make_engine(f"sqlite:///{tmp_path / 'proj.db'}")
+    ensure_schema(eng)
+    with Session(eng) as s:
+        yield s
+    eng.dispose()
+
+def test_projection_ignores_transfers_and_counts_overdue_bills(db):
+    uid = services.get_or_create_user(db, "projeção")["id"]
+    a = services.create_bucket(db, uid, "A", 50.0)["id"]
+    b = services.create_bucket(db, uid, "B", 50.0)["id"]
+    for month in (2, 3, 4, 5):
+        services.add_movement(db, uid, a, "income", 1000.0, "salário", date(2026, month, 5))
+        services.add_movement(db, uid, a, "expense", 400.0, "mercado", date(2026, month, 10))
+        services.transfer(db, uid, a, b, 300.0, day=date(2026, month, 12))
+    services.create_bill(db, uid, "Aluguel atrasado", 700.0, date(2026, 6, 1), is_critical=True)
+
+    assert queries.monthly_cash_flow(db, uid, date(2026, 1, 1)) == [
+        (f"2026-0{m}", 1000.0, 400.0) for m in (2, 3, 4, 5)]
+    res = project_user(db, uid, months=2, n_paths=200, seed=1, today=TODAY)
+    assert res["flows"]["mu_in"] == pytest.approx(1000.0)
+    assert res["flows"]["mu_out"] == pytest.approx(400.0)
+    assert [r["title"] for r in res["bill_risks"]] == ["Aluguel atrasado"]
+    assert res["bill_risks"][0]["day"] == 0
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db import Base, make_engine
+import models  # noqa: F401  (registra as tabelas)
+import queries
+from migrations import ensure_schema
+
+# Índices que chegam pelas migrações: sem eles (banco antigo) as consultas quentes varrem a tabela
+MIGRATED_INDEXES = ("ix_movements_user_date", "ux_movements_user_import_hash", "ix_movements_user_bucket_date",
+                    "ix_bills_user_due", "ix_bills_user_paid_due", "ix_giant_payments_user_giant_date")
+
+HOT_QUERIES = {
+    # nome: (chamada, tabela cuja consulta interessa)
+    "check_due_alerts": (lambda db: queries.check_due_alerts(db, 1, 3, date(2026, 1, 10)), "bills"),
+    "ledger_page": (lambda db: queries.ledger_page(db, 1, limit=20), "movements"),
+    "giant_totals": (lambda db: queries.giant_totals(db, 1), "giant_payments"),
+}
+
+@pytest.fixture
+def old_engine(tmp_path):
+    # Banco "antigo": tabelas criadas, índices das migrações ausentes, user_version 0
+    eng = make_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    Base.metadata.create_all(bind=eng)
+    with eng.begin() as con:
+        for name in MIGRATED_INDEXES:
+            con.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        con.exec_driver_sql("PRAGMA user_version = 0")
+    yield eng
+    eng.dispose()
+
+def _plan(eng, call, table) -> str:
+    # Captura o SQL emitido pela função e devolve o EXPLAIN QUERY PLAN da consulta à tabela
+    seen = []
+
+    def capture(_con, _cur, statement, parameters, _ctx, _many):
+        seen.append((statement, parameters))
+
+    event.listen(eng, "before_cursor_execute", capture)
+    try:
+        with Session(eng) as db:
+            call(db)
+    finally:
+        event.remove(eng, "before_cursor_execute", capture)
+    stmt, params = next((s, p) for s, p in seen if f"FROM {table}" in s)
+    with eng.connect() as con:
+        rows = con.exec_driver_sql("EXPLAIN QUERY PLAN " + stmt, params).all()
+    return " | ".join(r[-1] for r in rows)
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_queries_use_indexes_after_migrations(old_engine, name):
+    call, table = HOT_QUERIES[name]
+    before = _plan(old_engine, call, table)
+    assert f"SCAN {table}" in before, before
+    ensure_schema(old_engine)
+    after = _plan(old_engine, call, table)
+    assert f"SCAN {table}" not in after, after
+    assert "USING INDEX" in after or "USING COVERING INDEX" in after, after
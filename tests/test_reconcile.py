@@ -0,0 +1,138 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+import backup
+import reconcile
+import rollup
+import services
+from db import Base, make_engine
+from migrations import ensure_schema, run_migrations
+from models import Movement
+
+DAY = date(2026, 3, 10)
+
+@pytest.fixture
+def eng(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    e = make_engine(f"sqlite:///{tmp_path / 'rec.db'}")
+    ensure_schema(e)
+    yield e
+    e.dispose()
+
+def _user(eng, name, balance=100.0):
+    with Session(eng) as db:
+        uid = services.get_or_create_user(db, name)["id"]
+        bid = services.create_bucket(db, uid, "Caixa", 100.0)["id"]
+        services.add_movement(db, uid, bid, "income", balance, "saldo", DAY)
+    return uid, bid
+
+def _run(eng, uid=None, **kw):
+    with eng.begin() as con:
+        return reconcile.run(con, uid, **kw)
+
+def _sql(eng, sql, *params):
+    with eng.begin() as con:
+        res = con.exec_driver_sql(sql, params)
+        return res.all() if res.returns_rows else res.rowcount
+
+def test_adopt_then_clean(eng):
+    uid, _ = _user(eng, "ana")
+    res = _run(eng, uid)
+    assert (res["checked"], res["adopted"], res["issues"]) == (1, 1, [])
+    res = _run(eng, uid)
+    assert (res["adopted"], res["folded"], res["issues"]) == (0, 0, [])
+
+def test_new_movements_are_folded_into_expected(eng):
+    uid, bid = _user(eng, "ana")
+    _run(eng, uid)
+    with Session(eng) as db:
+        services.add_movement(db, uid, bid, "expense", 30.0, "mercado", DAY)
+        services.add_movement(db, uid, bid, "income", 5.0, "troco", DAY)
+    res = _run(eng, uid)
+    assert (res["folded"], res["issues"]) == (2, [])
+    assert _sql(eng, "SELECT balance, last_movement_id FROM bucket_checkpoints WHERE bucket_id = ?", bid) == \
+        [(75.0, _sql(eng, "SELECT MAX(id) FROM movements")[0][0])]
+
+def test_drift_detected_then_repaired(eng):
+    uid, bid = _user(eng, "ana")
+    _run(eng, uid)
+    _sql(eng, "UPDATE buckets SET balance = balance + 20 WHERE id = ?", bid)
+    res = _run(eng, uid)
+    assert [(i["bucket_id"], i["drift"], i["expected"], i["history_diff"]) for i in res["issues"]] == \
+        [(bid, 20.0, 100.0, 0.0)]
+    with eng.connect() as con:
+        assert reconcile.issues(con, uid)[0]["drift"] == 20.0
+    res = _run(eng, uid, repair=True)
+    assert res["repaired"] == 1
+    assert _sql(eng, "SELECT balance FROM buckets WHERE id = ?", bid) == [(100.0,)]
+    assert _run(eng, uid)["issues"] == []
+
+def test_accept_takes_recorded_balance(eng):
+    uid, bid = _user(eng, "ana")
+    _run(eng, uid)
+    _sql(eng, "UPDATE buckets SET balance = 80 WHERE id = ?", bid)
+    assert _run(eng, uid, accept=True)["accepted"] == 1
+    assert _sql(eng, "SELECT balance FROM buckets WHERE id = ?", bid) == [(80.0,)]
+    assert _run(eng, uid)["issues"] == []
+    with Session(eng) as db:
+        services.add_movement(db, uid, bid, "income", 10.0, "pix", DAY)
+    assert _run(eng, uid)["issues"] == []
+
+def test_old_movement_changed_outside_services(eng):
+    uid, bid = _user(eng, "ana")
+    _run(eng, uid)
+    _sql(eng, "UPDATE movements SET amount = 130 WHERE bucket_id = ?", bid)
+    res = _run(eng, uid)
+    assert [(i["drift"], i["history_diff"]) for i in res["issues"]] == [(0.0, 30.0)]
+    assert _run(eng, uid)["issues"] == []  # registrado uma vez; a marca passa a incluir o livro caixa novo
+
+def test_restore_then_other_user_write_has_no_false_positive(eng):
+    a, a_bucket = _user(eng, "ana")
+    b, b_bucket = _user(eng, "bia")
+    snap = backup.snapshot(eng)["name"]
+    with Session(eng) as db:  # ids mais altos são de "ana" e somem no restore
+        for _ in range(3):
+            services.add_movement(db, a, a_bucket, "income", 10.0, "extra", DAY)
+    _run(eng)
+    backup.restore_user(snap, a, engine=eng)
+    with Session(eng) as db:
+        services.add_movement(db, b, b_bucket, "expense", 20.0, "luz", DAY)
+    res = _run(eng, b)
+    assert (res["folded"], res["issues"]) == (1, [])
+    assert _run(eng)["issues"] == []
+
+def test_migration_makes_movement_ids_monotonic(tmp_path):
+    # Banco antigo: movements sem AUTOINCREMENT, com a marca acima do maior id (ids já reaproveitados)
+    e = make_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    try:
+        Base.metadata.create_all(bind=e)
+        ddl = str(CreateTable(Movement.__table__).compile(dialect=e.dialect)).replace(" AUTOINCREMENT", "")
+        run_migrations(e)
+        with e.begin() as con:
+            con.exec_driver_sql("PRAGMA user_version = 7")
+            con.exec_driver_sql("DROP TABLE movements")
+            con.exec_driver_sql(ddl)
+            for idx in Movement.__table__.indexes:
+                idx.create(con)
+            rollup.install_triggers(con)
+            con.exec_driver_sql("INSERT INTO users (id, name) VALUES (1, 'ana')")
+            con.exec_driver_sql("INSERT INTO buckets (id, user_id, name, percent, balance) VALUES (1, 1, 'C', 100, 10)")
+            con.exec_driver_sql("INSERT INTO movements (user_id, bucket_id, kind, amount, date) "
+                                "VALUES (1, 1, 'income', 10, '2026-03-01')")
+            con.exec_driver_sql("INSERT INTO bucket_checkpoints (bucket_id, user_id, last_movement_id, balance, net, drift) "
+                                "VALUES (1, 1, 50, 10, 10, 0)")
+        assert run_migrations(e) == [8]
+        with e.begin() as con:
+            sql = con.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'movements'").scalar()
+            assert "AUTOINCREMENT" in sql
+            new_id = con.exec_driver_sql("INSERT INTO movements (user_id, bucket_id, kind, amount, date) "
+                                         "VALUES (1, 1, 'expense', 4, '2026-03-02')").lastrowid
+            assert new_id > 50
+            assert rollup.check(con) == []
+            con.exec_driver_sql("UPDATE buckets SET balance = 6")
+            assert reconcile.run(con, 1)["issues"] == []
+    finally:
+        e.dispose()
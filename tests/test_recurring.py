@@ -0,0 +1,92 @@
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pytest
+from dateutil.rrule import rrulestr
+from sqlalchemy.orm import Session
+
+import recurring
+import services
+from db import make_engine
+from migrations import ensure_schema
+from models import RecurringBill
+
+def _full(rule, start, end, lo, hi):
+    # Referência: a série inteira desde o DTSTART real, sem o atalho de _anchor
+    rr = rrulestr(rule, dtstart=datetime.combine(start, time()))
+    if end is not None:
+        hi = min(hi, end)
+    lo = max(lo, start)
+    return [d.date() for d in rr.between(datetime.combine(lo, time()), datetime.combine(hi, time()), inc=True)]
+
+CASES = [
+    ("MONTHLY", date(2020, 1, 29), 1), ("MONTHLY", date(2020, 1, 30), 1), ("MONTHLY", date(2019, 8, 31), 1),
+    ("MONTHLY", date(2020, 3, 31), 2), ("MONTHLY", date(2021, 5, 15), 3), ("MONTHLY", date(2020, 2, 29), 1),
+    ("WEEKLY", date(2020, 1, 1), 1), ("WEEKLY", date(2020, 1, 5), 2), ("WEEKLY", date(2021, 6, 7), 3),
+    ("YEARLY", date(2020, 2, 29), 1), ("YEARLY", date(2019, 12, 31), 2), ("YEARLY", date(2020, 1, 31), 1),
+]
+
+@pytest.mark.parametrize("freq, start, interval", CASES)
+def test_expand_matches_full_rrule(freq, start, interval):
+    rule = recurring.make_rule(freq, start, interval)
+    rng = np.random.default_rng(start.toordinal() + interval)
+    for end in (None, start + timedelta(days=900)):
+        for _ in range(150):
+            # Janelas antes do início, cruzando o início/fim e depois do fim
+            lo = start + timedelta(days=int(rng.integers(-400, 1500)))
+            hi = lo + timedelta(days=int(rng.integers(0, 500)))
+            assert recurring.expand(rule, start, end, lo, hi) == _full(rule, start, end, lo, hi), (lo, hi, end)
+
+def test_expand_short_months_and_leap_years():
+    rule = recurring.make_rule("MONTHLY", date(2024, 1, 31))
+    assert recurring.expand(rule, date(2024, 1, 31), None, date(2024, 2, 1), date(2024, 4, 30)) == \
+        [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    rule = recurring.make_rule("YEARLY", date(2020, 2, 29))
+    assert recurring.expand(rule, date(2020, 2, 29), None, date(2021, 1, 1), date(2024, 12, 31)) == \
+        [date(2021, 2, 28), date(2022, 2, 28), date(2023, 2, 28), date(2024, 2, 29)]
+    assert recurring.expand(rule, date(2020, 2, 29), date(2022, 1, 1), date(2022, 1, 2), date(2030, 1, 1)) == []
+    assert recurring.expand(rule, date(2020, 2, 29), None, date(2010, 1, 1), date(2020, 2, 28)) == []
+
+@pytest.fixture
+def db(tmp_path):
+    eng = make_engine(f"sqlite:///{tmp_path / 'rec.db'}")
+    ensure_schema(eng)
+    with Session(eng) as s:
+        yield s
+    eng.dispose()
+
+def test_settle_stops_at_first_open_occurrence(db):
+    uid = services.get_or_create_user(db, "rec")["id"]
+    rid = services.create_recurring_bill(db, uid, "Aluguel", 900.0, date(2024, 1, 31))["id"]
+    rec = db.get(RecurringBill, rid)
+    jan, feb, mar, apr = date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)
+    for d in (jan, feb, apr):
+        services.update_occurrence(db, uid, recurring.occurrence_id(rid, d), paid=True)
+    today = date(2024, 5, 15)
+    assert recurring.settle(db, rec, today) == feb  # março em aberto segura a marca
+    open_ids = [o.id for o in recurring.open_occurrences(db, uid, today, today)]
+    assert open_ids == [f"r{rid}:2024-03-31"]
+    services.update_occurrence(db, uid, f"r{rid}:2024-03-31", paid=True)
+    assert recurring.settle(db, rec, today) == apr  # passa pelas já pagas depois da aberta
+    assert recurring.open_occurrences(db, uid, today, today) == []
+    # A marca nunca recua: desmarcar vira exceção não paga, com o mesmo id
+    services.update_occurrence(db, uid, f"r{rid}:2024-02-29", paid=False)
+    assert recurring.settle(db, rec, today) == apr
+    assert [o.id for o in recurring.open_occurrences(db, uid, today, today)] == [f"r{rid}:2024-02-29"]
+
+def test_occurrence_ids_stable_across_settle_and_reschedule(db):
+    uid = services.get_or_create_user(db, "rec")["id"]
+    rid = services.create_recurring_bill(db, uid, "Luz", 120.0, date(2024, 1, 10))["id"]
+    lo, hi = date(2024, 1, 1), date(2024, 6, 30)
+    before = [o.id for o in recurring.occurrences(db, uid, lo, hi)]
+    assert before == [f"r{rid}:2024-{m:02d}-10" for m in range(1, 7)]
+    services.update_occurrence(db, uid, f"r{rid}:2024-01-10", paid=True)
+    # Remarcada: vence em outro dia, mas o id continua sendo a data da regra
+    moved = services.update_occurrence(db, uid, f"r{rid}:2024-03-10", due_date=date(2024, 3, 25))
+    assert moved["id"] == f"r{rid}:2024-03-10" and moved["due_date"] == date(2024, 3, 25)
+    recurring.settle(db, db.get(RecurringBill, rid), date(2024, 6, 30))
+    after = recurring.occurrences(db, uid, lo, hi)
+    assert sorted(o.id for o in after) == sorted(before)
+    assert {o.id: o.paid for o in after}[f"r{rid}:2024-01-10"]
+    assert recurring.parse_occurrence_id(f"r{rid}:2024-03-10") == (rid, date(2024, 3, 10))
+    assert recurring.parse_occurrence_id("r1:2024-02-30") is None
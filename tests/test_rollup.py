@@ -0,0 +1,118 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+import rollup
+import services
+from db import make_engine
+from migrations import ensure_schema
+
+MAR, APR = date(2026, 3, 10), date(2026, 4, 2)
+
+@pytest.fixture
+def eng(tmp_path):
+    e = make_engine(f"sqlite:///{tmp_path / 'rollup.db'}")
+    ensure_schema(e)
+    yield e
+    e.dispose()
+
+@pytest.fixture
+def ledger(eng):
+    with Session(eng) as db:
+        uid = services.get_or_create_user(db, "rollup")["id"]
+        casa = services.create_bucket(db, uid, "Casa", 60.0)["id"]
+        lazer = services.create_bucket(db, uid, "Lazer", 40.0)["id"]
+        ids = [services.add_movement(db, uid, casa, "income", 1000.0, "salario", MAR)["id"],
+               services.add_movement(db, uid, casa, "expense", 120.5, "luz", MAR)["id"]]
+        services.transfer(db, uid, casa, lazer, 200.0, day=MAR)
+        ids.append(services.add_movement(db, uid, lazer, "expense", 80.0, "cinema", APR)["id"])
+    return uid, casa, lazer, ids
+
+def _rollup(con, uid):
+    rows = con.exec_driver_sql(
+        "SELECT bucket_id, year_month, kind, ROUND(total, 2), count FROM movement_monthly_rollup "
+        "WHERE user_id = ? ORDER BY 1, 2, 3", (uid,)).all()
+    return {(b, ym, k): (t, c) for b, ym, k, t, c in rows}
+
+def _consistent(eng, uid):
+    with eng.connect() as con:
+        assert rollup.check(con) == []
+        return _rollup(con, uid)
+
+def test_insert_trigger(eng, ledger):
+    uid, casa, lazer, _ = ledger
+    assert _consistent(eng, uid) == {
+        (casa, "2026-03", "expense"): (120.5, 1),
+        (casa, "2026-03", "income"): (1000.0, 1),
+        (casa, "2026-03", "transfer"): (200.0, 1),
+        (lazer, "2026-03", "income"): (200.0, 1),
+        (lazer, "2026-04", "expense"): (80.0, 1),
+    }
+
+def test_update_amount_and_kind(eng, ledger):
+    uid, casa, _, (_, luz, _) = ledger
+    with eng.begin() as con:
+        con.exec_driver_sql("UPDATE movements SET amount = 99.9 WHERE id = ?", (luz,))
+    assert _consistent(eng, uid)[(casa, "2026-03", "expense")] == (99.9, 1)
+    with eng.begin() as con:
+        con.exec_driver_sql("UPDATE movements SET kind = 'income' WHERE id = ?", (luz,))
+    rows = _consistent(eng, uid)
+    assert (casa, "2026-03", "expense") not in rows  # contagem zerada some do rollup
+    assert rows[(casa, "2026-03", "income")] == (1099.9, 2)
+
+def test_update_moves_movement_to_other_bucket_and_month(eng, ledger):
+    uid, casa, lazer, (_, luz, _) = ledger
+    with eng.begin() as con:
+        con.exec_driver_sql("UPDATE movements SET bucket_id = ?, date = ? WHERE id = ?", (lazer, APR, luz))
+    rows = _consistent(eng, uid)
+    assert (casa, "2026-03", "expense") not in rows
+    assert rows[(lazer, "2026-04", "expense")] == (200.5, 2)
+    # Só a data, dentro do mesmo mês: nada muda; para outro mês, muda de linha
+    with eng.begin() as con:
+        con.exec_driver_sql("UPDATE movements SET date = ? WHERE id = ?", (date(2026, 4, 30), luz))
+    assert _consistent(eng, uid) == rows
+    with eng.begin() as con:
+        con.exec_driver_sql("UPDATE movements SET date = ? WHERE id = ?", (date(2025, 12, 31), luz))
+    assert _consistent(eng, uid)[(lazer, "2025-12", "expense")] == (120.5, 1)
+
+def test_delete_trigger(eng, ledger):
+    uid, casa, lazer, (salario, _, cinema) = ledger
+    with eng.begin() as con:
+        con.exec_driver_sql("DELETE FROM movements WHERE id IN (?, ?)", (salario, cinema))
+    rows = _consistent(eng, uid)
+    assert (casa, "2026-03", "income") not in rows and (lazer, "2026-04", "expense") not in rows
+
+@pytest.mark.parametrize("via_service", [True, False])
+def test_deleting_bucket_moves_rows_to_no_bucket(eng, ledger, via_service):
+    # ON DELETE SET NULL em movements.bucket_id também dispara o trigger de UPDATE
+    uid, casa, lazer, _ = ledger
+    if via_service:
+        with Session(eng) as db:
+            services.delete_bucket(db, uid, lazer, force=True)
+    else:
+        with eng.begin() as con:
+            con.exec_driver_sql("DELETE FROM buckets WHERE id = ?", (lazer,))
+    rows = _consistent(eng, uid)
+    assert not any(b == lazer for b, _, _ in rows)
+    assert rows[(0, "2026-03", "income")] == (200.0, 1)
+    assert rows[(0, "2026-04", "expense")] == (80.0, 1)
+
+def test_rebuild_is_idempotent(eng, ledger):
+    uid, casa, lazer, _ = ledger
+    with Session(eng) as db:
+        other = services.get_or_create_user(db, "outro")["id"]
+        b = services.create_bucket(db, other, "Tudo", 100.0)["id"]
+        services.add_movement(db, other, b, "income", 50.0, "pix", APR)
+    before = {u: _consistent(eng, u) for u in (uid, other)}
+    with eng.begin() as con:
+        n = rollup.rebuild(con)
+        assert rollup.rebuild(con) == n == sum(len(r) for r in before.values())
+        assert rollup.rebuild(con, uid) == len(before[uid])
+    assert {u: _consistent(eng, u) for u in (uid, other)} == before
+    # Rollup corrompido: check acusa, rebuild de um usuário conserta só ele
+    with eng.begin() as con:
+        con.exec_driver_sql("UPDATE movement_monthly_rollup SET total = total + 1 WHERE user_id = ?", (uid,))
+        assert {d["user_id"] for d in rollup.check(con)} == {uid}
+        rollup.rebuild(con, uid)
+    assert {u: _consistent(eng, u) for u in (uid, other)} == before
@@ -0,0 +1,26 @@
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+import search
+from db import Base, make_engine
+from models import Movement, User
+
+def test_like_escape():
+    assert search.like_escape("a_b%c\\d") == "a\\_b\\%c\\\\d"
+
+def test_like_fallback_matches_underscore_literally(tmp_path):
+    # Sem a tabela FTS (movements_fts) a busca cai no LIKE
+    eng = make_engine(f"sqlite:///{tmp_path / 'like.db'}")
+    Base.metadata.create_all(bind=eng)
+    with Session(eng) as db:
+        db.add(User(id=1, name="busca"))
+        db.flush()
+        for i, desc in enumerate(["pix_joao", "pixajoao", "PIX JOAO"], start=1):
+            db.add(Movement(id=i, user_id=1, bucket_id=None, kind="expense", amount=1.0, description=desc,
+                            date=date(2026, 1, i)))
+        db.commit()
+        assert not search._has_index(db, "movements_fts")
+        assert [m.description for m in search.search_movements(db, 1, "pix_joao")] == ["pix_joao"]
+        assert [m.description for m in search.search_movements(db, 1, "joao")] == ["PIX JOAO", "pixajoao", "pix_joao"]
+    eng.dispose()
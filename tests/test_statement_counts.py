@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import backup
+import cache
+import db as dbmod
+import instrument
+import jobs
+import queries
+import reconcile
+import services
+from db import make_engine
+from migrations import ensure_schema
+from models import Giant, GiantPayment
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+SIZES = (1, 30)          # gigantes por usuário
+RENDER_RATIO = 3.0       # 30x os gigantes não pode custar mais que isso no rerun da página
+
+@pytest.fixture
+def seeded(tmp_path, monkeypatch):
+    # Banco em arquivo (o app roda o script em outra thread) ligado ao SessionLocal global
+    eng = make_engine(f"sqlite:///{tmp_path / 'counts.db'}")
+    ensure_schema(eng)
+    monkeypatch.setattr(dbmod, "engine", eng)
+    dbmod.SessionLocal.configure(bind=eng)
+    monkeypatch.setattr(backup, "EVERY_HOURS", 0)
+    monkeypatch.setattr(reconcile, "EVERY_MINUTES", 0)
+    monkeypatch.setattr(jobs, "JOBS_DB_URL", f"sqlite:///{tmp_path / 'jobs.db'}")
+    monkeypatch.setitem(jobs._state, "engine", None)
+    monkeypatch.chdir(tmp_path)  # instrument.jsonl do app
+    Session = sessionmaker(bind=eng)
+    users = {}
+    for n in SIZES:
+        with Session() as db:
+            uid = services.get_or_create_user(db, f"gigantes {n}")["id"]
+            for i in range(n):
+                g = Giant(user_id=uid, name=f"G{i}", total_to_pay=10_000.0, priority=i % 3 + 1, status="active")
+                db.add(g)
+                db.flush()
+                db.add_all(GiantPayment(user_id=uid, giant_id=g.id, amount=10.0,
+                                        date=date(2026, 1, 1) + timedelta(days=k), note="") for k in range(7))
+            db.commit()
+        users[n] = uid
+    cache.invalidate_all()
+    yield eng, Session, users
+    if jobs._state["engine"] is not None:
+        jobs._state["engine"].dispose()
+    dbmod.SessionLocal.configure(bind=None)
+    cache.invalidate_all()
+    eng.dispose()
+
+def _count(eng, fn) -> int:
+    stats = instrument.start(eng, enabled=True)
+    try:
+        fn()
+    finally:
+        instrument.finish(log_path=None)
+    return stats.queries
+
+def test_giant_queries_constant_in_number_of_giants(seeded):
+    eng, Session, users = seeded
+    counts = {}
+    for n, uid in users.items():
+        with Session() as db:
+            counts[n] = (
+                _count(eng, lambda: queries.giant_totals(db, uid)),
+                _count(eng, lambda: queries.recent_giant_payments(db, uid, limit=5)),
+            )
+        assert len(queries.giant_totals(Session(), uid)) == n
+    assert counts[SIZES[0]] == counts[SIZES[-1]] == (1, 1)
+
+def _attack_page(uid):
+    cache.invalidate_all()
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["user_id"] = uid
+    at.session_state["debug_instrument"] = True
+    at.run()
+    at.sidebar.radio[0].set_value("Plano de Ataque").run()
+    assert not at.exception, at.exception
+    return at
+
+def test_giants_page_statement_count_constant(seeded):
+    _, _, users = seeded
+    counts = {}
+    for n, uid in users.items():
+        _attack_page(uid)
+        with open("instrument.jsonl", encoding="utf-8") as fh:
+            report = json.loads(fh.readlines()[-1])
+        assert report["user_id"] == uid and report["page"] == "Plano de Ataque"
+        counts[n] = next(p["queries"] for p in report["phases"] if p["name"] == "Plano de Ataque")
+    assert counts[SIZES[0]] == counts[SIZES[-1]], counts
+
+def test_giants_page_render_time_bounded(seeded, monkeypatch):
+    # Sem espera artificial (animações são CSS) e tempo de rerun quase independente do nº de gigantes.
+    # O próprio AppTest usa time.sleep para esperar o script: só falha se quem chamou é código do app
+    real_sleep, root = time.sleep, os.path.dirname(APP)
+
+    def no_sleep(seconds):
+        caller = sys._getframe(1).f_code.co_filename
+        if caller.startswith(root) and "site-packages" not in caller:
+            raise AssertionError(f"time.sleep({seconds}) chamado pelo app em {caller}")
+        real_sleep(seconds)
+
+    _, _, users = seeded
+    best = {}
+    for n, uid in users.items():
+        at = _attack_page(uid)
+        at.session_state["debug_instrument"] = False
+        with monkeypatch.context() as m:
+            m.setattr(time, "sleep", no_sleep)
+            times = []
+            for _ in range(3):
+                t = time.perf_counter()
+                at.run()
+                times.append(time.perf_counter() - t)
+                assert not at.exception, at.exception
+        best[n] = min(times)
+    assert best[SIZES[-1]] < best[SIZES[0]] * RENDER_RATIO, best
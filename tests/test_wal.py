@@ -0,0 +1,25 @@
+import time
+
+from db import Base, SQLITE_BUSY_TIMEOUT, make_engine
+import models  # noqa: F401  (registra as tabelas)
+
+def test_reader_not_blocked_by_open_write(tmp_path):
+    eng = make_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+    Base.metadata.create_all(bind=eng)
+    try:
+        with eng.connect() as writer, eng.connect() as reader:
+            assert writer.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+            assert reader.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+            # Escrita aberta: BEGIN IMMEDIATE segura o lock de escrita até o commit
+            writer.exec_driver_sql("BEGIN IMMEDIATE")
+            writer.exec_driver_sql("INSERT INTO users (name) VALUES ('escritor')")
+            t0 = time.perf_counter()
+            seen = reader.exec_driver_sql("SELECT COUNT(*) FROM users").scalar()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            assert elapsed_ms < SQLITE_BUSY_TIMEOUT
+            assert seen == 0  # leitor vê o último commit, não a escrita em andamento
+            reader.rollback()
+            writer.exec_driver_sql("COMMIT")
+            assert reader.exec_driver_sql("SELECT COUNT(*) FROM users").scalar() == 1
+    finally:
+        eng.dispose()